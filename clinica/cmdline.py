@@ -187,63 +187,17 @@ def execute():
     run category: run one of the available pipelines
     """
     from clinica.engine import CmdParser
+    from clinica.engine.registry import COMMANDS, get_command_line_arguments, get_invoked_command
 
-    from clinica.pipelines.t1_freesurfer.t1_freesurfer_cli import T1FreeSurferCLI
-    from clinica.pipelines.t1_freesurfer_longitudinal.t1_freesurfer_longitudinal_cli import T1FreeSurferLongitudinalCLI
-    from clinica.pipelines.t1_freesurfer_longitudinal.t1_freesurfer_template_cli import T1FreeSurferTemplateCLI
-    from clinica.pipelines.t1_freesurfer_longitudinal.t1_freesurfer_longitudinal_correction_cli import T1FreeSurferLongitudinalCorrectionCLI
-    from clinica.pipelines.t1_volume_tissue_segmentation.t1_volume_tissue_segmentation_cli import T1VolumeTissueSegmentationCLI
-    from clinica.pipelines.t1_volume_create_dartel.t1_volume_create_dartel_cli import T1VolumeCreateDartelCLI
-    from clinica.pipelines.t1_volume_register_dartel.t1_volume_register_dartel_cli import T1VolumeRegisterDartelCLI
-    from clinica.pipelines.t1_volume_dartel2mni.t1_volume_dartel2mni_cli import T1VolumeDartel2MNICLI
-    from clinica.pipelines.t1_volume.t1_volume_cli import T1VolumeCLI
-    from clinica.pipelines.t1_volume_existing_template.t1_volume_existing_template_cli import T1VolumeExistingTemplateCLI
-    from clinica.pipelines.t1_volume_parcellation.t1_volume_parcellation_cli import T1VolumeParcellationCLI
-    from clinica.pipelines.t1_linear.t1_linear_cli import T1LinearCLI
-    from clinica.pipelines.deeplearning_prepare_data.deeplearning_prepare_data_cli import DeepLearningPrepareDataCLI
-    from clinica.pipelines.dwi_preprocessing_using_phasediff_fieldmap.dwi_preprocessing_using_phasediff_fieldmap_cli import DwiPreprocessingUsingPhaseDiffFieldmapCli
-    from clinica.pipelines.dwi_preprocessing_using_t1.dwi_preprocessing_using_t1_cli import DwiPreprocessingUsingT1Cli
-    from clinica.pipelines.dwi_dti.dwi_dti_cli import DwiDtiCli
-    from clinica.pipelines.dwi_connectome.dwi_connectome_cli import DwiConnectomeCli
-    from clinica.pipelines.pet_volume.pet_volume_cli import PETVolumeCLI
-    from clinica.pipelines.pet_surface.pet_surface_cli import PetSurfaceCLI
-    from clinica.pipelines.pet_surface.pet_surface_longitudinal_cli import PetSurfaceLongitudinalCLI
-    from clinica.pipelines.machine_learning_spatial_svm.spatial_svm_cli import SpatialSVMCLI
-    from clinica.pipelines.statistics_surface.statistics_surface_cli import StatisticsSurfaceCLI
-    from clinica.pipelines.statistics_volume.statistics_volume_cli import StatisticsVolumeCLI
-    from clinica.pipelines.statistics_volume_correction.statistics_volume_correction_cli import StatisticsVolumeCorrectionCLI
+    # Only the invoked sub-command is imported (see clinica.engine.registry)
+    invoked_category, invoked_command = get_invoked_command(get_command_line_arguments())
+
+    def get_invoked_command_name(category):
+        return invoked_command if invoked_category == category else None
+
+    # Pipelines from CLINICAPATH, then pipelines of Clinica
     pipelines = ClinicaClassLoader(baseclass=CmdParser,
                                    extra_dir="pipelines").load()
-    # The order in pipelines var will the same when typing `clinica run`
-    # Pipelines are sorted by main / advanced pipelines then by modality
-    pipelines += [
-        # Main pipelines:
-        T1FreeSurferCLI(),
-        T1VolumeCLI(),
-        # T1FreeSurferLongitudinalCLI(),
-        T1LinearCLI(),
-        DwiPreprocessingUsingPhaseDiffFieldmapCli(),
-        DwiPreprocessingUsingT1Cli(),
-        DwiDtiCli(),
-        DwiConnectomeCli(),
-        PETVolumeCLI(),
-        PetSurfaceCLI(),
-        # PetSurfaceLongitudinalCLI(),
-        DeepLearningPrepareDataCLI(),
-        SpatialSVMCLI(),
-        StatisticsSurfaceCLI(),
-        StatisticsVolumeCLI(),
-        StatisticsVolumeCorrectionCLI(),
-        # Advanced pipelines:
-        T1VolumeExistingTemplateCLI(),
-        T1VolumeTissueSegmentationCLI(),
-        T1VolumeCreateDartelCLI(),
-        T1VolumeRegisterDartelCLI(),
-        T1VolumeDartel2MNICLI(),
-        T1VolumeParcellationCLI(),
-        # T1FreeSurferTemplateCLI(),
-        # T1FreeSurferLongitudinalCorrectionCLI(),
-    ]
 
     run_parser = sub_parser.add_parser(
         'run',
@@ -256,28 +210,15 @@ def execute():
     run_parser._positionals.title = '%sclinica run expects one of the following pipelines%s' % \
                                     (Fore.GREEN, Fore.RESET)
 
-    init_cmdparser_objects(
-        parser,
-        run_parser.add_subparsers(metavar='', dest='run'),
-        pipelines
-    )
+    run_subparsers = run_parser.add_subparsers(metavar='', dest='run')
+    init_cmdparser_objects(parser, run_subparsers, pipelines)
+    init_registered_cmdparser_objects(parser, run_subparsers, COMMANDS['run'], get_invoked_command_name('run'))
 
     """
     convert category: convert one of the supported datasets into BIDS hierarchy
     """
-    from clinica.iotools.converters.aibl_to_bids.aibl_to_bids_cli import AiblToBidsCLI
-    from clinica.iotools.converters.adni_to_bids.adni_to_bids_cli import AdniToBidsCLI
-    from clinica.iotools.converters.oasis_to_bids.oasis_to_bids_cli import OasisToBidsCLI
-    from clinica.iotools.converters.nifd_to_bids.nifd_to_bids_cli import NifdToBidsCLI  # noga
-
     converters = ClinicaClassLoader(baseclass=CmdParser,
                                     extra_dir="iotools/converters").load()
-    converters += [
-        AdniToBidsCLI(),
-        AiblToBidsCLI(),
-        OasisToBidsCLI(),
-        NifdToBidsCLI(),
-    ]
 
     convert_parser = sub_parser.add_parser(
         'convert',
@@ -289,26 +230,14 @@ def execute():
     convert_parser._positionals.title = '%sclinica convert expects one of the following datasets%s' % \
                                         (Fore.YELLOW, Fore.RESET)
     convert_parser._optionals.title = OPTIONAL_TITLE
-    init_cmdparser_objects(
-        parser,
-        convert_parser.add_subparsers(metavar='', dest='convert'),
-        converters
-    )
+    convert_subparsers = convert_parser.add_subparsers(metavar='', dest='convert')
+    init_cmdparser_objects(parser, convert_subparsers, converters)
+    init_registered_cmdparser_objects(parser, convert_subparsers, COMMANDS['convert'],
+                                      get_invoked_command_name('convert'))
 
     """
     iotools category
     """
-    from clinica.iotools.utils.data_handling_cli import CmdParserSubjectsSessions
-    from clinica.iotools.utils.data_handling_cli import CmdParserMergeTsv
-    from clinica.iotools.utils.data_handling_cli import CmdParserMissingModalities
-    from clinica.iotools.utils.data_handling_cli import CmdParserCenterNifti
-    io_tools = [
-        CmdParserSubjectsSessions(),
-        CmdParserMergeTsv(),
-        CmdParserMissingModalities(),
-        CmdParserCenterNifti()
-    ]
-
     HELP_IO_TOOLS = 'Tools to handle BIDS/CAPS datasets.'
     io_parser = sub_parser.add_parser(
         'iotools',
@@ -320,24 +249,14 @@ def execute():
                                    (Fore.YELLOW, Fore.RESET)
     io_parser._optionals.title = OPTIONAL_TITLE
 
-    init_cmdparser_objects(
-        parser,
-        io_parser.add_subparsers(metavar='', dest='iotools'),
-        io_tools
-    )
+    init_registered_cmdparser_objects(parser, io_parser.add_subparsers(metavar='', dest='iotools'),
+                                      COMMANDS['iotools'], get_invoked_command_name('iotools'))
 
     """
     visualize category: run one of the available pipelines
     """
-    from clinica.engine import CmdParser
-
-    from clinica.pipelines.t1_freesurfer.t1_freesurfer_visualizer import T1FreeSurferVisualizer
-
     visualizers = ClinicaClassLoader(baseclass=CmdParser,
                                      extra_dir="pipelines").load()
-    visualizers += [
-        T1FreeSurferVisualizer(),
-    ]
 
     visualize_parser = sub_parser.add_parser(
         'visualize',
@@ -350,11 +269,10 @@ def execute():
     visualize_parser._positionals.title = '%sclinica visualize expects one of the following pipelines%s' % \
                                           (Fore.YELLOW, Fore.RESET)
 
-    init_cmdparser_objects(
-        parser,
-        visualize_parser.add_subparsers(metavar='', dest='visualize'),
-        visualizers
-    )
+    visualize_subparsers = visualize_parser.add_subparsers(metavar='', dest='visualize')
+    init_cmdparser_objects(parser, visualize_subparsers, visualizers)
+    init_registered_cmdparser_objects(parser, visualize_subparsers, COMMANDS['visualize'],
+                                      get_invoked_command_name('visualize'))
 
     """
     generate category: template
@@ -371,12 +289,8 @@ def execute():
                                          (Fore.YELLOW, Fore.RESET)
     generate_parser._optionals.title = OPTIONAL_TITLE
 
-    from clinica.engine.template import CmdGenerateTemplates
-    init_cmdparser_objects(
-        parser,
-        generate_parser.add_subparsers(metavar='', dest='generate'),
-        [CmdGenerateTemplates()]
-    )
+    init_registered_cmdparser_objects(parser, generate_parser.add_subparsers(metavar='', dest='generate'),
+                                      COMMANDS['generate'], get_invoked_command_name('generate'))
 
     """
     Silent all sub-parser errors methods except the one which is called
@@ -532,6 +446,20 @@ def execute():
         python_logging.basicConfig(
             format=logging.fmt, datefmt=logging.datefmt, stream=Stream())
 
+    # Decisions taken without asking the user while running pipelines
+    from clinica.utils.execution_policy import ExecutionPolicy, set_execution_policy
+    set_execution_policy(ExecutionPolicy.from_environment().update(
+        n_procs=getattr(args, 'n_procs', None),
+        memory_gb=getattr(args, 'memory_gb', None),
+        disk_policy=getattr(args, 'disk_policy', None),
+        cross_sectional=getattr(args, 'cross_sectional', None),
+        profile=getattr(args, 'profile', None)))
+
+    # Results of the dependency checks are cached between runs (see clinica.utils.dependency_cache)
+    if getattr(args, 'refresh_dependency_cache', False):
+        from clinica.utils.dependency_cache import clear_dependency_cache
+        clear_dependency_cache()
+
     # Finally, run the command
     args.func(args)
 
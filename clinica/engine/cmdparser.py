@@ -105,12 +105,36 @@ class CmdParser:
             clinica_standard_options.add_argument(
                 "-np", "--n_procs",
                 metavar='N', type=int,
-                help='Number of cores used to run in parallel.')
+                help='Number of cores used to run in parallel '
+                     '(default: derived from the CPU and memory limits of the process).')
+            clinica_standard_options.add_argument(
+                "--memory_gb",
+                metavar='GB', type=float,
+                help='Memory budget (in GB) of the processes run in parallel '
+                     '(default: 90%% of the memory limit of the process).')
+            clinica_standard_options.add_argument(
+                "--disk_policy",
+                choices=['warn', 'abort'],
+                help='Run anyway (warn) or stop (abort) if the disk space seems insufficient (default: warn).')
+            clinica_standard_options.add_argument(
+                "--cross_sectional",
+                choices=['convert', 'abort'],
+                help='Convert the BIDS dataset in a longitudinal copy (convert) or stop (abort) if it is '
+                     'cross-sectional (default: abort).')
+            clinica_standard_options.add_argument(
+                "--profile",
+                action='store_true', default=None,
+                help='Write a report (TSV and JSON files in the current directory) with the wall time, '
+                     'CPU time and peak memory of each node of the pipeline.')
         if add_overwrite_flag:
             clinica_standard_options.add_argument(
                 "-overwrite", "--overwrite_outputs",
                 action='store_true', default=False,
                 help='Force overwrite of output files in CAPS folder.')
+        clinica_standard_options.add_argument(
+            "--refresh_dependency_cache",
+            action='store_true', default=False,
+            help='Check again the software dependencies instead of using the results cached by previous runs.')
 
         return clinica_standard_options
 
@@ -172,6 +196,31 @@ def init_cmdparser_objects(root_parser, parser, objects):
             pass
 
 
+def init_registered_cmdparser_objects(root_parser, parser, commands, invoked_command=None):
+    """
+    Init the sub-commands of a category from the registry (see clinica.engine.registry).
+
+    Only the invoked sub-command is imported and gets its arguments. The
+    other sub-commands are only listed (name and help) by `parser`.
+
+    Args:
+        root_parser: The root parser
+        parser: The ArgParser node (e.g. 'run' or 'convert')
+        commands: List of RegisteredCommand of this category
+        invoked_command: Name of the sub-command invoked on the command line (None if not found)
+    """
+    import argparse
+
+    for command in commands:
+        if command.name == invoked_command:
+            init_cmdparser_objects(root_parser, parser, [command.load()])
+        else:
+            parser.add_parser(command.name,
+                              add_help=False,
+                              help=command.help,
+                              formatter_class=argparse.RawDescriptionHelpFormatter)
+
+
 def get_cmdparser_names(objects=None):
     """
     Return the names of all pipelines
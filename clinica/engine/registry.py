@@ -0,0 +1,237 @@
+# coding: utf8
+
+"""
+This module contains the registry of the Clinica command line.
+
+The registry lists, for each category of the clinica command line (run,
+convert, iotools, visualize, generate), the name, the help message and the
+location of the class of each sub-command. It is used to build the command
+line without importing the modules of the sub-commands: only the sub-command
+actually invoked (e.g. t1-linear for `clinica run t1-linear ...`) is imported
+and gets its arguments.
+
+The order of the commands in a category is the one displayed by the help
+(e.g. `clinica run`: main pipelines sorted by modality, then advanced
+pipelines). When a command is added, its help message must be the description
+of its CmdParser class: test/instantiation/test_command_registry.py checks
+that the name and help message of each registered command match its class.
+"""
+
+
+class RegisteredCommand(object):
+    """Command of the clinica command line whose class is imported on demand.
+
+    Attributes:
+        name (str): Name of the sub-command (e.g. 't1-linear').
+        help (str): Help message displayed in the list of sub-commands.
+        target (str): Location of the CmdParser class ('<module>:<class>').
+    """
+
+    def __init__(self, name, help, target):
+        self._name = name
+        self._help = help
+        self._target = target
+
+    @property
+    def name(self): return self._name
+
+    @property
+    def help(self): return self._help
+
+    @property
+    def target(self): return self._target
+
+    def load(self):
+        """Import the module of the command and return an instance of its CmdParser class."""
+        import importlib
+
+        module_name, class_name = self._target.split(':')
+        return getattr(importlib.import_module(module_name), class_name)()
+
+
+COMMANDS = {
+    'run': [
+        # Main pipelines:
+        RegisteredCommand('t1-freesurfer',
+                          'Cross-sectional pre-processing of T1w images with FreeSurfer:\n'
+                          'http://clinica.run/doc/Pipelines/T1_FreeSurfer/',
+                          'clinica.pipelines.t1_freesurfer.t1_freesurfer_cli:T1FreeSurferCLI'),
+        RegisteredCommand('t1-volume',
+                          'Volume-based processing of T1-weighted MR images:\n'
+                          'http://clinica.run/doc/Pipelines/T1_Volume/',
+                          'clinica.pipelines.t1_volume.t1_volume_cli:T1VolumeCLI'),
+        RegisteredCommand('t1-linear',
+                          'Affine registration of T1w images to the MNI standard space:\n'
+                          'http://clinica.run/doc/Pipelines/T1_Linear/',
+                          'clinica.pipelines.t1_linear.t1_linear_cli:T1LinearCLI'),
+        RegisteredCommand('dwi-preprocessing-using-fieldmap',
+                          'Preprocessing of raw DWI datasets using a phase difference image:\n'
+                          'http://clinica.run/doc/Pipelines/DWI_Preprocessing/',
+                          'clinica.pipelines.dwi_preprocessing_using_phasediff_fieldmap.'
+                          'dwi_preprocessing_using_phasediff_fieldmap_cli:DwiPreprocessingUsingPhaseDiffFieldmapCli'),
+        RegisteredCommand('dwi-preprocessing-using-t1',
+                          'Preprocessing of raw DWI datasets using a T1w image:\n'
+                          'http://clinica.run/doc/Pipelines/DWI_Preprocessing/',
+                          'clinica.pipelines.dwi_preprocessing_using_t1.dwi_preprocessing_using_t1_cli:'
+                          'DwiPreprocessingUsingT1Cli'),
+        RegisteredCommand('dwi-dti',
+                          'DTI-based processing of DWI datasets:\n'
+                          'http://clinica.run/doc/DWI_DTI',
+                          'clinica.pipelines.dwi_dti.dwi_dti_cli:DwiDtiCli'),
+        RegisteredCommand('dwi-connectome',
+                          'Connectome-based processing of DWI datasets:\n'
+                          'http://clinica.run/doc/DWI_Connectome',
+                          'clinica.pipelines.dwi_connectome.dwi_connectome_cli:DwiConnectomeCli'),
+        RegisteredCommand('pet-volume',
+                          'SPM-based pre-processing of PET images:\n'
+                          'http://clinica.run/doc/Pipelines/PET_Volume/',
+                          'clinica.pipelines.pet_volume.pet_volume_cli:PETVolumeCLI'),
+        RegisteredCommand('pet-surface',
+                          'Surface-based processing of PET images:\n'
+                          'http://clinica.run/doc/Pipelines/PET_Surface/',
+                          'clinica.pipelines.pet_surface.pet_surface_cli:PetSurfaceCLI'),
+        RegisteredCommand('deeplearning-prepare-data',
+                          'Prepare data generated Clinica for PyTorch with Tensor extraction:\n'
+                          'http://clinica.run/doc/Pipelines/DeepLearning_PrepareData/',
+                          'clinica.pipelines.deeplearning_prepare_data.deeplearning_prepare_data_cli:'
+                          'DeepLearningPrepareDataCLI'),
+        RegisteredCommand('machinelearning-prepare-spatial-svm',
+                          'Prepare input data for SVM with spatial and anatomical regularization:\n'
+                          'http://clinica.run/doc/MachineLeaning_PrepareSpatialSVM',
+                          'clinica.pipelines.machine_learning_spatial_svm.spatial_svm_cli:SpatialSVMCLI'),
+        RegisteredCommand('statistics-surface',
+                          'Surface-based mass-univariate analysis with SurfStat:\n'
+                          'http://clinica.run/doc/Pipelines/Stats_Surface/',
+                          'clinica.pipelines.statistics_surface.statistics_surface_cli:StatisticsSurfaceCLI'),
+        RegisteredCommand('statistics-volume',
+                          'Volume-based mass-univariate analysis with SPM:\n'
+                          'http://clinica.run/doc/Pipelines/Statistics_Volume/',
+                          'clinica.pipelines.statistics_volume.statistics_volume_cli:StatisticsVolumeCLI'),
+        RegisteredCommand('statistics-volume-correction',
+                          'Statistical correction of statistics-volume pipeline:\n'
+                          'http://clinica.run/doc/Pipelines/Statistics_Volume/',
+                          'clinica.pipelines.statistics_volume_correction.statistics_volume_correction_cli:'
+                          'StatisticsVolumeCorrectionCLI'),
+        # Advanced pipelines:
+        RegisteredCommand('t1-volume-existing-template',
+                          'Volume-based processing of T1-weighted MR images using an existing DARTEL template:\n'
+                          'http://clinica.run/doc/Pipelines/T1_Volume/',
+                          'clinica.pipelines.t1_volume_existing_template.t1_volume_existing_template_cli:'
+                          'T1VolumeExistingTemplateCLI'),
+        RegisteredCommand('t1-volume-tissue-segmentation',
+                          'Tissue segmentation, bias correction and spatial normalization to MNI space of T1w '
+                          'images with SPM:\n'
+                          'http://clinica.run/doc/Pipelines/T1_Volume/',
+                          'clinica.pipelines.t1_volume_tissue_segmentation.t1_volume_tissue_segmentation_cli:'
+                          'T1VolumeTissueSegmentationCLI'),
+        RegisteredCommand('t1-volume-create-dartel',
+                          'Inter-subject registration using Dartel (creating a new Dartel template):\n'
+                          'http://clinica.run/doc/Pipelines/T1_Volume/',
+                          'clinica.pipelines.t1_volume_create_dartel.t1_volume_create_dartel_cli:'
+                          'T1VolumeCreateDartelCLI'),
+        RegisteredCommand('t1-volume-register-dartel',
+                          'Inter-subject registration using Dartel (using an existing Dartel template):\n'
+                          'http://clinica.run/doc/Pipelines/T1_Volume/',
+                          'clinica.pipelines.t1_volume_register_dartel.t1_volume_register_dartel_cli:'
+                          'T1VolumeRegisterDartelCLI'),
+        RegisteredCommand('t1-volume-dartel2mni',
+                          'Register DARTEL template to MNI space:\n'
+                          'http://clinica.run/doc/Pipelines/T1_Volume/',
+                          'clinica.pipelines.t1_volume_dartel2mni.t1_volume_dartel2mni_cli:T1VolumeDartel2MNICLI'),
+        RegisteredCommand('t1-volume-parcellation',
+                          'Computation of mean GM concentration for a set of regions:\n'
+                          'http://clinica.run/doc/Pipelines/T1_Volume/',
+                          'clinica.pipelines.t1_volume_parcellation.t1_volume_parcellation_cli:'
+                          'T1VolumeParcellationCLI'),
+        # Not displayed yet: t1-freesurfer-longitudinal, t1-freesurfer-template,
+        # t1-freesurfer-longitudinal-correction, pet-surface-longitudinal
+    ],
+    'convert': [
+        RegisteredCommand('adni-to-bids',
+                          'Convert ADNI (http://adni.loni.usc.edu/) into BIDS',
+                          'clinica.iotools.converters.adni_to_bids.adni_to_bids_cli:AdniToBidsCLI'),
+        RegisteredCommand('aibl-to-bids',
+                          'Convert AIBL (https://aibl.csiro.au/adni/index.html) into BIDS.',
+                          'clinica.iotools.converters.aibl_to_bids.aibl_to_bids_cli:AiblToBidsCLI'),
+        RegisteredCommand('oasis-to-bids',
+                          'Convert OASIS (http://oasis-brains.org/) into BIDS.',
+                          'clinica.iotools.converters.oasis_to_bids.oasis_to_bids_cli:OasisToBidsCLI'),
+        RegisteredCommand('nifd-to-bids',
+                          'Convert NIFD (http://4rtni-ftldni.ini.usc.edu/) into BIDS.',
+                          'clinica.iotools.converters.nifd_to_bids.nifd_to_bids_cli:NifdToBidsCLI'),
+    ],
+    'iotools': [
+        RegisteredCommand('create-subjects-visits',
+                          'Create a TSV file containing participants with their sessions',
+                          'clinica.iotools.utils.data_handling_cli:CmdParserSubjectsSessions'),
+        RegisteredCommand('merge-tsv',
+                          'Merge TSV files containing clinical data of a BIDS dataset into a single TSV file.',
+                          'clinica.iotools.utils.data_handling_cli:CmdParserMergeTsv'),
+        RegisteredCommand('check-missing-modalities',
+                          'Check missing modalities in a BIDS directory',
+                          'clinica.iotools.utils.data_handling_cli:CmdParserMissingModalities'),
+        RegisteredCommand('center-nifti',
+                          'Center NIFTI of a BIDS directory. Tool mainly used when SPM is not able \n'
+                          'to segment some T1w images because the centers of these volumes are not\n'
+                          'aligned with the origin of theworld coordinate system. By default, only\n'
+                          'problematic images are converted. The rest of the images are also copied\n'
+                          'to the new BIDS directory, but left untouched.',
+                          'clinica.iotools.utils.data_handling_cli:CmdParserCenterNifti'),
+        RegisteredCommand('convert-cross-sectional',
+                          'Convert a cross-sectional BIDS dataset into a longitudinal dataset (session ses-M00).\n'
+                          'Images are hardlinked when possible: modifying a converted image in place also\n'
+                          'modifies the original one. JSON and TSV files are copied and files already\n'
+                          'converted are skipped.',
+                          'clinica.iotools.utils.data_handling_cli:CmdParserConvertCrossSectional'),
+    ],
+    'visualize': [
+        RegisteredCommand('t1-freesurfer',
+                          'Cross-sectional pre-processing of T1w images with FreeSurfer:\n'
+                          'http://clinica.run/doc/Pipelines/T1_FreeSurfer/',
+                          'clinica.pipelines.t1_freesurfer.t1_freesurfer_visualizer:T1FreeSurferVisualizer'),
+    ],
+    'generate': [
+        RegisteredCommand('template',
+                          'Generate the skeleton for a new pipeline (for developers)',
+                          'clinica.engine.template:CmdGenerateTemplates'),
+    ],
+}
+
+
+def get_invoked_command(argv):
+    """Find the category and the sub-command invoked on the command line.
+
+    Args:
+        argv: Arguments of the command line, without the program name
+            (e.g. ['-v', 'run', 't1-linear', 'bids', 'caps']).
+
+    Returns:
+        Tuple (category, sub-command), with None for the missing elements
+        (e.g. ('run', None) for `clinica run --help`).
+    """
+    words = []
+    skip_next = False
+    for arg in argv:
+        if skip_next:
+            skip_next = False
+        elif arg in ['-l', '--logname']:
+            # Option of the clinica command followed by a value
+            skip_next = True
+        elif not arg.startswith('-'):
+            words.append(arg)
+            if len(words) == 2:
+                break
+    words += [None] * (2 - len(words))
+    return words[0], words[1]
+
+
+def get_command_line_arguments():
+    """Return the arguments of the command line, or the ones being completed by argcomplete."""
+    import os
+    import sys
+
+    if '_ARGCOMPLETE' in os.environ:
+        comp_line = os.environ.get('COMP_LINE', '')
+        comp_point = int(os.environ.get('COMP_POINT', len(comp_line)))
+        return comp_line[:comp_point].split()[1:]
+    return sys.argv[1:]
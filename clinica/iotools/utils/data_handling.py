@@ -544,6 +544,198 @@ def create_subs_sess_list(input_dir, output_dir,
     subjs_sess_tsv.close()
 
 
+def add_session_to_filename(filename, session='ses-M00'):
+    """
+    Transform a cross-sectional BIDS filename into a longitudinal one.
+
+    Examples:
+        sub-ADNI001_scans.tsv -> sub-ADNI001_ses-M00_scans.tsv
+        sub-023a_ses-M12_T1w.nii.gz -> sub-023a_ses-M12_T1w.nii.gz (no
+            modification done if filename already has a session)
+
+    Args:
+        filename: Name of the file (without folder).
+        session: Session added to the filename.
+
+    Returns:
+        Filename with '_<session>_' added just after participant_id.
+    """
+    import re
+
+    # ^(sub-[a-zA-Z0-9]*) participant_id stored in group(1)
+    # (?!ses-[a-zA-Z0-9]) do not match if there is already a 'ses-'
+    # (.*) the rest of the filename
+    m = re.search(r'(^sub-[a-zA-Z0-9]*)_(?!ses-[a-zA-Z0-9])(.*)', filename)
+    if m is None:
+        return filename
+    return m.group(1) + '_' + session + '_' + m.group(2)
+
+
+def find_cross_sectional_subjects(bids_dir):
+    """
+    Split the subjects of a BIDS dataset into cross-sectional and longitudinal subjects.
+
+    A subject is cross-sectional if one of its folders is not a session folder
+    (e.g. sub-01/anat instead of sub-01/ses-M00/anat).
+
+    Args:
+        bids_dir: Path to the BIDS directory.
+
+    Returns:
+        Tuple (list of cross-sectional subjects, list of longitudinal subjects).
+    """
+    import os
+
+    cross_subjects = []
+    long_subjects = []
+    for sub in sorted(os.listdir(bids_dir)):
+        if not sub.startswith('sub-') or not os.path.isdir(os.path.join(bids_dir, sub)):
+            continue
+        with os.scandir(os.path.join(bids_dir, sub)) as it:
+            folders = [entry.name for entry in it if entry.is_dir()]
+        if any(not folder.startswith('ses-') for folder in folders):
+            cross_subjects.append(sub)
+        else:
+            long_subjects.append(sub)
+    return cross_subjects, long_subjects
+
+
+def _reflink(src, dst):
+    """Create `dst` as a copy-on-write clone of `src` (Btrfs, XFS...). Return False if it is not supported."""
+    import os
+
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    # FICLONE ioctl of Linux
+    ficlone = 0x40049409
+    try:
+        with open(src, 'rb') as f_src, open(dst, 'wb') as f_dst:
+            fcntl.ioctl(f_dst.fileno(), ficlone, f_src.fileno())
+    except (OSError, IOError):
+        if os.path.lexists(dst):
+            os.remove(dst)
+        return False
+    return True
+
+
+# Files copied instead of hardlinked by convert_cross_sectional_to_longitudinal()
+SIDECAR_EXTENSIONS = ('.json', '.tsv', '.bval', '.bvec')
+
+
+def link_or_copy_file(src, dst, hardlink=True):
+    """
+    Create the file `dst` with the content of `src` without copying data when possible.
+
+    A hardlink is created if `src` and `dst` are on the same filesystem and
+    `hardlink` is True, otherwise a copy-on-write clone (reflink) if the
+    filesystem supports it. The file is copied as a last resort. If `dst`
+    already exists with the same content (same inode, or same size and
+    modification time), nothing is done.
+
+    Note that a hardlinked file shares its content with `src`: modifying one
+    of them in place modifies the other one.
+
+    Args:
+        src: Path to the source file.
+        dst: Path to the destination file (its folder must exist).
+        hardlink: If False, `dst` is a clone or a copy independent of `src`.
+
+    Returns:
+        'skipped', 'linked', 'reflinked' or 'copied'.
+    """
+    import os
+    import shutil
+
+    src_stat = os.stat(src)
+    try:
+        dst_stat = os.stat(dst)
+    except OSError:
+        dst_stat = None
+    if dst_stat is not None:
+        same_inode = (dst_stat.st_ino, dst_stat.st_dev) == (src_stat.st_ino, src_stat.st_dev)
+        if same_inode and hardlink:
+            return 'skipped'
+        if not same_inode and dst_stat.st_size == src_stat.st_size \
+                and dst_stat.st_mtime_ns == src_stat.st_mtime_ns:
+            return 'skipped'
+        os.remove(dst)
+
+    if hardlink:
+        try:
+            os.link(src, dst)
+            return 'linked'
+        except OSError:
+            # Different filesystems or hardlinks not supported
+            pass
+    if _reflink(src, dst):
+        shutil.copystat(src, dst)
+        return 'reflinked'
+    shutil.copy2(src, dst)
+    return 'copied'
+
+
+def convert_cross_sectional_to_longitudinal(bids_in, bids_out, cross_subjects=None, long_subjects=None,
+                                            n_threads=None):
+    """
+    Convert a cross-sectional BIDS dataset into a longitudinal Clinica-compliant dataset.
+
+    The folders of the cross-sectional subjects are moved to a ses-M00 session
+    (e.g. sub-01/anat/sub-01_T1w.nii.gz becomes
+    sub-01/ses-M00/anat/sub-01_ses-M00_T1w.nii.gz). The longitudinal subjects and
+    the files at the root of the dataset are kept as they are. Files are created
+    with link_or_copy_file() in a thread pool. The images are hardlinked when
+    possible: they share their content with the original BIDS directory, and
+    modifying one of them in place also modifies the original file. The
+    sidecar files (SIDECAR_EXTENSIONS, e.g. JSON and TSV files), which are small
+    and often edited, are copied (or cloned). The files which are already in
+    `bids_out` are skipped, so that a second conversion is almost instantaneous.
+
+    Args:
+        bids_in: Path to the cross-sectional BIDS directory.
+        bids_out: Path to the converted BIDS directory.
+        cross_subjects: List of the cross-sectional subjects (default: found with find_cross_sectional_subjects).
+        long_subjects: List of the longitudinal subjects (default: found with find_cross_sectional_subjects).
+        n_threads: Number of threads creating the files (default: chosen by ThreadPoolExecutor).
+
+    Returns:
+        Dictionary with the number of files per action ('skipped', 'linked', 'reflinked', 'copied').
+    """
+    import os
+    from collections import Counter
+    from concurrent.futures import ThreadPoolExecutor
+
+    if cross_subjects is None or long_subjects is None:
+        cross_subjects, long_subjects = find_cross_sectional_subjects(bids_in)
+
+    # List of (source, destination) files. Folders are created before the files are linked.
+    files = []
+    for f in os.listdir(bids_in):
+        if not f.startswith('.') and os.path.isfile(os.path.join(bids_in, f)):
+            files.append((os.path.join(bids_in, f), os.path.join(bids_out, f)))
+    for subjects, session in [(cross_subjects, 'ses-M00'), (long_subjects, None)]:
+        for sub in subjects:
+            sub_in = os.path.join(bids_in, sub)
+            sub_out = os.path.join(bids_out, sub, session) if session else os.path.join(bids_out, sub)
+            for root, dirs, filenames in os.walk(sub_in):
+                # Hidden files and folders are not converted
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+                folder_out = os.path.join(sub_out, os.path.relpath(root, sub_in))
+                os.makedirs(folder_out, exist_ok=True)
+                for filename in filenames:
+                    if filename.startswith('.'):
+                        continue
+                    new_filename = add_session_to_filename(filename, session) if session else filename
+                    files.append((os.path.join(root, filename), os.path.join(folder_out, new_filename)))
+    os.makedirs(bids_out, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        actions = Counter(executor.map(
+            lambda f: link_or_copy_file(*f, hardlink=not f[0].endswith(SIDECAR_EXTENSIONS)), files))
+    return {action: actions.get(action, 0) for action in ['skipped', 'linked', 'reflinked', 'copied']}
+
+
 def center_nifti_origin(input_image, output_image):
     """
 
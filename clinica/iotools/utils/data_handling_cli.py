@@ -202,3 +202,49 @@ class CmdParserCenterNifti(ce.CmdParser):
             cprint(Fore.GREEN + 'The list of centered NIfTI files is available here : ' + Fore.BLUE + log_file
                    + Fore.RESET)
         cprint('Please note that the rest of the input BIDS folder has also been copied to the output folder.')
+
+
+class CmdParserConvertCrossSectional(ce.CmdParser):
+
+    def define_name(self):
+        self._name = 'convert-cross-sectional'
+
+    def define_description(self):
+        self._description = 'Convert a cross-sectional BIDS dataset into a longitudinal dataset (session ses-M00).\n'\
+                            + 'Images are hardlinked when possible: modifying a converted image in place also\n'\
+                            + 'modifies the original one. JSON and TSV files are copied and files already\n'\
+                            + 'converted are skipped.'
+
+    def define_options(self):
+        self._args.add_argument("bids_directory",
+                                help='Path to the cross-sectional BIDS dataset directory.')
+        self._args.add_argument("output_bids_directory", nargs='?', default=None,
+                                help='Path to the converted BIDS dataset directory '
+                                     '(default: <bids_directory>_clinica_compliant).')
+        self._args.add_argument("-np", "--n_procs",
+                                metavar='N', type=int,
+                                help='Number of threads creating the files (default: chosen by Python).')
+
+    def run_command(self, args):
+        from os.path import abspath, basename, dirname, join
+        from colorama import Fore
+        from clinica.iotools.utils.data_handling import (convert_cross_sectional_to_longitudinal,
+                                                         find_cross_sectional_subjects)
+        from clinica.utils.inputs import check_bids_folder
+        from clinica.utils.stream import cprint
+
+        check_bids_folder(args.bids_directory)
+        bids_dir = abspath(args.bids_directory)
+        if args.output_bids_directory is None:
+            output_dir = join(dirname(bids_dir), basename(bids_dir) + '_clinica_compliant')
+        else:
+            output_dir = abspath(args.output_bids_directory)
+
+        cross_subjects, long_subjects = find_cross_sectional_subjects(bids_dir)
+        cprint('%d cross-sectional and %d longitudinal subjects found in %s.'
+               % (len(cross_subjects), len(long_subjects), bids_dir))
+        actions = convert_cross_sectional_to_longitudinal(bids_dir, output_dir, cross_subjects, long_subjects,
+                                                          n_threads=args.n_procs)
+        cprint('Files hardlinked: %d, cloned: %d, copied: %d, already converted: %d.'
+               % (actions['linked'], actions['reflinked'], actions['copied'], actions['skipped']))
+        cprint('%sThe converted BIDS dataset is located here: %s%s' % (Fore.GREEN, output_dir, Fore.RESET))
@@ -54,53 +54,24 @@ class DwiDti(cpe.Pipeline):
 
         import nipype.interfaces.utility as nutil
         import nipype.pipeline.engine as npe
-        from clinica.utils.inputs import clinica_file_reader
+        from clinica.utils.inputs import clinica_list_of_files_reader
         from clinica.utils.exceptions import ClinicaCAPSError, ClinicaException
         import clinica.utils.input_files as input_files
         from clinica.utils.stream import cprint
 
-        all_errors = []
-
-        # b0 Mask
-        try:
-            b0_mask = clinica_file_reader(self.subjects,
-                                          self.sessions,
-                                          self.caps_directory,
-                                          input_files.DWI_PREPROC_BRAINMASK)
-        except ClinicaException as e:
-            all_errors.append(e)
-
-        # DWI preprocessing NIfTI
+        # All the files are read at once: the errors of all the patterns are gathered in a single exception
         try:
-            dwi_caps = clinica_file_reader(self.subjects,
-                                           self.sessions,
-                                           self.caps_directory,
-                                           input_files.DWI_PREPROC_NII)
+            b0_mask, dwi_caps, bval_files, bvec_files = clinica_list_of_files_reader(
+                self.subjects,
+                self.sessions,
+                self.caps_directory,
+                [input_files.DWI_PREPROC_BRAINMASK,
+                 input_files.DWI_PREPROC_NII,
+                 input_files.DWI_PREPROC_BVAL,
+                 input_files.DWI_PREPROC_BVEC])
         except ClinicaException as e:
-            all_errors.append(e)
-
-        # bval files
-        try:
-            bval_files = clinica_file_reader(self.subjects,
-                                             self.sessions,
-                                             self.caps_directory,
-                                             input_files.DWI_PREPROC_BVAL)
-        except ClinicaException as e:
-            all_errors.append(e)
-
-        # bvec files
-        try:
-            bvec_files = clinica_file_reader(self.subjects,
-                                             self.sessions,
-                                             self.caps_directory,
-                                             input_files.DWI_PREPROC_BVEC)
-        except ClinicaException as e:
-            all_errors.append(e)
-
-        if len(all_errors) > 0:
             error_message = 'Clinica faced error(s) while trying to read files in your CAPS directory.\n'
-            for msg in all_errors:
-                error_message += str(msg)
+            error_message += str(e)
             raise ClinicaCAPSError(error_message)
 
         read_input_node = npe.Node(name="LoadingCLIArguments",
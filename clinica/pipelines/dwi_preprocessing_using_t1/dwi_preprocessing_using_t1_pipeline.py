@@ -65,49 +65,24 @@ class DwiPreprocessingUsingT1(cpe.Pipeline):
         """
         import nipype.interfaces.utility as nutil
         import nipype.pipeline.engine as npe
-        from clinica.utils.inputs import clinica_file_reader
+        from clinica.utils.inputs import clinica_list_of_files_reader
         from clinica.utils.dwi import check_dwi_volume
         from clinica.utils.exceptions import ClinicaBIDSError, ClinicaException
         import clinica.utils.input_files as input_files
 
-        all_errors = []
+        # All the files are read at once: the errors of all the patterns are gathered in a single exception
         try:
-            t1w_files = clinica_file_reader(self.subjects,
-                                            self.sessions,
-                                            self.bids_directory,
-                                            input_files.T1W_NII)
+            t1w_files, dwi_files, bval_files, bvec_files = clinica_list_of_files_reader(
+                self.subjects,
+                self.sessions,
+                self.bids_directory,
+                [input_files.T1W_NII,
+                 input_files.DWI_NII,
+                 input_files.DWI_BVAL,
+                 input_files.DWI_BVEC])
         except ClinicaException as e:
-            all_errors.append(e)
-        try:
-            dwi_files = clinica_file_reader(self.subjects,
-                                            self.sessions,
-                                            self.bids_directory,
-                                            input_files.DWI_NII)
-        except ClinicaException as e:
-            all_errors.append(e)
-
-        # bval files
-        try:
-            bval_files = clinica_file_reader(self.subjects,
-                                             self.sessions,
-                                             self.bids_directory,
-                                             input_files.DWI_BVAL)
-        except ClinicaException as e:
-            all_errors.append(e)
-
-        # bvec files
-        try:
-            bvec_files = clinica_file_reader(self.subjects,
-                                             self.sessions,
-                                             self.bids_directory,
-                                             input_files.DWI_BVEC)
-        except ClinicaException as e:
-            all_errors.append(e)
-
-        if len(all_errors) > 0:
             error_message = 'Clinica faced error(s) while trying to read files in your BIDS directory.\n'
-            for msg in all_errors:
-                error_message += str(msg)
+            error_message += str(e)
             raise ClinicaBIDSError(error_message)
 
         # Perform the check after potential issue while reading inputs
@@ -62,6 +62,9 @@ class Pipeline(Workflow):
         sessions (list): List of sessions defined in the `subjects.tsv` file.
         tsv_file (str): Path to the subjects-sessions `.tsv` file.
         info_file (str): Path to the associated `info.json` file.
+        execution_policy (:obj:`ExecutionPolicy`): Decisions taken without
+            asking the user when the pipeline is run (see
+            clinica.utils.execution_policy).
     """
 
     __metaclass__ = abc.ABCMeta
@@ -103,6 +106,10 @@ class Pipeline(Workflow):
             os.path.dirname(os.path.abspath(inspect.getfile(self.__class__))),
             'info.json')
         self._info = {}
+        # Input files of the images to process, used by the completion ledger
+        self._ledger_inputs = None
+        # Execution policy (None: policy of the current process, see clinica.utils.execution_policy)
+        self._execution_policy = None
 
         if base_dir is None:
             self.base_dir = mkdtemp()
@@ -237,7 +244,10 @@ class Pipeline(Workflow):
         run it.
         It also checks whether there is enough space left on the disks, and if
         the number of threads to run in parallel is consistent with what is
-        possible on the CPU.
+        possible on the CPU. No question is asked to the user: decisions are
+        taken according to the execution policy of the pipeline. If profiling
+        is enabled by the policy, a report of the resources used by each node is
+        written in the current directory at the end of the run.
 
         Args:
             Similar to those of Workflow.run.
@@ -245,28 +255,45 @@ class Pipeline(Workflow):
         Returns:
             An execution graph (see Workflow.run).
         """
+        import os
         import shutil
+        import time
         from networkx import Graph, NetworkXError
         from colorama import Fore
+        from clinica.utils.profiling import PipelineProfiler
         from clinica.utils.ux import print_failed_images
         from clinica.utils.stream import cprint
 
         if not self.is_built:
+            self.skip_completed_images()
+            if self._ledger_inputs is not None and len(self.subjects) == 0:
+                cprint('%sAll the images were already run by the pipeline.\n%s' % (Fore.BLUE, Fore.RESET))
+                return Graph()
             self.build()
         self.check_not_cross_sectional()
         if not bypass_check:
             self.check_size()
             plugin_args = self.update_parallelize_info(plugin_args)
             plugin = 'MultiProc'
+        profiler = None
+        if self.execution_policy.profile:
+            profiler = PipelineProfiler(self.name)
+            profiler.enable()
+            plugin_args = dict(plugin_args or {})
+            plugin_args['status_callback'] = profiler.status_callback
         exec_graph = []
+        start_time = time.time()
         try:
             exec_graph = Workflow.run(self, plugin, plugin_args, update_hash)
+            self.update_ledger()
             if not self.base_dir_was_specified:
                 shutil.rmtree(self.base_dir)
 
         except RuntimeError as e:
             # Check that it is a Nipype error
             if 'Workflow did not execute cleanly. Check log for details' in str(e):
+                # Only the images whose outputs were written by this run are recorded as completed
+                self.update_ledger(newer_than=start_time)
                 input_ids = [p_id + '_' + s_id
                              for p_id, s_id in zip(self.subjects, self.sessions)]
                 output_ids = self.get_processed_images(
@@ -282,8 +309,115 @@ class Pipeline(Workflow):
             cprint('%sEither all the images were already run by the pipeline or no image was found '
                    'to run the pipeline.\n%s' % (Fore.BLUE, Fore.RESET))
             exec_graph = Graph()
+        finally:
+            if profiler is not None:
+                profiler.write_report(os.getcwd(), plugin_args)
         return exec_graph
 
+    def get_ledger_information(self):
+        """Describe the files recorded for each image in the completion ledger.
+
+        Pipelines overwrite this method to record their processed images in the
+        completion ledger of the CAPS directory (see clinica.utils.ledger) and
+        skip them when they are run again with the same parameters and inputs.
+
+        Returns:
+            None if the pipeline does not use the ledger (default). Otherwise, a
+            tuple (list_input_information, list_output_information) where
+            list_input_information is a list of (directory, information dict)
+            describing the input files of an image and list_output_information is a
+            list of information dicts describing its outputs in the CAPS directory
+            (see clinica_file_reader for the information dicts).
+        """
+        return None
+
+    def skip_completed_images(self):
+        """Remove from the images to process the ones recorded as completed in the ledger.
+
+        An image is completed if it was processed with the same parameters and
+        the same input files, and if its outputs still exist. Nothing is done if
+        the pipeline does not use the ledger or if the CAPS directory is
+        overwritten.
+
+        Returns:
+            self: A Pipeline object.
+        """
+        from colorama import Fore
+        from clinica.utils.ledger import CompletionLedger, find_image_files, get_parameters_hash
+        from clinica.utils.stream import cprint
+
+        self._ledger_inputs = None
+        ledger_information = self.get_ledger_information()
+        if ledger_information is None or self.caps_directory is None:
+            return self
+
+        list_input_information, _ = ledger_information
+        # Input files of each image (None if an input is missing)
+        image_inputs = [[] for _ in self.subjects]
+        for directory, information in list_input_information:
+            found = find_image_files(directory, self.subjects, self.sessions, [information])
+            image_inputs = [files + new_files if files is not None and new_files is not None else None
+                            for files, new_files in zip(image_inputs, found)]
+
+        parameters_hash = get_parameters_hash(self.name, self.parameters)
+        ledger = CompletionLedger(self.caps_directory, self.name)
+        completed_ids = []
+        subjects, sessions = [], []
+        self._ledger_inputs = {}
+        for subject, session, input_files in zip(self.subjects, self.sessions, image_inputs):
+            image_id = subject + '_' + session
+            if not self.overwrite_caps and input_files is not None \
+                    and ledger.is_completed(image_id, parameters_hash, input_files):
+                completed_ids.append(image_id)
+            else:
+                subjects.append(subject)
+                sessions.append(session)
+                self._ledger_inputs[image_id] = input_files
+
+        if len(completed_ids) > 0:
+            cprint("%sClinica found %s image(s) already completed with the same parameters and inputs "
+                   "(see %s):%s" % (Fore.YELLOW, len(completed_ids), ledger.ledger_file, Fore.RESET))
+            for image_id in completed_ids:
+                cprint("%s\t%s%s" % (Fore.YELLOW, image_id.replace('_', ' | '), Fore.RESET))
+            cprint("%s\nImage(s) will be ignored by Clinica.\n%s" % (Fore.YELLOW, Fore.RESET))
+        self.subjects, self.sessions = subjects, sessions
+        return self
+
+    def update_ledger(self, newer_than=None):
+        """Record in the completion ledger the images whose outputs were found in the CAPS directory.
+
+        Args:
+            newer_than (optional): If given, only the images whose outputs were
+                all modified after this time (in seconds since the Epoch) are recorded.
+
+        Returns:
+            self: A Pipeline object.
+        """
+        import os
+        from clinica.utils.ledger import CompletionLedger, find_image_files, get_parameters_hash
+
+        if not self._ledger_inputs:
+            return self
+
+        _, list_output_information = self.get_ledger_information()
+        subjects = [image_id.split('_')[0] for image_id in self._ledger_inputs]
+        sessions = [image_id.split('_')[1] for image_id in self._ledger_inputs]
+        image_outputs = find_image_files(self.caps_directory, subjects, sessions, list_output_information)
+
+        parameters_hash = get_parameters_hash(self.name, self.parameters)
+        ledger = CompletionLedger(self.caps_directory, self.name)
+        for (image_id, input_files), output_files in zip(self._ledger_inputs.items(), image_outputs):
+            if input_files is None or not output_files:
+                continue
+            if newer_than is not None and any(os.path.getmtime(f) < newer_than for f in output_files):
+                continue
+            try:
+                ledger.record(image_id, parameters_hash, input_files, output_files)
+            except OSError:
+                # The image will simply be processed again next time
+                pass
+        return self
+
     def load_info(self):
         """Loads the associated info.json file.
 
@@ -367,11 +501,9 @@ class Pipeline(Workflow):
         Author: Arnaud Marcoux"""
         from os import statvfs
         from os.path import dirname, abspath, join
-        from pandas import read_csv
+        from clinica.utils.exceptions import ClinicaException
         from clinica.utils.stream import cprint
         from colorama import Fore
-        import sys
-        import select
 
         SYMBOLS = {
             'customary': ('B', 'K', 'M', 'G', 'T', 'P', 'E', 'Z', 'Y'),
@@ -446,8 +578,6 @@ class Pipeline(Workflow):
                 prefix[s] = 1 << (i + 1) * 10
             return int(num * prefix[letter])
 
-        timeout = 15
-
         # Get the number of sessions
         n_sessions = len(self.subjects)
         try:
@@ -486,25 +616,12 @@ class Pipeline(Workflow):
                                      + 'drive (' + bytes2human(free_space_wd) + ')\n')
             if error != '':
                 cprint(Fore.RED + '[SpaceError] ' + error + Fore.RESET)
-                while True:
-                    cprint('Do you still want to run the pipeline? (yes/no): '
-                           + ' In ' + str(timeout) + ' sec the pipeline will start if you do not answer.')
-                    stdin_answer, __, ___ = select.select([sys.stdin], [], [], timeout)
-                    if stdin_answer:
-                        answer = str(sys.stdin.readline().strip())
-                    # Else: is taken when no answer is given (timeout)
-                    else:
-                        answer = 'yes'
-
-                    if answer.lower() in ['yes', 'no']:
-                        break
-                    else:
-                        cprint('Possible answers are yes or no.\n')
-                if answer.lower() == 'yes':
-                    cprint('Running the pipeline anyway.')
-                if answer.lower() == 'no':
-                    cprint('Exiting clinica...')
-                    sys.exit()
+                if self.execution_policy.disk_policy == 'abort':
+                    raise ClinicaException('%s[Error] Not enough space left on the disk to run the pipeline. Free '
+                                           'some space or use the "warn" disk policy (--disk_policy argument or '
+                                           'CLINICA_DISK_POLICY environment variable) to run it anyway.%s'
+                                           % (Fore.RED, Fore.RESET))
+                cprint('Running the pipeline anyway.')
 
         except KeyError:
             cprint(Fore.RED + 'No info on how much size the pipeline takes. '
@@ -512,238 +629,75 @@ class Pipeline(Workflow):
 
     def update_parallelize_info(self, plugin_args):
         """ Performs some checks of the number of threads given in parameters,
-        given the number of CPUs of the machine in which clinica is running.
+        given the number of CPUs available to clinica.
         We force the use of plugin MultiProc
 
+        If the number of threads is not given in `plugin_args`, it is taken from
+        the execution policy (see clinica.utils.execution_policy), which derives
+        it from the CPU and memory limits of the process if needed. The memory
+        budget of the execution policy is also given to the MultiProc plugin.
+
         Author: Arnaud Marcoux"""
         from clinica.utils.stream import cprint
-        from multiprocessing import cpu_count
+        from clinica.utils.execution_policy import get_available_cpus
         from colorama import Fore
-        import select
-        import sys
 
-        # count number of CPUs
-        n_cpu = cpu_count()
-        # timeout value: max time allowed to decide how many thread
-        # to run in parallel (sec)
-        timeout = 15
+        # count number of CPUs available to clinica
+        n_cpu = get_available_cpus()
+        policy = self.execution_policy
 
-        # Use this var to know in the end if we need to ask the user
-        # an other number
-        ask_user = False
+        # If plugin_args is None, create the dictionary
+        if plugin_args is None:
+            plugin_args = {}
 
-        try:
-            # if no --n_procs arg is used, plugin_arg is None
-            # so we need a try / except block
+        if plugin_args.get('n_procs'):
             n_thread_cmdline = plugin_args['n_procs']
             if n_thread_cmdline > n_cpu:
                 cprint(Fore.YELLOW + '[Warning] You are trying to run clinica '
                        + 'with a number of threads (' + str(n_thread_cmdline)
                        + ') superior to your number of CPUs (' + str(n_cpu)
                        + ').' + Fore.RESET)
-                ask_user = True
-        except TypeError:
-            cprint(Fore.YELLOW + '\n[Warning] You did not specify the number of '
-                   + 'threads to run in parallel (--n_procs argument).'
-                   + Fore.RESET)
-            cprint(Fore.YELLOW + 'Computation time can be shorten as you have '
-                   + str(n_cpu) + ' CPUs on this computer. We recommend using '
-                   + str(n_cpu - 1) + ' threads.\n' + Fore.RESET)
-            ask_user = True
-
-        if ask_user:
-            while True:
-                # While True allows to ask indefinitely until
-                # user gives a answer that has the correct format
-                # (here, positive integer) or timeout
-                cprint('How many threads do you want to use? If you do not '
-                       + 'answer within ' + str(timeout)
-                       + ' sec, default value of ' + str(n_cpu - 1)
-                       + ' will be taken. Use --n_procs argument if you want to disable this message next time.')
-                stdin_answer, __, ___ = select.select([sys.stdin], [], [], timeout)
-                if stdin_answer:
-                    answer = str(sys.stdin.readline().strip())
-                else:
-                    answer = str(max(n_cpu - 1, 1))
-                if answer.isnumeric():
-                    if int(answer) > 0:
-                        break
-                cprint(Fore.RED + 'Your answer must be a positive integer.'
-                       + Fore.RESET)
-            # If plugin_args is None, create the dictionary
-            # If it already a dict, just update (or create -it is the same
-            # code-) the correct key / value
-            if plugin_args is None:
-                plugin_args = {'n_procs': int(answer)}
-            else:
-                plugin_args['n_procs'] = int(answer)
+        else:
+            plugin_args['n_procs'] = policy.get_n_procs()
+            if policy.n_procs is None:
+                cprint('%sThe number of threads to run in parallel was not specified (--n_procs argument or '
+                       'CLINICA_N_PROCS environment variable): %s thread(s) will be used based on the CPUs and '
+                       'memory available.%s' % (Fore.YELLOW, plugin_args['n_procs'], Fore.RESET))
+
+        # Heavy nodes declare their memory needs and threads (mem_gb and n_procs
+        # arguments of npe.Node, conservative upper bounds which can be checked
+        # against the peak RSS of the --profile report): the MultiProc plugin
+        # only runs them in parallel while they fit in this budget
+        if 'memory_gb' not in plugin_args:
+            memory_gb = policy.get_memory_gb()
+            if memory_gb is not None:
+                plugin_args['memory_gb'] = memory_gb
+        # A node needing more than the budget is run alone instead of stopping the pipeline
+        plugin_args.setdefault('raise_insufficient', False)
 
         return plugin_args
 
     def check_not_cross_sectional(self):
         """
         This function checks if the dataset is longitudinal. If it is cross
-        sectional, clinica proposes to convert it in a clinica compliant form.
+        sectional, clinica converts it in a clinica compliant form or stops,
+        depending on the execution policy. The conversion (see
+        `clinica iotools convert-cross-sectional`) hardlinks the images when
+        possible, copies the sidecar files and skips the files already converted
+        by a previous run.
 
         author: Arnaud Marcoux
         """
-        from os import listdir
-        from os.path import join, isdir, dirname, abspath, basename
+        from os.path import join, dirname, abspath, basename
         from colorama import Fore
+        from clinica.iotools.utils.data_handling import (convert_cross_sectional_to_longitudinal,
+                                                         find_cross_sectional_subjects)
+        from clinica.utils.exceptions import ClinicaBIDSError
         from clinica.utils.stream import cprint
-        import sys
 
-        def convert_cross_sectional(bids_in,
-                                    bids_out,
-                                    cross_subjects,
-                                    long_subjects):
-            """
-            This function converts a cross-sectional-bids dataset into a
-            longitudinal clinica-compliant dataset
-
-            Args:
-                bids_in: cross sectional bids dataset you want to convert
-                bids_out: converted longitudinal bids dataset
-                cross_subjects: list of subjects in cross sectional form
-                (they need some adjustment)
-                long_subjects: list of subjects in longitudinal form (they
-                just need to be copied)
-
-            Returns:
-                nothing
-            """
-            from os.path import exists, isfile
-            from os import mkdir
-            from shutil import copytree, copy2
-
-            def add_ses(f):
-                """
-                Use this function to transform a cross sectional filename into
-                a longitudinal one.
-                Examples:
-                sub-ADNI001_scans.tsv -> sub-ADNI001_ses-M00_scans.tsv
-                sub-023a_ses-M12_T1w.nii.gz -> sub-023a_ses-M12_T1w.nii.gz (no
-                    modification done if filename already has a session)
-
-                Args:
-                    f: filename
-
-                Returns:
-                    filename with '_ses-M00_ added just after participant_id
-                """
-                import re
-                # If filename contains ses-..., returns the original filename
-                # Regex explication:
-                # ^ start of string
-                # ([a-zA-Z0-9]*) matches any number of characters from a to z,
-                #       A to Z, 0 to 9, and store it in group(1)
-                # (?!ses-[a-zA-Z0-9]) do not match if there is already a 'ses-'
-                # (.*) catches the rest of the string
-                m = re.search(r'(^sub-[a-zA-Z0-9]*)_(?!ses-[a-zA-Z0-9])(.*)',
-                              f)
-                try:
-                    return m.group(1) + '_ses-M00_' + m.group(2)
-                except AttributeError:
-                    # If something goes wrong, we return the original filename
-                    return f
-
-            def copy2_add_ses(src, dst):
-                """
-                copy2_add_ses calls copy2 function from shutil, but modifies
-                the filename of the copied files if they match the regex
-                template described in add_ses() function
-
-                Args:
-                    src: path to the file that needs to be copied
-                    dst: original destination for the copied file
-
-                Returns:
-                    copy2 with modified filename
-                """
-                from shutil import copy2
-                from os.path import join, dirname, basename
-
-                dst_modified = join(dirname(dst), add_ses(basename(src)))
-                return copy2(src, dst_modified)
-
-            if not exists(bids_out):
-                # Create the output folder if it does not exists yet
-                mkdir(bids_out)
-
-            # First part of the algorithm: deal with subjects that does not
-            # have longitudinal (session) information
-            for subj in cross_subjects:
-                # Get list of of files/folders to copy. Remove hidden element
-                # ( if they start with a dot '.')
-                to_copy = [f for f in listdir(join(bids_in, subj)) if
-                           not f.startswith('.')]
-                # Always check that folder are existing, otherwise an exception
-                # is raised even though that does not prevent the function from
-                # working
-                if not exists(join(bids_out, subj)):
-                    mkdir(join(bids_out, subj))
-                if not exists(join(bids_out, subj, 'ses-M00')):
-                    mkdir(join(bids_out, subj, 'ses-M00'))
-                for el in to_copy:
-                    path_el = join(bids_in, subj, el)
-                    if not exists(join(bids_out, subj, 'ses-M00', el)):
-                        # If the element to copy is a folder...
-                        if isdir(path_el):
-                            # Copytree is used with a 'custom' copy function,
-                            # to give a correct filemename to the files inside
-                            # the copied folders
-                            copytree(path_el,
-                                     join(bids_out, subj, 'ses-M00',
-                                          basename(path_el)),
-                                     copy_function=copy2_add_ses)
-                        # If the element to copy is a file...
-                        elif isfile(path_el):
-                            # Modify the filename with add_ses function
-                            new_filename_wo_ses = add_ses(el)
-                            copy2(path_el,
-                                  join(bids_out, subj, 'ses-M00',
-                                       new_filename_wo_ses))
-            # Second part of the algorithm: deal with subjects that do not
-            # have the problem. We only xopy the content of the folder, and no
-            # filename needs to be changed
-            for su in long_subjects:
-                # Do not copy hidden files
-                to_copy = [f for f in listdir(join(bids_in, su))
-                           if not f.startswith('.')]
-                if not exists(join(bids_out, su)):
-                    mkdir(join(bids_out, su))
-                for el in to_copy:
-                    path_el = join(bids_in, su, el)
-                    if not exists(join(bids_out, su, el)):
-                        # 2 possible cases: element to pcopy is a folder or a
-                        # file
-                        if isdir(path_el):
-                            copytree(path_el,
-                                     join(bids_out, su, basename(path_el)))
-                        elif isfile(path_el):
-                            copy2(path_el,
-                                  join(bids_out, su))
         if self.bids_directory is not None:
             bids_dir = abspath(self.bids_directory)
-            # Extract all subjects in BIDS directory: element must be a folder and
-            # a name starting with 'sub-'
-            all_subs = [f for f in listdir(bids_dir)
-                        if isdir(join(bids_dir, f)) and f.startswith('sub-')]
-            cross_subj = []
-            long_subj = []
-            for sub in all_subs:
-                # Use is_cross_sectional to know if the current subject needs to be
-                # labeled as cross sectional
-                is_cross_sectional = False
-                folder_list = [f for f in listdir(join(bids_dir, sub))
-                               if isdir(join(bids_dir, sub, f))]
-                for fold in folder_list:
-                    if not fold.startswith('ses-'):
-                        is_cross_sectional = True
-                if is_cross_sectional:
-                    cross_subj.append(sub)
-                else:
-                    long_subj.append(sub)
+            cross_subj, long_subj = find_cross_sectional_subjects(bids_dir)
 
             # The following code is run if cross sectional subjects have been found
             if len(cross_subj) > 0:
@@ -757,26 +711,21 @@ class Pipeline(Workflow):
                 proposed_bids = join(dirname(bids_dir),
                                      basename(bids_dir) + '_clinica_compliant')
 
-                while True:
-                    cprint('Do you want to proceed to the conversion in an other '
-                           + 'folder? (your original BIDS folder will not be'
-                           + ' modified, the folder ' + proposed_bids
-                           + ' will be created) (yes/no): ')
-                    answer = input('')
-                    if answer.lower() in ['yes', 'no']:
-                        break
-                    else:
-                        cprint('Possible answers are yes or no.\n')
-                if answer.lower() == 'no':
-                    cprint('Exiting clinica...')
-                    sys.exit()
+                if self.execution_policy.cross_sectional == 'abort':
+                    raise ClinicaBIDSError(
+                        '%s[Error] Clinica can convert your dataset in another folder (the folder %s will be '
+                        'created). The images are hardlinked when possible: they share their content with your '
+                        'original BIDS folder, so modifying a converted image in place also modifies the original '
+                        'one (JSON and TSV files are copied). Use the "convert" cross-sectional '
+                        'policy (--cross_sectional argument or CLINICA_CROSS_SECTIONAL environment variable) to '
+                        'proceed to the conversion.%s' % (Fore.RED, proposed_bids, Fore.RESET))
                 else:
                     cprint(
                         'Converting cross-sectional dataset into longitudinal...')
-                    convert_cross_sectional(bids_dir,
-                                            proposed_bids,
-                                            cross_subj,
-                                            long_subj)
+                    convert_cross_sectional_to_longitudinal(bids_dir,
+                                                            proposed_bids,
+                                                            cross_subj,
+                                                            long_subj)
                     cprint(
                         Fore.GREEN + 'Conversion succeeded. Your clinica-compliant'
                         + ' dataset is located here: ' + proposed_bids
@@ -794,6 +743,17 @@ class Pipeline(Workflow):
     @property
     def overwrite_caps(self): return self._overwrite_caps
 
+    @property
+    def execution_policy(self):
+        from clinica.utils.execution_policy import get_execution_policy
+        if self._execution_policy is None:
+            return get_execution_policy()
+        return self._execution_policy
+
+    @execution_policy.setter
+    def execution_policy(self, value):
+        self._execution_policy = value
+
     @property
     def parameters(self): return self._parameters
 
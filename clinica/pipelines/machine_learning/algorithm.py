@@ -3,7 +3,6 @@
 
 from os import path
 import json
-from multiprocessing.pool import ThreadPool
 import datetime
 
 import numpy as np
@@ -12,6 +11,7 @@ import pandas as pd
 from sklearn.svm import SVC
 from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import RandomForestClassifier
+import xgboost
 from xgboost import XGBClassifier
 from sklearn.model_selection import StratifiedKFold
 from sklearn.metrics import roc_auc_score
@@ -31,27 +31,57 @@ __email__ = "jorge.samper-gonzalez@inria.fr"
 __status__ = "Development"
 
 
+def _get_multiclass_svm_weights(classifier, y, x):
+    """
+    Weights of the binary SVMs of a OneVsOneClassifier or OneVsRestClassifier, one row per binary SVM.
+
+    A one-vs-rest SVM is trained on all the subjects. A one-vs-one SVM is
+    trained on the subjects of its two classes: its support vectors are
+    indexed among these subjects.
+    """
+    if not isinstance(classifier, OneVsOneClassifier):
+        return np.array([utils.get_svm_weights(estimator.dual_coef_[0], estimator.support_, x)
+                         for estimator in classifier.estimators_])
+
+    weights = []
+    classes = classifier.classes_
+    pairs = itertools.combinations(range(len(classes)), 2)
+    for k, ((i, j), estimator) in enumerate(zip(pairs, classifier.estimators_)):
+        if getattr(classifier, 'pairwise_indices_', None) is not None:
+            samples = classifier.pairwise_indices_[k]
+        else:
+            samples = np.flatnonzero(np.logical_or(y == classes[i], y == classes[j]))
+        weights.append(utils.get_svm_weights(estimator.dual_coef_[0], samples[estimator.support_], x))
+    return np.array(weights)
+
+
 class DualSVMAlgorithm(base.MLAlgorithm):
 
     def _launch_svc(self, kernel_train, x_test, y_train, y_test, c):
 
+        # Probabilities (Platt scaling, fitted with an internal cross-validation) are not needed:
+        # the AUC is computed from the decision function, which ranks the subjects in the same way
         if self._algorithm_params['balanced']:
-            svc = SVC(C=c, kernel='precomputed', probability=True, tol=1e-6, class_weight='balanced')
+            svc = SVC(C=c, kernel='precomputed', tol=1e-6, class_weight='balanced')
         else:
-            svc = SVC(C=c, kernel='precomputed', probability=True, tol=1e-6)
+            svc = SVC(C=c, kernel='precomputed', tol=1e-6)
 
         svc.fit(kernel_train, y_train)
         y_hat_train = svc.predict(kernel_train)
         y_hat = svc.predict(x_test)
-        proba_test = svc.predict_proba(x_test)[:, 1]
-        auc = roc_auc_score(y_test, proba_test)
+        auc = roc_auc_score(y_test, svc.decision_function(x_test))
 
         return svc, y_hat, auc, y_hat_train
 
     def _grid_search(self, kernel_train, x_test, y_train, y_test, c):
 
-        _, y_hat, _, _ = self._launch_svc(kernel_train, x_test, y_train, y_test, c)
-        res = utils.evaluate_prediction(y_test, y_hat)
+        if self._algorithm_params['balanced']:
+            svc = SVC(C=c, kernel='precomputed', tol=1e-6, class_weight='balanced')
+        else:
+            svc = SVC(C=c, kernel='precomputed', tol=1e-6)
+
+        svc.fit(kernel_train, y_train)
+        res = utils.evaluate_prediction(y_test, svc.predict(x_test))
 
         return res['balanced_accuracy']
 
@@ -79,33 +109,32 @@ class DualSVMAlgorithm(base.MLAlgorithm):
 
     def evaluate(self, train_index, test_index):
 
-        inner_pool = ThreadPool(self._algorithm_params['n_threads'])
-        async_result = {}
-        for i in range(self._algorithm_params['grid_search_folds']):
-            async_result[i] = {}
+        with self.executor_scope() as inner_pool:
+            async_result = {}
+            for i in range(self._algorithm_params['grid_search_folds']):
+                async_result[i] = {}
 
-        outer_kernel = self._kernel[train_index, :][:, train_index]
-        y_train = self._y[train_index]
+            outer_kernel = utils.get_kernel_slice(self._kernel, train_index, train_index)
+            y_train = self._y[train_index]
 
-        skf = StratifiedKFold(n_splits=self._algorithm_params['grid_search_folds'], shuffle=True)
-        inner_cv = list(skf.split(np.zeros(len(y_train)), y_train))
+            skf = StratifiedKFold(n_splits=self._algorithm_params['grid_search_folds'], shuffle=True)
+            inner_cv = list(skf.split(np.zeros(len(y_train)), y_train))
 
-        for i in range(len(inner_cv)):
-            inner_train_index, inner_test_index = inner_cv[i]
+            for i in range(len(inner_cv)):
+                inner_train_index, inner_test_index = inner_cv[i]
 
-            inner_kernel = outer_kernel[inner_train_index, :][:, inner_train_index]
-            x_test_inner = outer_kernel[inner_test_index, :][:, inner_train_index]
-            y_train_inner, y_test_inner = y_train[inner_train_index], y_train[inner_test_index]
+                # Sub-matrices of the inner split, copied once and shared read-only by the tasks of all the C values
+                inner_kernel = utils.get_kernel_slice(outer_kernel, inner_train_index, inner_train_index)
+                x_test_inner = utils.get_kernel_slice(outer_kernel, inner_test_index, inner_train_index)
+                y_train_inner, y_test_inner = y_train[inner_train_index], y_train[inner_test_index]
 
-            for c in self._algorithm_params['c_range']:
-                async_result[i][c] = inner_pool.apply_async(self._grid_search,
-                                                            (inner_kernel, x_test_inner,
-                                                             y_train_inner, y_test_inner, c))
-        inner_pool.close()
-        inner_pool.join()
-
-        best_parameter = self._select_best_parameter(async_result)
-        x_test = self._kernel[test_index, :][:, train_index]
+                for c in self._algorithm_params['c_range']:
+                    async_result[i][c] = inner_pool.apply_async(self._grid_search,
+                                                                (inner_kernel, x_test_inner,
+                                                                 y_train_inner, y_test_inner, c))
+
+            best_parameter = self._select_best_parameter(async_result)
+        x_test = utils.get_kernel_slice(self._kernel, test_index, train_index)
         y_train, y_test = self._y[train_index], self._y[test_index]
 
         _, y_hat, auc, y_hat_train = self._launch_svc(outer_kernel, x_test, y_train, y_test, best_parameter['c'])
@@ -155,11 +184,7 @@ class DualSVMAlgorithm(base.MLAlgorithm):
 
     def save_weights(self, classifier, x, output_dir):
 
-        dual_coefficients = classifier.dual_coef_
-        sv_indices = classifier.support_
-
-        weighted_sv = dual_coefficients.transpose() * x[sv_indices]
-        weights = np.sum(weighted_sv, 0)
+        weights = utils.get_svm_weights(classifier.dual_coef_[0], classifier.support_, x)
 
         np.savetxt(path.join(output_dir, 'weights.txt'), weights)
 
@@ -197,8 +222,8 @@ class LogisticReg(base.MLAlgorithm):
         classifier.fit(x_train, y_train)
         y_hat_train = classifier.predict(x_train)
         y_hat = classifier.predict(x_test)
-        proba_test = classifier.predict_proba(x_test)[:, 1]
-        auc = roc_auc_score(y_test, proba_test)
+        # The probability is a monotonic function of the decision function: the AUC is the same
+        auc = roc_auc_score(y_test, classifier.decision_function(x_test))
 
         return classifier, y_hat, auc, y_hat_train
 
@@ -209,6 +234,31 @@ class LogisticReg(base.MLAlgorithm):
 
         return res['balanced_accuracy']
 
+    def _regularization_path(self, x_train, x_test, y_train, y_test, c_range):
+        """
+        Balanced accuracy of each C value of c_range.
+
+        The C values are fitted in increasing order, each fit starting from the
+        solution of the previous one (warm start, ignored by the liblinear solver).
+
+        Returns: a dictionary {c: balanced accuracy}.
+        """
+        if self._algorithm_params['balanced']:
+            classifier = LogisticRegression(penalty=self._algorithm_params['penalty'], tol=1e-6,
+                                            class_weight='balanced', warm_start=True)
+        else:
+            classifier = LogisticRegression(penalty=self._algorithm_params['penalty'], tol=1e-6, warm_start=True)
+
+        c_values = sorted(c_range)
+        y_hats = []
+        for c in c_values:
+            classifier.set_params(C=c)
+            classifier.fit(x_train, y_train)
+            y_hats.append(classifier.predict(x_test))
+        results = utils.evaluate_predictions(y_test, y_hats)
+
+        return {c: res['balanced_accuracy'] for c, res in zip(c_values, results)}
+
     def _select_best_parameter(self, async_result):
 
         c_values = []
@@ -217,9 +267,15 @@ class LogisticReg(base.MLAlgorithm):
             best_c = -1
             best_acc = -1
 
-            for c, async_acc in async_result[fold].items():
+            if isinstance(async_result[fold], dict):
+                fold_accuracies = {c: async_acc.get() for c, async_acc in async_result[fold].items()}
+            else:
+                # Regularization path: one task per fold
+                fold_accuracies = async_result[fold].get()
 
-                acc = async_acc.get()
+            for c in self._algorithm_params['c_range']:
+
+                acc = fold_accuracies[c]
                 if acc > best_acc:
                     best_c = c
                     best_acc = acc
@@ -233,33 +289,37 @@ class LogisticReg(base.MLAlgorithm):
 
     def evaluate(self, train_index, test_index):
 
-        inner_pool = ThreadPool(self._algorithm_params['n_threads'])
-        async_result = {}
-        for i in range(self._algorithm_params['grid_search_folds']):
-            async_result[i] = {}
+        with self.executor_scope() as inner_pool:
+            async_result = {}
+            for i in range(self._algorithm_params['grid_search_folds']):
+                async_result[i] = {}
 
-        x_train = self._x[train_index]
-        y_train = self._y[train_index]
+            x_train = self._x[train_index]
+            y_train = self._y[train_index]
 
-        skf = StratifiedKFold(n_splits=self._algorithm_params['grid_search_folds'], shuffle=True)
-        inner_cv = list(skf.split(np.zeros(len(y_train)), y_train))
+            skf = StratifiedKFold(n_splits=self._algorithm_params['grid_search_folds'], shuffle=True)
+            inner_cv = list(skf.split(np.zeros(len(y_train)), y_train))
 
-        for i in range(len(inner_cv)):
-            inner_train_index, inner_test_index = inner_cv[i]
+            for i in range(len(inner_cv)):
+                inner_train_index, inner_test_index = inner_cv[i]
 
-            x_train_inner = x_train[inner_train_index]
-            x_test_inner = x_train[inner_test_index]
-            y_train_inner = y_train[inner_train_index]
-            y_test_inner = y_train[inner_test_index]
+                x_train_inner = x_train[inner_train_index]
+                x_test_inner = x_train[inner_test_index]
+                y_train_inner = y_train[inner_train_index]
+                y_test_inner = y_train[inner_test_index]
 
-            for c in self._algorithm_params['c_range']:
-                async_result[i][c] = inner_pool.apply_async(self._grid_search,
-                                                            (x_train_inner, x_test_inner,
-                                                             y_train_inner, y_test_inner, c))
-        inner_pool.close()
-        inner_pool.join()
+                if self._algorithm_params['regularization_path']:
+                    async_result[i] = inner_pool.apply_async(self._regularization_path,
+                                                             (x_train_inner, x_test_inner, y_train_inner, y_test_inner,
+                                                              self._algorithm_params['c_range']))
+                    continue
+
+                for c in self._algorithm_params['c_range']:
+                    async_result[i][c] = inner_pool.apply_async(self._grid_search,
+                                                                (x_train_inner, x_test_inner,
+                                                                 y_train_inner, y_test_inner, c))
 
-        best_parameter = self._select_best_parameter(async_result)
+            best_parameter = self._select_best_parameter(async_result)
         x_test = self._x[test_index]
         y_test = self._y[test_index]
 
@@ -336,24 +396,32 @@ class LogisticReg(base.MLAlgorithm):
                            'balanced': False,
                            'grid_search_folds': 10,
                            'c_range': np.logspace(-6, 2, 17),
-                           'n_threads': 15}
+                           'n_threads': 15,
+                           'regularization_path': True}
 
         return parameters_dict
 
 
 class RandomForest(base.MLAlgorithm):
 
-    def _launch_random_forest(self, x_train, x_test, y_train, y_test, n_estimators, max_depth, min_samples_split,
+    def _launch_random_forest(self, train_index, test_index, n_estimators, max_depth, min_samples_split,
                               max_features):
 
+        # Only the rows of the task are read from the features (e.g. a memory-mapped feature store), once, in the
+        # float32 type used by the forests
+        x_train = utils.get_feature_rows(self._x, train_index)
+        x_test = utils.get_feature_rows(self._x, test_index)
+        y_train = self._y[train_index]
+        y_test = self._y[test_index]
+
         if self._algorithm_params['balanced']:
             classifier = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth,
                                                 min_samples_split=min_samples_split, max_features=max_features,
-                                                class_weight='balanced', n_jobs=self._algorithm_params['n_threads'])
+                                                class_weight='balanced', n_jobs=self.get_n_jobs())
         else:
             classifier = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth,
                                                 min_samples_split=min_samples_split, max_features=max_features,
-                                                n_jobs=self._algorithm_params['n_threads'])
+                                                n_jobs=self.get_n_jobs())
 
         classifier.fit(x_train, y_train)
         y_hat_train = classifier.predict(x_train)
@@ -363,12 +431,12 @@ class RandomForest(base.MLAlgorithm):
 
         return classifier, y_hat, auc, y_hat_train
 
-    def _grid_search(self, x_train, x_test, y_train, y_test, n_estimators, max_depth, min_samples_split, max_features):
+    def _grid_search(self, train_index, test_index, n_estimators, max_depth, min_samples_split, max_features):
 
-        _, y_hat, _, _ = self._launch_random_forest(x_train, x_test, y_train, y_test,
+        _, y_hat, _, _ = self._launch_random_forest(train_index, test_index,
                                                     n_estimators, max_depth,
                                                     min_samples_split, max_features)
-        res = utils.evaluate_prediction(y_test, y_hat)
+        res = utils.evaluate_prediction(self._y[test_index], y_hat)
 
         return res['balanced_accuracy']
 
@@ -425,43 +493,35 @@ class RandomForest(base.MLAlgorithm):
 
     def evaluate(self, train_index, test_index):
 
-        inner_pool = ThreadPool(self._algorithm_params['n_threads'])
-        async_result = {}
-        for i in range(self._algorithm_params['grid_search_folds']):
-            async_result[i] = {}
+        with self.executor_scope() as inner_pool:
+            async_result = {}
+            for i in range(self._algorithm_params['grid_search_folds']):
+                async_result[i] = {}
 
-        x_train = self._x[train_index]
-        y_train = self._y[train_index]
+            y_train = self._y[train_index]
 
-        skf = StratifiedKFold(n_splits=self._algorithm_params['grid_search_folds'], shuffle=True)
-        inner_cv = list(skf.split(np.zeros(len(y_train)), y_train))
-
-        parameters_combinations = list(itertools.product(self._algorithm_params['n_estimators_range'],
-                                                         self._algorithm_params['max_depth_range'],
-                                                         self._algorithm_params['min_samples_split_range'],
-                                                         self._algorithm_params['max_features_range']))
-
-        for i in range(len(inner_cv)):
-            inner_train_index, inner_test_index = inner_cv[i]
-
-            x_train_inner = x_train[inner_train_index]
-            x_test_inner = x_train[inner_test_index]
-            y_train_inner = y_train[inner_train_index]
-            y_test_inner = y_train[inner_test_index]
-
-            for parameters in parameters_combinations:
-                async_result[i][parameters] = inner_pool.apply_async(self._grid_search,
-                                                                     (x_train_inner, x_test_inner,
-                                                                      y_train_inner, y_test_inner,
-                                                                      parameters[0], parameters[1],
-                                                                      parameters[2], parameters[3]))
-        inner_pool.close()
-        inner_pool.join()
-        best_parameter = self._select_best_parameter(async_result)
-        x_test = self._x[test_index]
+            skf = StratifiedKFold(n_splits=self._algorithm_params['grid_search_folds'], shuffle=True)
+            inner_cv = list(skf.split(np.zeros(len(y_train)), y_train))
+
+            parameters_combinations = list(itertools.product(self._algorithm_params['n_estimators_range'],
+                                                             self._algorithm_params['max_depth_range'],
+                                                             self._algorithm_params['min_samples_split_range'],
+                                                             self._algorithm_params['max_features_range']))
+
+            for i in range(len(inner_cv)):
+                inner_train_index, inner_test_index = inner_cv[i]
+
+                # The tasks get the indices of their rows, read when they run
+                for parameters in parameters_combinations:
+                    async_result[i][parameters] = inner_pool.apply_async(self._grid_search,
+                                                                         (train_index[inner_train_index],
+                                                                          train_index[inner_test_index],
+                                                                          parameters[0], parameters[1],
+                                                                          parameters[2], parameters[3]))
+            best_parameter = self._select_best_parameter(async_result)
         y_test = self._y[test_index]
 
-        _, y_hat, auc, y_hat_train = self._launch_random_forest(x_train, x_test, y_train, y_test,
+        _, y_hat, auc, y_hat_train = self._launch_random_forest(train_index, test_index,
                                                                 best_parameter['n_estimators'],
                                                                 best_parameter['max_depth'],
                                                                 best_parameter['min_samples_split'],
@@ -483,9 +543,7 @@ class RandomForest(base.MLAlgorithm):
 
     def evaluate_no_cv(self, train_index, test_index):
 
-        x_train = self._x[train_index]
         y_train = self._y[train_index]
-        x_test = self._x[test_index]
         y_test = self._y[test_index]
 
         best_parameter = dict()
@@ -494,7 +552,7 @@ class RandomForest(base.MLAlgorithm):
         best_parameter['min_samples_split'] = self._algorithm_params['min_samples_split_range']
         best_parameter['max_features'] = self._algorithm_params['max_features_range']
 
-        _, y_hat, auc, y_hat_train = self._launch_random_forest(x_train, x_test, y_train, y_test,
+        _, y_hat, auc, y_hat_train = self._launch_random_forest(train_index, test_index,
                                                                 self._algorithm_params['n_estimators_range'],
                                                                 self._algorithm_params['max_depth_range'],
                                                                 self._algorithm_params['min_samples_split_range'],
@@ -597,39 +655,112 @@ class RandomForest(base.MLAlgorithm):
         return parameters_dict
 
 
-class XGBoost(base.MLAlgorithm):
+# Training from batches of rows (QuantileDMatrix built from a DataIter, with a reference for the test rows) needs
+# xgboost >= 1.7; with older versions (e.g. 0.80 of requirements.txt), XGBoost is trained with XGBClassifier
+_XGBOOST_HAS_QUANTILE_DMATRIX = hasattr(xgboost, 'QuantileDMatrix') and hasattr(xgboost, 'DataIter')
+
+if _XGBOOST_HAS_QUANTILE_DMATRIX:
+
+    class _FeatureRowsIterator(xgboost.DataIter):
+        """
+        Batches of rows of a feature matrix, given to XGBoost to build a QuantileDMatrix.
+
+        The rows are read from the features (which can be a memory map, e.g. a
+        feature store) one batch at a time, so that XGBoost sketches the
+        quantiles of the features and builds its compressed histogram matrix
+        without the float64 copy of the rows.
+        """
+
+        def __init__(self, x, rows, y=None):
+            """
+            Args:
+                x: Features (n_samples, n_features), 2d-array or memory map.
+                rows: Indices of the rows.
+                y: Labels of all the samples, or None (e.g. for the test rows).
+            """
+            self._x = x
+            self._y = y
+            self._batches = utils.get_row_batches(x, rows)
+            self._batch = 0
+            super(_FeatureRowsIterator, self).__init__()
+
+        def next(self, input_data):
+            if self._batch == len(self._batches):
+                return False
+            rows = self._batches[self._batch]
+            if self._y is None:
+                input_data(data=utils.get_feature_rows(self._x, rows))
+            else:
+                input_data(data=utils.get_feature_rows(self._x, rows), label=self._y[rows])
+            self._batch += 1
+            return True
+
+        def reset(self):
+            self._batch = 0
 
-    def _launch_xgboost(self, x_train, x_test, y_train, y_test, max_depth, learning_rate, n_estimators,
-                        colsample_bytree):
 
+class XGBoost(base.MLAlgorithm):
+
+    def _get_dmatrix(self, rows, n_jobs, ref=None):
+        """QuantileDMatrix of rows of the features (with their labels if ref is None, i.e. for training)."""
+        if ref is None:
+            return xgboost.QuantileDMatrix(_FeatureRowsIterator(self._x, rows, self._y), nthread=n_jobs)
+        return xgboost.QuantileDMatrix(_FeatureRowsIterator(self._x, rows), ref=ref, nthread=n_jobs)
+
+    def _get_xgboost_parameters(self, max_depth, learning_rate, colsample_bytree, n_jobs):
+
+        parameters = {'objective': 'binary:logistic',
+                      'tree_method': 'hist',
+                      'max_depth': max_depth,
+                      'learning_rate': learning_rate,
+                      'colsample_bytree': colsample_bytree,
+                      'reg_alpha': self._algorithm_params['reg_alpha'],
+                      'reg_lambda': self._algorithm_params['reg_lambda'],
+                      'nthread': n_jobs}
         if self._algorithm_params['balanced']:
             # set scale_pos_weight
             # http://xgboost.readthedocs.io/en/latest//how_to/param_tuning.html
-            scale_pos_weight = float(len(self._y - sum(self._y)) / sum(self._y))
-            classifier = XGBClassifier(max_depth=max_depth, learning_rate=learning_rate, n_estimators=n_estimators,
-                                       n_jobs=self._algorithm_params['n_threads'], colsample_bytree=colsample_bytree,
-                                       reg_alpha=self._algorithm_params['reg_alpha'],
-                                       reg_lambda=self._algorithm_params['reg_lambda'],
-                                       scale_pos_weight=scale_pos_weight)
-        else:
-            classifier = XGBClassifier(max_depth=max_depth, learning_rate=learning_rate, n_estimators=n_estimators,
-                                       n_jobs=self._algorithm_params['n_threads'], colsample_bytree=colsample_bytree,
-                                       reg_alpha=self._algorithm_params['reg_alpha'],
-                                       reg_lambda=self._algorithm_params['reg_lambda'])
+            parameters['scale_pos_weight'] = float(len(self._y - sum(self._y)) / sum(self._y))
 
-        classifier.fit(x_train, y_train)
-        y_hat_train = classifier.predict(x_train)
-        y_hat = classifier.predict(x_test)
-        proba_test = classifier.predict_proba(x_test)[:, 1]
-        auc = roc_auc_score(y_test, proba_test)
+        return parameters
 
-        return classifier, y_hat, auc, y_hat_train
-
-    def _grid_search(self, x_train, x_test, y_train, y_test, max_depth, learning_rate, n_estimators, colsample_bytree):
-
-        _, y_hat, _, _ = self._launch_xgboost(x_train, x_test, y_train, y_test, max_depth, learning_rate, n_estimators,
+    @staticmethod
+    def _get_classifier(parameters, n_estimators):
+        """XGBClassifier with the parameters of _get_xgboost_parameters() (default tree method of the version)."""
+        return XGBClassifier(n_estimators=n_estimators, n_jobs=parameters['nthread'],
+                             **{name: value for name, value in parameters.items()
+                                if name not in ['nthread', 'objective', 'tree_method']})
+
+    def _launch_xgboost(self, train_index, test_index, max_depth, learning_rate, n_estimators, colsample_bytree):
+
+        n_jobs = self.get_n_jobs()
+        parameters = self._get_xgboost_parameters(max_depth, learning_rate, colsample_bytree, n_jobs)
+        if not _XGBOOST_HAS_QUANTILE_DMATRIX:
+            x_train = utils.get_feature_rows(self._x, train_index)
+            x_test = utils.get_feature_rows(self._x, test_index)
+            classifier = self._get_classifier(parameters, n_estimators)
+            classifier.fit(x_train, self._y[train_index])
+            y_hat_train = classifier.predict(x_train)
+            y_hat = classifier.predict(x_test)
+            auc = roc_auc_score(self._y[test_index], classifier.predict_proba(x_test)[:, 1])
+            return classifier, y_hat, auc, y_hat_train
+
+        train = self._get_dmatrix(train_index, n_jobs)
+        test = self._get_dmatrix(test_index, n_jobs, ref=train)
+        booster = xgboost.train(parameters, train, num_boost_round=n_estimators)
+
+        y_hat_train = (booster.predict(train) > 0.5).astype(int)
+        proba_test = booster.predict(test)
+        y_hat = (proba_test > 0.5).astype(int)
+        auc = roc_auc_score(self._y[test_index], proba_test)
+
+        return booster, y_hat, auc, y_hat_train
+
+    def _grid_search(self, train_index, test_index, max_depth, learning_rate, n_estimators, colsample_bytree):
+
+        _, y_hat, _, _ = self._launch_xgboost(train_index, test_index, max_depth, learning_rate, n_estimators,
                                               colsample_bytree)
-        res = utils.evaluate_prediction(y_test, y_hat)
+        res = utils.evaluate_prediction(self._y[test_index], y_hat)
 
         return res['balanced_accuracy']
 
@@ -674,43 +805,35 @@ class XGBoost(base.MLAlgorithm):
 
     def evaluate(self, train_index, test_index):
 
-        inner_pool = ThreadPool(self._algorithm_params['n_threads'])
-        async_result = {}
-        for i in range(self._algorithm_params['grid_search_folds']):
-            async_result[i] = {}
+        with self.executor_scope() as inner_pool:
+            async_result = {}
+            for i in range(self._algorithm_params['grid_search_folds']):
+                async_result[i] = {}
 
-        x_train = self._x[train_index]
-        y_train = self._y[train_index]
+            y_train = self._y[train_index]
 
-        skf = StratifiedKFold(n_splits=self._algorithm_params['grid_search_folds'], shuffle=True)
-        inner_cv = list(skf.split(np.zeros(len(y_train)), y_train))
-
-        parameters_combinations = list(itertools.product(self._algorithm_params['max_depth_range'],
-                                                         self._algorithm_params['learning_rate_range'],
-                                                         self._algorithm_params['n_estimators_range'],
-                                                         self._algorithm_params['colsample_bytree_range']))
-
-        for i in range(len(inner_cv)):
-            inner_train_index, inner_test_index = inner_cv[i]
-
-            x_train_inner = x_train[inner_train_index]
-            x_test_inner = x_train[inner_test_index]
-            y_train_inner = y_train[inner_train_index]
-            y_test_inner = y_train[inner_test_index]
-
-            for parameters in parameters_combinations:
-                async_result[i][parameters] = inner_pool.apply_async(self._grid_search,
-                                                                     (x_train_inner, x_test_inner,
-                                                                      y_train_inner, y_test_inner,
-                                                                      parameters[0], parameters[1],
-                                                                      parameters[2], parameters[3]))
-        inner_pool.close()
-        inner_pool.join()
-        best_parameter = self._select_best_parameter(async_result)
-        x_test = self._x[test_index]
+            skf = StratifiedKFold(n_splits=self._algorithm_params['grid_search_folds'], shuffle=True)
+            inner_cv = list(skf.split(np.zeros(len(y_train)), y_train))
+
+            parameters_combinations = list(itertools.product(self._algorithm_params['max_depth_range'],
+                                                             self._algorithm_params['learning_rate_range'],
+                                                             self._algorithm_params['n_estimators_range'],
+                                                             self._algorithm_params['colsample_bytree_range']))
+
+            for i in range(len(inner_cv)):
+                inner_train_index, inner_test_index = inner_cv[i]
+
+                # The tasks get the indices of their rows, read when they run
+                for parameters in parameters_combinations:
+                    async_result[i][parameters] = inner_pool.apply_async(self._grid_search,
+                                                                         (train_index[inner_train_index],
+                                                                          train_index[inner_test_index],
+                                                                          parameters[0], parameters[1],
+                                                                          parameters[2], parameters[3]))
+            best_parameter = self._select_best_parameter(async_result)
         y_test = self._y[test_index]
 
-        _, y_hat, auc, y_hat_train = self._launch_xgboost(x_train, x_test, y_train, y_test,
+        _, y_hat, auc, y_hat_train = self._launch_xgboost(train_index, test_index,
                                                           best_parameter['max_depth'],
                                                           best_parameter['learning_rate'],
                                                           best_parameter['n_estimators'],
@@ -732,9 +855,7 @@ class XGBoost(base.MLAlgorithm):
 
     def evaluate_no_cv(self, train_index, test_index):
 
-        x_train = self._x[train_index]
         y_train = self._y[train_index]
-        x_test = self._x[test_index]
         y_test = self._y[test_index]
 
         best_parameter = dict()
@@ -743,7 +864,7 @@ class XGBoost(base.MLAlgorithm):
         best_parameter['n_estimators'] = self._algorithm_params['n_estimators_range']
         best_parameter['colsample_bytree'] = self._algorithm_params['colsample_bytree_range']
 
-        _, y_hat, auc, y_hat_train = self._launch_xgboost(x_train, x_test, y_train, y_test,
+        _, y_hat, auc, y_hat_train = self._launch_xgboost(train_index, test_index,
                                                           self._algorithm_params['max_depth_range'],
                                                           self._algorithm_params['learning_rate_range'],
                                                           self._algorithm_params['n_estimators_range'],
@@ -772,23 +893,19 @@ class XGBoost(base.MLAlgorithm):
         best_n_estimators = int(round(np.mean([result['best_parameter']['n_estimators'] for result in results_list])))
         best_colsample_bytree = np.mean([result['best_parameter']['colsample_bytree'] for result in results_list])
 
-        if self._algorithm_params['balanced']:
-            scale_pos_weight = float(len(self._y - sum(self._y)) / sum(self._y))
-
-            classifier = XGBClassifier(max_depth=best_max_depth, learning_rate=best_learning_rate,
-                                       n_estimators=best_n_estimators, n_jobs=self._algorithm_params['n_threads'],
-                                       colsample_bytree=best_colsample_bytree,
-                                       reg_alpha=self._algorithm_params['reg_alpha'],
-                                       reg_lambda=self._algorithm_params['reg_lambda'],
-                                       scale_pos_weight=scale_pos_weight)
+        parameters = self._get_xgboost_parameters(best_max_depth, best_learning_rate, best_colsample_bytree,
+                                                  self._algorithm_params['n_threads'])
+        classifier = self._get_classifier(parameters, best_n_estimators)
+        if _XGBOOST_HAS_QUANTILE_DMATRIX:
+            # Trained from batches of rows of the features, then wrapped in the classifier (e.g. for its feature
+            # importances)
+            booster = xgboost.train(parameters,
+                                    self._get_dmatrix(np.arange(self._x.shape[0]), parameters['nthread']),
+                                    num_boost_round=best_n_estimators)
+            classifier.set_params(tree_method=parameters['tree_method'])
+            classifier.load_model(booster.save_raw(raw_format='json'))
         else:
-            classifier = XGBClassifier(max_depth=best_max_depth, learning_rate=best_learning_rate,
-                                       n_estimators=best_n_estimators, n_jobs=self._algorithm_params['n_threads'],
-                                       colsample_bytree=best_colsample_bytree,
-                                       reg_alpha=self._algorithm_params['reg_alpha'],
-                                       reg_lambda=self._algorithm_params['reg_lambda'])
-
-        classifier.fit(self._x, self._y)
+            classifier.fit(self._x, self._y)
 
         return classifier, {'max_depth': best_max_depth,
                             'learning_rate': best_learning_rate,
@@ -835,15 +952,13 @@ class OneVsOneSVM(base.MLAlgorithm):
     def _launch_svc(self, kernel_train, x_test, y_train, y_test, c):
 
         if self._algorithm_params['balanced']:
-            svc = OneVsOneClassifier(SVC(C=c, kernel='precomputed', probability=True, tol=1e-6,
-                                         class_weight='balanced'))
+            svc = OneVsOneClassifier(SVC(C=c, kernel='precomputed', tol=1e-6, class_weight='balanced'))
         else:
-            svc = OneVsOneClassifier(SVC(C=c, kernel='precomputed', probability=True, tol=1e-6))
+            svc = OneVsOneClassifier(SVC(C=c, kernel='precomputed', tol=1e-6))
 
         svc.fit(kernel_train, y_train)
         y_hat_train = svc.predict(kernel_train)
         y_hat = svc.predict(x_test)
-        proba_test = svc.predict_proba(x_test)[:, 1]
 
         return svc, y_hat, y_hat_train
 
@@ -879,33 +994,32 @@ class OneVsOneSVM(base.MLAlgorithm):
 
     def evaluate(self, train_index, test_index):
 
-        inner_pool = ThreadPool(self._algorithm_params['n_threads'])
-        async_result = {}
-        for i in range(self._algorithm_params['grid_search_folds']):
-            async_result[i] = {}
+        with self.executor_scope() as inner_pool:
+            async_result = {}
+            for i in range(self._algorithm_params['grid_search_folds']):
+                async_result[i] = {}
 
-        outer_kernel = self._kernel[train_index, :][:, train_index]
-        y_train = self._y[train_index]
+            outer_kernel = utils.get_kernel_slice(self._kernel, train_index, train_index)
+            y_train = self._y[train_index]
 
-        skf = StratifiedKFold(n_splits=self._algorithm_params['grid_search_folds'], shuffle=True)
-        inner_cv = list(skf.split(np.zeros(len(y_train)), y_train))
+            skf = StratifiedKFold(n_splits=self._algorithm_params['grid_search_folds'], shuffle=True)
+            inner_cv = list(skf.split(np.zeros(len(y_train)), y_train))
 
-        for i in range(len(inner_cv)):
-            inner_train_index, inner_test_index = inner_cv[i]
+            for i in range(len(inner_cv)):
+                inner_train_index, inner_test_index = inner_cv[i]
 
-            inner_kernel = outer_kernel[inner_train_index, :][:, inner_train_index]
-            x_test_inner = outer_kernel[inner_test_index, :][:, inner_train_index]
-            y_train_inner, y_test_inner = y_train[inner_train_index], y_train[inner_test_index]
+                # Sub-matrices of the inner split, copied once and shared read-only by the tasks of all the C values
+                inner_kernel = utils.get_kernel_slice(outer_kernel, inner_train_index, inner_train_index)
+                x_test_inner = utils.get_kernel_slice(outer_kernel, inner_test_index, inner_train_index)
+                y_train_inner, y_test_inner = y_train[inner_train_index], y_train[inner_test_index]
 
-            for c in self._algorithm_params['c_range']:
-                async_result[i][c] = inner_pool.apply_async(self._grid_search,
-                                                            (inner_kernel, x_test_inner,
-                                                             y_train_inner, y_test_inner, c))
-        inner_pool.close()
-        inner_pool.join()
-
-        best_parameter = self._select_best_parameter(async_result)
-        x_test = self._kernel[test_index, :][:, train_index]
+                for c in self._algorithm_params['c_range']:
+                    async_result[i][c] = inner_pool.apply_async(self._grid_search,
+                                                                (inner_kernel, x_test_inner,
+                                                                 y_train_inner, y_test_inner, c))
+
+            best_parameter = self._select_best_parameter(async_result)
+        x_test = utils.get_kernel_slice(self._kernel, test_index, train_index)
         y_train, y_test = self._y[train_index], self._y[test_index]
 
         _, y_hat, y_hat_train = self._launch_svc(outer_kernel, x_test, y_train, y_test, best_parameter['c'])
@@ -954,11 +1068,7 @@ class OneVsOneSVM(base.MLAlgorithm):
 
     def save_weights(self, classifier, x, output_dir):
 
-        dual_coefficients = classifier.dual_coef_
-        sv_indices = classifier.support_
-
-        weighted_sv = dual_coefficients.transpose() * x[sv_indices]
-        weights = np.sum(weighted_sv, 0)
+        weights = _get_multiclass_svm_weights(classifier, self._y, x)
 
         np.savetxt(path.join(output_dir, 'weights.txt'), weights)
 
@@ -988,15 +1098,13 @@ class OneVsRestSVM(base.MLAlgorithm):
     def _launch_svc(self, kernel_train, x_test, y_train, y_test, c):
 
         if self._algorithm_params['balanced']:
-            svc = OneVsRestClassifier(SVC(C=c, kernel='precomputed', probability=True, tol=1e-6,
-                                          class_weight='balanced'))
+            svc = OneVsRestClassifier(SVC(C=c, kernel='precomputed', tol=1e-6, class_weight='balanced'))
         else:
-            svc = OneVsRestClassifier(SVC(C=c, kernel='precomputed', probability=True, tol=1e-6))
+            svc = OneVsRestClassifier(SVC(C=c, kernel='precomputed', tol=1e-6))
 
         svc.fit(kernel_train, y_train)
         y_hat_train = svc.predict(kernel_train)
         y_hat = svc.predict(x_test)
-        proba_test = svc.predict_proba(x_test)[:, 1]
 
         return svc, y_hat, y_hat_train
 
@@ -1032,33 +1140,32 @@ class OneVsRestSVM(base.MLAlgorithm):
 
     def evaluate(self, train_index, test_index):
 
-        inner_pool = ThreadPool(self._algorithm_params['n_threads'])
-        async_result = {}
-        for i in range(self._algorithm_params['grid_search_folds']):
-            async_result[i] = {}
+        with self.executor_scope() as inner_pool:
+            async_result = {}
+            for i in range(self._algorithm_params['grid_search_folds']):
+                async_result[i] = {}
 
-        outer_kernel = self._kernel[train_index, :][:, train_index]
-        y_train = self._y[train_index]
+            outer_kernel = utils.get_kernel_slice(self._kernel, train_index, train_index)
+            y_train = self._y[train_index]
 
-        skf = StratifiedKFold(n_splits=self._algorithm_params['grid_search_folds'], shuffle=True)
-        inner_cv = list(skf.split(np.zeros(len(y_train)), y_train))
+            skf = StratifiedKFold(n_splits=self._algorithm_params['grid_search_folds'], shuffle=True)
+            inner_cv = list(skf.split(np.zeros(len(y_train)), y_train))
 
-        for i in range(len(inner_cv)):
-            inner_train_index, inner_test_index = inner_cv[i]
+            for i in range(len(inner_cv)):
+                inner_train_index, inner_test_index = inner_cv[i]
 
-            inner_kernel = outer_kernel[inner_train_index, :][:, inner_train_index]
-            x_test_inner = outer_kernel[inner_test_index, :][:, inner_train_index]
-            y_train_inner, y_test_inner = y_train[inner_train_index], y_train[inner_test_index]
+                # Sub-matrices of the inner split, copied once and shared read-only by the tasks of all the C values
+                inner_kernel = utils.get_kernel_slice(outer_kernel, inner_train_index, inner_train_index)
+                x_test_inner = utils.get_kernel_slice(outer_kernel, inner_test_index, inner_train_index)
+                y_train_inner, y_test_inner = y_train[inner_train_index], y_train[inner_test_index]
 
-            for c in self._algorithm_params['c_range']:
-                async_result[i][c] = inner_pool.apply_async(self._grid_search,
-                                                            (inner_kernel, x_test_inner,
-                                                             y_train_inner, y_test_inner, c))
-        inner_pool.close()
-        inner_pool.join()
-
-        best_parameter = self._select_best_parameter(async_result)
-        x_test = self._kernel[test_index, :][:, train_index]
+                for c in self._algorithm_params['c_range']:
+                    async_result[i][c] = inner_pool.apply_async(self._grid_search,
+                                                                (inner_kernel, x_test_inner,
+                                                                 y_train_inner, y_test_inner, c))
+
+            best_parameter = self._select_best_parameter(async_result)
+        x_test = utils.get_kernel_slice(self._kernel, test_index, train_index)
         y_train, y_test = self._y[train_index], self._y[test_index]
 
         _, y_hat, y_hat_train = self._launch_svc(outer_kernel, x_test, y_train, y_test, best_parameter['c'])
@@ -1107,11 +1214,7 @@ class OneVsRestSVM(base.MLAlgorithm):
 
     def save_weights(self, classifier, x, output_dir):
 
-        dual_coefficients = classifier.dual_coef_
-        sv_indices = classifier.support_
-
-        weighted_sv = dual_coefficients.transpose() * x[sv_indices]
-        weights = np.sum(weighted_sv, 0)
+        weights = _get_multiclass_svm_weights(classifier, self._y, x)
 
         np.savetxt(path.join(output_dir, 'weights.txt'), weights)
 
@@ -1,8 +1,13 @@
 # coding: utf8
 
 
+import collections
+import os
+import threading
 from abc import ABC, abstractmethod
 
+import numpy as np
+
 __author__ = "Jorge Samper-Gonzalez"
 __copyright__ = "Copyright 2016-2019 The Aramis Lab Team"
 __credits__ = ["Jorge Samper-Gonzalez"]
@@ -13,6 +18,347 @@ __email__ = "jorge.samper-gonzalez@inria.fr"
 __status__ = "Development"
 
 
+EXECUTOR_BACKENDS = ('thread', 'process', 'serial')
+
+# BLAS thread limits of the current process (kept alive while workers run)
+_blas_limits = None
+_threadpoolctl_warned = False
+
+
+def _limit_blas_threads(n_threads):
+    """Limit the number of BLAS/OpenMP threads of the current process (requires threadpoolctl).
+
+    Without threadpoolctl, the threads are not limited: a warning is printed once per process.
+    """
+    global _blas_limits, _threadpoolctl_warned
+    if n_threads is None:
+        return None
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        if not _threadpoolctl_warned:
+            from clinica.utils.stream import cprint
+
+            _threadpoolctl_warned = True
+            cprint('Warning: threadpoolctl is not installed, the number of BLAS threads of the workers cannot be '
+                   'limited to %d (each worker may use all the CPUs). Install threadpoolctl to avoid it.'
+                   % n_threads)
+        return None
+    _blas_limits = threadpool_limits(limits=n_threads)
+    return _blas_limits
+
+
+def get_executor(backend=None, n_workers=1, blas_threads=None):
+    """
+    Create the executor running the tasks of a machine learning workflow.
+
+    Args:
+        backend: 'thread', 'process', 'serial' or an MLExecutor (returned as is). If None, the value of the
+            CLINICA_ML_EXECUTOR environment variable is used ('thread' if not set).
+        n_workers: Maximum number of tasks run at the same time.
+        blas_threads: Number of BLAS threads of each worker (default: available CPUs divided by n_workers).
+
+    Returns: an MLExecutor.
+    """
+    if isinstance(backend, MLExecutor):
+        return backend
+    if backend is None:
+        backend = os.environ.get('CLINICA_ML_EXECUTOR', 'thread')
+    if backend not in EXECUTOR_BACKENDS:
+        raise Exception("Incorrect executor backend %s. It must be one of the values %s."
+                        % (backend, ', '.join(EXECUTOR_BACKENDS)))
+    if backend == 'serial':
+        return SerialExecutor()
+
+    n_workers = max(1, n_workers)
+    if blas_threads is None:
+        from clinica.utils.execution_policy import get_available_cpus
+        blas_threads = max(1, get_available_cpus() // n_workers)
+    if backend == 'thread':
+        return ThreadExecutor(n_workers, blas_threads)
+    return ProcessExecutor(n_workers, blas_threads)
+
+
+class MLTask(object):
+    """Function call run by an MLExecutor: get() returns its result or raises its exception."""
+
+    def __init__(self, function, args=()):
+        self._function = function
+        self._args = args
+        self._done = False
+        self._result = None
+        self._exception = None
+
+    def run(self):
+        try:
+            self._result = self._function(*self._args)
+        except BaseException as e:
+            self._exception = e
+        self._function, self._args = None, None
+        self._done = True
+
+    def ready(self):
+        return self._done
+
+    def get(self):
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+class MLExecutor(ABC):
+    """
+    Executor of the tasks of a machine learning workflow.
+
+    A single executor runs the outer folds of the validation and the inner
+    tasks of the algorithms (e.g. grid search) in one flat pool of at most
+    n_workers concurrent tasks, instead of nested pools. Its interface is the
+    one of multiprocessing.pool.ThreadPool: apply_async() returns an object
+    whose get() method returns the result. It is used as a context manager,
+    which pins the number of BLAS threads of the workers on entry and
+    releases the workers on exit.
+    """
+
+    # True if the tasks run in other processes (their arguments are pickled)
+    uses_processes = False
+
+    def __init__(self, n_workers=1, blas_threads=None):
+        self._n_workers = n_workers
+        self._blas_threads = blas_threads
+
+    @property
+    def n_workers(self): return self._n_workers
+
+    @property
+    def blas_threads(self): return self._blas_threads
+
+    @abstractmethod
+    def apply_async(self, function, args=()):
+        pass
+
+    def shutdown(self):
+        pass
+
+    def share_array(self, array):
+        """
+        Make an array readable by the workers without copying it for each task.
+
+        Returns: a tuple (array to use instead of `array`, filename of the array on disk or None).
+        """
+        return array, None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+
+class SerialExecutor(MLExecutor):
+    """Executor running each task in the calling thread when it is submitted."""
+
+    def apply_async(self, function, args=()):
+        task = MLTask(function, args)
+        task.run()
+        return task
+
+
+class _ThreadTask(MLTask):
+
+    def __init__(self, executor, function, args):
+        super().__init__(function, args)
+        self._executor = executor
+        self.owner = threading.get_ident()
+
+    def get(self):
+        self._executor.wait(self)
+        return super().get()
+
+
+class ThreadExecutor(MLExecutor):
+    """
+    Executor running the tasks in a pool of n_workers threads.
+
+    A worker waiting for a task it submitted (e.g. an outer fold waiting for
+    its grid search) runs its own queued tasks instead of blocking, so that
+    nested tasks share the same workers without deadlock.
+    """
+
+    def __init__(self, n_workers=1, blas_threads=None):
+        super().__init__(n_workers, blas_threads)
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._workers = set()
+        self._shutdown = False
+        self._blas_limits = None
+
+    def __enter__(self):
+        # Thread limits of the BLAS libraries are global to the process
+        self._blas_limits = _limit_blas_threads(self._blas_threads)
+        return self
+
+    def apply_async(self, function, args=()):
+        task = _ThreadTask(self, function, args)
+        with self._condition:
+            if not self._threads:
+                for i in range(self._n_workers):
+                    thread = threading.Thread(target=self._work, daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+            self._queue.append(task)
+            self._condition.notify_all()
+        return task
+
+    def _work(self):
+        self._workers.add(threading.get_ident())
+        while True:
+            with self._condition:
+                while not self._queue and not self._shutdown:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                task = self._queue.popleft()
+            self._run(task)
+
+    def _run(self, task):
+        task.run()
+        with self._condition:
+            self._condition.notify_all()
+
+    def wait(self, task):
+        """Wait for a task. A worker runs its own queued tasks (the awaited task first) while waiting."""
+        ident = threading.get_ident()
+        is_worker = ident in self._workers
+        while True:
+            with self._condition:
+                if task.ready():
+                    return
+                next_task = None
+                if is_worker:
+                    if task in self._queue:
+                        next_task = task
+                    else:
+                        next_task = next((t for t in self._queue if t.owner == ident), None)
+                if next_task is None:
+                    self._condition.wait()
+                    continue
+                self._queue.remove(next_task)
+            self._run(next_task)
+
+    def shutdown(self):
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._blas_limits is not None:
+            self._blas_limits.restore_original_limits()
+            self._blas_limits = None
+
+
+class _FutureTask(object):
+
+    def __init__(self, future):
+        self._future = future
+
+    def ready(self):
+        return self._future.done()
+
+    def get(self):
+        return self._future.result()
+
+
+class ProcessExecutor(MLExecutor):
+    """
+    Executor running the tasks in a pool of n_workers processes.
+
+    The tasks and their arguments are pickled: the large arrays of the
+    algorithms (kernel, features) are shared with the workers as read-only
+    memory maps (see share_array()) instead of being copied for each task.
+    The tasks run by a worker (e.g. the grid search of an outer fold) run
+    serially in this worker.
+    """
+
+    uses_processes = True
+
+    def __init__(self, n_workers=1, blas_threads=None):
+        super().__init__(n_workers, blas_threads)
+        self._pool = None
+        self._directory = None
+        # Tasks can be submitted by several threads (e.g. workflows of a batch)
+        self._lock = threading.Lock()
+
+    def apply_async(self, function, args=()):
+        from concurrent.futures import ProcessPoolExecutor
+
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self._n_workers, initializer=_limit_blas_threads,
+                                                 initargs=(self._blas_threads,))
+        return _FutureTask(self._pool.submit(function, *args))
+
+    def share_array(self, array):
+        import mmap
+        import tempfile
+
+        if array is None:
+            return array, None
+        # Memory map of a whole .npy file (e.g. feature store): the workers open the same file
+        if isinstance(array, np.memmap) and isinstance(array.base, mmap.mmap) and array.filename \
+                and array.filename.endswith('.npy'):
+            return array, array.filename
+        with self._lock:
+            if self._directory is None:
+                self._directory = tempfile.mkdtemp(prefix='clinica-ml-')
+        fd, filename = tempfile.mkstemp(dir=self._directory, suffix='.npy')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, np.asarray(array))
+        return np.load(filename, mmap_mode='r'), filename
+
+    def shutdown(self):
+        import shutil
+
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+
+class _ExecutorScope(object):
+    """
+    Context manager giving the executor of a validation or an algorithm.
+
+    An executor set by the caller is used as is. Otherwise, a pool of threads
+    is created for the scope: it is entered (which pins the BLAS threads),
+    shared with `algorithm` (the inner tasks run in the same flat pool as the
+    outer folds) and shut down on exit, so that no worker thread is left behind.
+    """
+
+    def __init__(self, executor, n_threads=1, algorithm=None):
+        self._executor = executor
+        self._created = executor is None
+        if self._created:
+            self._executor = get_executor('thread', n_threads)
+        self._algorithm = algorithm
+
+    def __enter__(self):
+        if self._created:
+            self._executor.__enter__()
+            if self._algorithm is not None:
+                self._algorithm.set_executor(self._executor)
+        return self._executor
+
+    def __exit__(self, *args):
+        if self._created:
+            if self._algorithm is not None:
+                self._algorithm.set_executor(None)
+            self._executor.shutdown()
+
+
 class MLWorkflow(ABC):
 
     def __init__(self, input_class, validation_class, algorithm_class, all_params, output_dir):
@@ -31,13 +377,37 @@ class MLWorkflow(ABC):
         self._validation = None
         self._algorithm = None
 
-    def run(self):
+    def run(self, executor=None):
+        """
 
-        from os import path, makedirs
+        Args:
+            executor: Backend running the outer folds and inner tasks in one pool of n_threads workers: 'thread',
+                'process', 'serial' or an MLExecutor (default: CLINICA_ML_EXECUTOR environment variable or
+                'thread'). See get_executor().
 
+        """
         # Instantiating input class
         self._input = self._input_class(self._input_params)
 
+        with get_executor(executor, self._validation_params.get('n_threads', 1)) as ml_executor:
+            self.evaluate(self._input, ml_executor)
+
+    def evaluate(self, ml_input, executor, splits_indices=None):
+        """
+        Run the validation of the algorithm on an input and save the results in the output folder.
+
+        Args:
+            ml_input: Instance of the input class. Its features, labels and kernel are computed if needed, or
+                reused if already computed (e.g. input shared by several workflows, see ml_batch.py).
+            executor: MLExecutor running the outer folds and inner tasks.
+            splits_indices: Splits of the validation (default: splits_indices parameter, or splits computed by
+                the validation).
+
+        """
+        from os import path, makedirs
+
+        self._input = ml_input
+
         # Computing input values
         x = self._input.get_x()
         y = self._input.get_y()
@@ -50,9 +420,14 @@ class MLWorkflow(ABC):
             self._algorithm = self._algorithm_class(x, y, self._algorithm_params)
 
         # Instantiating cross-validation method and classification algorithm
-        self._validation = self._validation_class(self._algorithm, self._validation_params)
+        validation_params = self._validation_params
+        if splits_indices is not None:
+            validation_params = dict(validation_params, splits_indices=splits_indices)
+        self._validation = self._validation_class(self._algorithm, validation_params)
 
         # Launching classification with selected cross-validation
+        self._algorithm.set_executor(executor)
+        self._validation.set_executor(executor)
         classifier, best_params, results = self._validation.validate(y)
 
         # Creation of the directory to save results
@@ -115,6 +490,36 @@ class MLValidation(ABC):
         self._validation_results = []
         self._classifier = None
         self._best_params = None
+        self._executor = None
+
+    def set_executor(self, executor):
+        self._executor = executor
+
+    def executor_scope(self, n_threads=None):
+        """
+        Context manager giving the executor of the outer folds, used by validate().
+
+        Without set_executor(), the executor of the algorithm is used if it has one. Otherwise, a pool of
+        n_threads threads (default: n_threads parameter) is created for the scope, shared with the algorithm and
+        shut down on exit.
+        """
+        executor = self._executor
+        if executor is None:
+            executor = self._ml_algorithm.get_executor()
+        if n_threads is None and executor is None:
+            n_threads = self._validation_params['n_threads']
+        return _ExecutorScope(executor, n_threads, self._ml_algorithm)
+
+    def get_splits_indices(self, y):
+        """
+        Splits of the subjects used by validate(), computed on the first call if not given as parameter.
+
+        Validations sharing the same splits parameters can reuse them (splits_indices parameter), e.g. to compare
+        algorithms or inputs on the same splits.
+
+        Returns: the splits indices, None if the validation does not use precomputed splits.
+        """
+        return self._validation_params.get('splits_indices')
 
     @abstractmethod
     def validate(self, y):
@@ -139,6 +544,60 @@ class MLAlgorithm(ABC):
             self._x = input_data
 
         self._y = y
+        self._executor = None
+        self._n_jobs = None
+        # Attributes shared with the workers of a process executor, as memory-mapped files
+        self._shared_arrays = {}
+
+    def set_executor(self, executor):
+        """Set the executor of the inner tasks; with a process executor, the input data is shared as a memory map."""
+        self._executor = executor
+        self._n_jobs = None if executor is None else executor.blas_threads
+        if executor is not None and executor.uses_processes:
+            name = '_kernel' if self.uses_kernel() else '_x'
+            array, filename = executor.share_array(getattr(self, name))
+            if filename is not None:
+                setattr(self, name, array)
+                self._shared_arrays[name] = filename
+
+    def get_executor(self):
+        """Return the executor of the inner tasks set with set_executor(), None if none was set."""
+        return self._executor
+
+    def executor_scope(self):
+        """
+        Context manager giving the executor of the inner tasks, used by evaluate().
+
+        Without set_executor() (e.g. evaluate() called outside of a validation), a pool of n_threads threads is
+        created for the scope and shut down on exit.
+        """
+        return _ExecutorScope(self._executor, self._algorithm_params['n_threads'], self)
+
+    def get_n_jobs(self):
+        """
+        Number of threads of an inner task (e.g. n_jobs of a forest).
+
+        With an executor, this is the number of threads of each of its workers, so that its n_workers concurrent
+        tasks do not use more threads than available CPUs; otherwise, n_threads.
+        """
+        if self._n_jobs is None:
+            return self._algorithm_params['n_threads']
+        return self._n_jobs
+
+    def __getstate__(self):
+        # Pickled for the workers of a process executor: shared arrays are reopened from their file
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        for name in self._shared_arrays:
+            state[name] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for name, filename in self._shared_arrays.items():
+            setattr(self, name, np.load(filename, mmap_mode='r'))
+        # Tasks run by a worker process run serially in this process
+        self._executor = SerialExecutor()
 
     @staticmethod
     @abstractmethod
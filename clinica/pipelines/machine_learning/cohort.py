@@ -0,0 +1,125 @@
+# coding: utf8
+
+"""
+Cohort index shared by the machine learning inputs.
+
+A cohort index holds what the inputs derive from the subjects/visits and
+diagnoses TSV files: the lists of participants and sessions, the diagnoses
+encoded as integers and the images resolved for given input parameters.
+Indices are cached in the process, keyed by the signatures (path, size,
+modification time) of the two TSV files, so that the workflows of the same
+cohort (e.g. different algorithms or validations) read the TSV files and
+build the paths of the images only once. The existence of the images is not
+cached: it is checked each time an input resolves its images, since files can
+be removed between two workflows.
+"""
+
+import threading
+
+import numpy as np
+
+__author__ = "Jorge Samper-Gonzalez"
+__copyright__ = "Copyright 2016-2019 The Aramis Lab Team"
+__credits__ = ["Jorge Samper-Gonzalez"]
+__license__ = "See LICENSE.txt file"
+__version__ = "0.1.0"
+__maintainer__ = "Jorge Samper-Gonzalez"
+__email__ = "jorge.samper-gonzalez@inria.fr"
+__status__ = "Development"
+
+_cohort_indices = {}
+_cohort_indices_lock = threading.Lock()
+
+
+class CohortIndex(object):
+    """Participants, sessions, encoded diagnoses and images of a cohort.
+
+    Attributes:
+        subjects (list): Participants (participant_id column of the subjects/visits TSV).
+        sessions (list): Sessions (session_id column of the subjects/visits TSV).
+        diagnoses (list): Diagnoses (diagnosis column of the diagnoses TSV).
+        classes (np.ndarray): Sorted distinct diagnoses.
+        labels (np.ndarray): Read-only integer labels, labels[i] being the index of diagnoses[i] in classes.
+    """
+
+    def __init__(self, subjects_visits_tsv, diagnoses_tsv):
+        from pandas.io import parsers
+
+        subjects_visits = parsers.read_csv(subjects_visits_tsv, sep='\t')
+        if list(subjects_visits.columns.values) != ['participant_id', 'session_id']:
+            raise Exception('Subjects and visits file is not in the correct format.')
+        self._subjects = list(subjects_visits.participant_id)
+        self._sessions = list(subjects_visits.session_id)
+
+        diagnoses = parsers.read_csv(diagnoses_tsv, sep='\t')
+        if 'diagnosis' not in list(diagnoses.columns.values):
+            raise Exception('Diagnoses file is not in the correct format.')
+        self._diagnoses = list(diagnoses.diagnosis)
+
+        self._classes, labels = np.unique(np.array(self._diagnoses), return_inverse=True)
+        self._labels = labels.astype(int).ravel()
+        self._labels.flags.writeable = False
+
+        self._images = {}
+        self._lock = threading.Lock()
+
+    @property
+    def subjects(self): return self._subjects
+
+    @property
+    def sessions(self): return self._sessions
+
+    @property
+    def diagnoses(self): return self._diagnoses
+
+    @property
+    def classes(self): return self._classes
+
+    @property
+    def labels(self): return self._labels
+
+    def get_images(self, key, build_function):
+        """Return the images of the cohort for given input parameters, built once per key.
+
+        Args:
+            key: Hashable key identifying the images (e.g. type of input and parameters determining the paths).
+            build_function: Function taking the lists of participants and sessions as arguments and returning
+                the images (one element per participant/session).
+
+        Returns:
+            List of images (a new list, which can be modified by the caller).
+        """
+        with self._lock:
+            images = self._images.get(key)
+        if images is None:
+            images = build_function(self._subjects, self._sessions)
+            with self._lock:
+                images = self._images.setdefault(key, images)
+        return list(images)
+
+    def get_missing_files(self, files):
+        """Return the files of a list (possibly of lists, e.g. one file per hemisphere) that do not exist.
+
+        The files are checked on disk at each call.
+        """
+        import os
+
+        flat_files = [f for element in files for f in (element if isinstance(element, (list, tuple)) else [element])]
+        return [f for f in flat_files if not os.path.exists(f)]
+
+
+def get_cohort_index(subjects_visits_tsv, diagnoses_tsv):
+    """Return the cohort index of a subjects/visits TSV and a diagnoses TSV, shared in the process.
+
+    The index is rebuilt if one of the files changed (size or modification time).
+    """
+    from clinica.pipelines.machine_learning.feature_store import get_files_signatures
+
+    key = tuple(tuple(signature) for signature in get_files_signatures([subjects_visits_tsv, diagnoses_tsv]))
+    with _cohort_indices_lock:
+        index = _cohort_indices.get(key)
+    if index is None:
+        index = CohortIndex(subjects_visits_tsv, diagnoses_tsv)
+        with _cohort_indices_lock:
+            index = _cohort_indices.setdefault(key, index)
+    return index
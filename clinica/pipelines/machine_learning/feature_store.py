@@ -0,0 +1,527 @@
+# coding: utf8
+
+"""
+On-disk feature stores of the machine learning inputs.
+
+A feature store is a folder containing the feature matrix of a set of images
+(data.npy, float32, one row per image, opened as a read-only memory map), the
+optional arrays needed to interpret it (e.g. mask.npy) and a small header
+(header.json). Stores are located in the Clinica cache directory and are
+identified by a key built from the input files (path, size and modification
+time) and the parameters used to compute the features: a store is reused as
+long as the input files and parameters are unchanged.
+
+Stores are located in the feature_stores folder of the Clinica cache
+directory (the CLINICA_CACHE_DIR environment variable, ~/.clinica/cache by
+default, see clinica.utils.cache) unless another folder is given (e.g. the
+feature_store_directory parameter of the CAPS inputs). The folder is printed
+when a store is built. A store replaces the stores built from the same files
+(paths) and parameters, which are outdated, and the least recently used stores
+of the folder are removed when its size exceeds the limit given by the
+CLINICA_FEATURE_STORE_MAX_GB environment variable (FEATURE_STORE_MAX_GB by
+default).
+
+Kernels computed from the features are cached in the same way, as a single
+.npy file per kernel, so that workflows using the same images, parameters and
+kernel function (e.g. different validation schemes) compute it only once.
+A kernel can be stored with its index (the signatures of its files and a key
+identifying its parameters), so that the kernel of a list of files can be
+completed from the cached kernel of a subset of these files. Kernels are
+located in the kernels folder of the Clinica cache directory unless another
+folder is given (kernel_cache_directory parameter of the CAPS inputs), and are
+removed in the same way as the feature stores: a kernel replaces the kernels
+of the same files (paths) and parameters, a completed kernel replaces the
+kernel of the subset it was completed from, and the least recently used
+kernels are removed when the folder exceeds the limit given by the
+CLINICA_KERNEL_CACHE_MAX_GB environment variable (KERNEL_CACHE_MAX_GB by
+default).
+"""
+
+import os
+
+import numpy as np
+
+__author__ = "Jorge Samper-Gonzalez"
+__copyright__ = "Copyright 2016-2019 The Aramis Lab Team"
+__credits__ = ["Jorge Samper-Gonzalez"]
+__license__ = "See LICENSE.txt file"
+__version__ = "0.1.0"
+__maintainer__ = "Jorge Samper-Gonzalez"
+__email__ = "jorge.samper-gonzalez@inria.fr"
+__status__ = "Development"
+
+FEATURE_STORE_VERSION = 1
+
+# Default maximum size of the feature stores of a folder (in GB), see get_feature_store_max_size()
+FEATURE_STORE_MAX_GB = 50
+
+# Default maximum size of the cached kernels of a folder (in GB), see get_kernel_cache_max_size()
+KERNEL_CACHE_MAX_GB = 10
+
+
+def get_files_signatures(files):
+    """Return the signature [absolute path, size, modification time] of each file of a list."""
+    signatures = []
+    for f in files:
+        stat = os.stat(f)
+        signatures.append([os.path.abspath(f), stat.st_size, stat.st_mtime_ns])
+    return signatures
+
+
+def get_files_key(files, **parameters):
+    """Return a key identifying a list of files (path, size, modification time) and parameters.
+
+    Args:
+        files: List of paths.
+        parameters: JSON-serializable parameters used to compute the features.
+
+    Returns:
+        Hexadecimal sha256 hash (str).
+    """
+    import hashlib
+    import json
+
+    content = json.dumps({'version': FEATURE_STORE_VERSION, 'files': get_files_signatures(files),
+                          'parameters': parameters},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def get_paths_key(files, **parameters):
+    """Return a key identifying the paths of a list of files and parameters, independently of the content of the
+    files (the stores of the same paths and parameters supersede each other)."""
+    import hashlib
+    import json
+
+    content = json.dumps({'version': FEATURE_STORE_VERSION, 'paths': [os.path.abspath(f) for f in files],
+                          'parameters': parameters},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def _get_max_size(variable, default_gb):
+    from clinica.utils.exceptions import ClinicaException
+
+    value = os.environ.get(variable, '')
+    if not value:
+        return int(default_gb * 2 ** 30)
+    try:
+        max_size = float(value)
+    except ValueError:
+        raise ClinicaException('%s must be a number of GB (found %s).' % (variable, value))
+    return int(max_size * 2 ** 30)
+
+
+def get_feature_store_max_size():
+    """Return the maximum size in bytes of the feature stores of a folder.
+
+    The limit is given in GB by the CLINICA_FEATURE_STORE_MAX_GB environment variable (FEATURE_STORE_MAX_GB if it
+    is not defined).
+    """
+    return _get_max_size('CLINICA_FEATURE_STORE_MAX_GB', FEATURE_STORE_MAX_GB)
+
+
+def get_kernel_cache_max_size():
+    """Return the maximum size in bytes of the cached kernels of a folder.
+
+    The limit is given in GB by the CLINICA_KERNEL_CACHE_MAX_GB environment variable (KERNEL_CACHE_MAX_GB if it
+    is not defined).
+    """
+    return _get_max_size('CLINICA_KERNEL_CACHE_MAX_GB', KERNEL_CACHE_MAX_GB)
+
+
+def get_feature_store_directory(key, root=None):
+    """Return the folder of the feature store identified by `key`.
+
+    Args:
+        key: Key of the store (see get_files_key()).
+        root: Folder containing the feature stores (default: feature_stores in the Clinica cache directory).
+    """
+    from clinica.utils.cache import get_cache_directory
+
+    if root is None:
+        root = get_cache_directory('feature_stores')
+    return os.path.join(root, key)
+
+
+class FeatureStore(object):
+    """Feature matrix stored on disk.
+
+    Attributes:
+        directory (str): Folder of the store.
+        header (dict): Content of header.json (n_samples, n_features and
+            information specific to the type of features).
+    """
+
+    def __init__(self, directory):
+        import json
+
+        self._directory = directory
+        with open(os.path.join(directory, 'header.json'), 'r') as f:
+            self._header = json.load(f)
+
+    @property
+    def directory(self): return self._directory
+
+    @property
+    def header(self): return self._header
+
+    @property
+    def n_samples(self): return self._header['n_samples']
+
+    @property
+    def n_features(self): return self._header['n_features']
+
+    def get_data(self):
+        """Return the feature matrix (n_samples, n_features) as a read-only float32 memory map."""
+        return np.load(os.path.join(self._directory, 'data.npy'), mmap_mode='r')
+
+    def get_array(self, name):
+        """Return an additional array of the store (e.g. 'mask'), None if it does not exist."""
+        filename = os.path.join(self._directory, name + '.npy')
+        if not os.path.isfile(filename):
+            return None
+        return np.load(filename)
+
+
+def open_feature_store(key, root=None):
+    """Return the feature store identified by `key`, None if it does not exist or is incomplete."""
+    directory = get_feature_store_directory(key, root)
+    try:
+        store = FeatureStore(directory)
+    except (OSError, IOError, ValueError):
+        return None
+    if store.header.get('version') != FEATURE_STORE_VERSION or store.header.get('key') != key:
+        return None
+    try:
+        # The modification time of the header records the last use of the store (see remove_feature_stores())
+        os.utime(os.path.join(directory, 'header.json'))
+    except OSError:
+        pass
+    return store
+
+
+def build_feature_store(key, build_function, root=None, lineage=None):
+    """Build a feature store.
+
+    The store is built in a temporary folder, which is renamed once the header
+    is written: an interrupted build never leaves a store that looks complete.
+    The stores superseded by the new store are then removed, as well as the
+    least recently used stores if the folder exceeds its size limit (see
+    remove_feature_stores()).
+
+    Args:
+        key: Key of the store (see get_files_key()).
+        build_function: Function taking the folder of the store as argument,
+            writing data.npy (and additional arrays) in it and returning the
+            header (dictionary with at least n_samples and n_features).
+        root: Folder containing the feature stores (default: feature_stores in the Clinica cache directory).
+        lineage: Key identifying the files and parameters of the store independently of the content of the files
+            (see get_paths_key()): the stores of the same lineage are removed.
+
+    Returns:
+        FeatureStore.
+    """
+    import json
+    import shutil
+    import threading
+
+    directory = get_feature_store_directory(key, root)
+    tmp_directory = '%s.tmp-%d-%d' % (directory, os.getpid(), threading.get_ident())
+    if os.path.exists(tmp_directory):
+        shutil.rmtree(tmp_directory)
+    os.makedirs(tmp_directory)
+    try:
+        header = build_function(tmp_directory)
+        header.update({'version': FEATURE_STORE_VERSION, 'key': key, 'lineage': lineage})
+        with open(os.path.join(tmp_directory, 'header.json'), 'w') as f:
+            json.dump(header, f, indent=2)
+    except BaseException:
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        raise
+
+    if os.path.exists(directory):
+        # Outdated or incomplete store
+        shutil.rmtree(directory, ignore_errors=True)
+    try:
+        os.rename(tmp_directory, directory)
+    except OSError:
+        # Store built concurrently by another process
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        if open_feature_store(key, root) is None:
+            raise
+    remove_feature_stores(os.path.dirname(directory), keep=key, lineage=lineage,
+                          max_size=get_feature_store_max_size())
+    return FeatureStore(directory)
+
+
+def _get_directory_size(directory):
+    size = 0
+    for folder, _, filenames in os.walk(directory):
+        for filename in filenames:
+            try:
+                size += os.path.getsize(os.path.join(folder, filename))
+            except OSError:
+                pass
+    return size
+
+
+def remove_feature_stores(root, keep=None, lineage=None, max_size=None):
+    """Remove outdated feature stores of a folder.
+
+    A store in use by another process can be removed: its memory maps remain
+    valid on POSIX systems, and it is rebuilt when it is opened again.
+
+    Args:
+        root: Folder containing the feature stores.
+        keep: Key of a store that is never removed (e.g. the store just built).
+        lineage: If given, the stores of this lineage (see build_feature_store()) are removed.
+        max_size: If given, the least recently used stores are removed until the stores of the folder use at most
+            max_size bytes.
+
+    Returns:
+        List of the keys of the removed stores.
+    """
+    import json
+    import shutil
+
+    stores = []
+    for name in os.listdir(root) if os.path.isdir(root) else []:
+        header_file = os.path.join(root, name, 'header.json')
+        if '.tmp-' in name or name == keep or not os.path.isfile(header_file):
+            continue
+        try:
+            with open(header_file, 'r') as f:
+                header = json.load(f)
+            last_use = os.path.getmtime(header_file)
+        except (OSError, IOError, ValueError):
+            continue
+        stores.append((last_use, name, header.get('lineage')))
+
+    removed = [name for _, name, store_lineage in stores if lineage is not None and store_lineage == lineage]
+    if max_size is not None:
+        sizes = {name: _get_directory_size(os.path.join(root, name)) for _, name, _ in stores if name not in removed}
+        total_size = sum(sizes.values()) + (_get_directory_size(os.path.join(root, keep)) if keep else 0)
+        for _, name, _ in sorted(stores):
+            if total_size <= max_size:
+                break
+            if name in sizes:
+                removed.append(name)
+                total_size -= sizes[name]
+
+    for name in removed:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return removed
+
+
+def get_feature_store(files, build_function, root=None, **parameters):
+    """Return the feature store of a list of files and parameters, built if it does not exist or is outdated.
+
+    Args:
+        files: List of the input files of the store.
+        build_function: Function building the store (see build_feature_store()).
+        root: Folder containing the feature stores (default: feature_stores in the Clinica cache directory).
+        parameters: JSON-serializable parameters used to compute the features.
+
+    Returns:
+        FeatureStore.
+    """
+    from clinica.utils.stream import cprint
+
+    key = get_files_key(files, **parameters)
+    store = open_feature_store(key, root)
+    if store is None:
+        cprint('Building feature store in %s' % get_feature_store_directory(key, root))
+        store = build_feature_store(key, build_function, root, lineage=get_paths_key(files, **parameters))
+    return store
+
+
+def get_kernel_cache_file(key, root=None):
+    """Return the .npy file of the kernel identified by `key`.
+
+    Args:
+        key: Key of the kernel (see get_files_key()).
+        root: Folder containing the kernels (default: kernels in the Clinica cache directory).
+    """
+    from clinica.utils.cache import get_cache_directory
+
+    if root is None:
+        root = get_cache_directory('kernels')
+    return os.path.join(root, key + '.npy')
+
+
+def load_cached_kernel(key, root=None):
+    """Return the kernel identified by `key`, None if it is not in the cache."""
+    filename = get_kernel_cache_file(key, root)
+    try:
+        kernel = np.load(filename)
+    except (OSError, IOError, ValueError):
+        return None
+    try:
+        # The modification time of the kernel records its last use (see remove_cached_kernels())
+        os.utime(filename)
+    except OSError:
+        pass
+    return kernel
+
+
+def _write_atomically(filename, write_function, mode='wb'):
+    import tempfile
+
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(filename), suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            write_function(f)
+        os.replace(tmp_file, filename)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+
+def save_cached_kernel(key, kernel, root=None, files=None, parameters_key=None, lineage=None,
+                       remove_subsets=False):
+    """Save a kernel in the cache (the files are replaced atomically) and return its filename.
+
+    The kernels superseded by the new kernel are then removed, as well as the
+    least recently used kernels if the folder exceeds its size limit (see
+    remove_cached_kernels()).
+
+    Args:
+        key: Key of the kernel (see get_files_key()).
+        kernel: Kernel (2d-array).
+        root: Folder containing the kernels (default: kernels in the Clinica cache directory).
+        files: Files of the samples of the kernel (in the order of its rows). If given with
+            `parameters_key`, the index of the kernel is saved (<key>.json) so that it can be
+            completed by find_cached_kernel_subset().
+        parameters_key: Key identifying the parameters of the kernel independently of its files.
+        lineage: Key identifying the files and parameters of the kernel independently of the content of the files
+            (see get_paths_key()): the kernels of the same lineage are removed.
+        remove_subsets: If True, the kernels with the same parameters whose files are a subset of `files` are
+            removed (e.g. the kernel completed by find_cached_kernel_subset()): they are part of the new kernel.
+    """
+    import json
+
+    filename = get_kernel_cache_file(key, root)
+    if not os.path.isdir(os.path.dirname(filename)):
+        os.makedirs(os.path.dirname(filename))
+    _write_atomically(filename, lambda f: np.save(f, kernel))
+    signatures = None
+    if files is not None and parameters_key is not None:
+        signatures = get_files_signatures(files)
+        index = {'version': FEATURE_STORE_VERSION, 'key': key, 'parameters_key': parameters_key,
+                 'lineage': lineage, 'files': signatures}
+        _write_atomically(filename[:-len('.npy')] + '.json', lambda f: json.dump(index, f), mode='w')
+    superset = (parameters_key, signatures) if remove_subsets and signatures is not None else None
+    remove_cached_kernels(os.path.dirname(filename), keep=key, lineage=lineage, superset=superset,
+                          max_size=get_kernel_cache_max_size())
+    return filename
+
+
+def remove_cached_kernels(root, keep=None, lineage=None, superset=None, max_size=None):
+    """Remove outdated kernels of a folder (<key>.npy and its index <key>.json).
+
+    Args:
+        root: Folder containing the kernels.
+        keep: Key of a kernel that is never removed (e.g. the kernel just saved).
+        lineage: If given, the kernels of this lineage (see save_cached_kernel()) are removed.
+        superset: If given, tuple (parameters key, file signatures): the kernels with these parameters whose
+            files are all in the signatures are removed.
+        max_size: If given, the least recently used kernels are removed until the kernels of the folder use at
+            most max_size bytes.
+
+    Returns:
+        List of the keys of the removed kernels.
+    """
+    import json
+
+    superset_files = None if superset is None else set(tuple(signature) for signature in superset[1])
+    kernels = []
+    removed = []
+    for name in os.listdir(root) if os.path.isdir(root) else []:
+        if not name.endswith('.npy') or name[:-len('.npy')] == keep:
+            continue
+        key = name[:-len('.npy')]
+        filename = os.path.join(root, name)
+        index_file = filename[:-len('.npy')] + '.json'
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            continue
+        size = stat.st_size
+        index = {}
+        if os.path.isfile(index_file):
+            try:
+                size += os.path.getsize(index_file)
+                with open(index_file, 'r') as f:
+                    index = json.load(f)
+            except (OSError, IOError, ValueError):
+                pass
+        if lineage is not None and index.get('lineage') == lineage:
+            removed.append(key)
+        elif superset_files is not None and index.get('parameters_key') == superset[0] and 'files' in index \
+                and all(tuple(signature) in superset_files for signature in index['files']):
+            removed.append(key)
+        else:
+            kernels.append((stat.st_mtime, key, size))
+
+    if max_size is not None:
+        total_size = sum(size for _, _, size in kernels)
+        if keep is not None:
+            for extension in ['.npy', '.json']:
+                filename = os.path.join(root, keep + extension)
+                total_size += os.path.getsize(filename) if os.path.isfile(filename) else 0
+        for _, key, size in sorted(kernels):
+            if total_size <= max_size:
+                break
+            removed.append(key)
+            total_size -= size
+
+    for key in removed:
+        for extension in ['.npy', '.json']:
+            try:
+                os.remove(os.path.join(root, key + extension))
+            except OSError:
+                pass
+    return removed
+
+
+def find_cached_kernel_subset(files, parameters_key, root=None):
+    """Find the cached kernel with the same parameters covering the largest subset of a list of files.
+
+    A cached kernel can be used if it was saved with its index and if all its
+    files are in `files` with the same size and modification time.
+
+    Args:
+        files: List of files.
+        parameters_key: Key identifying the parameters of the kernel independently of its files.
+        root: Folder containing the kernels (default: kernels in the Clinica cache directory).
+
+    Returns:
+        Tuple (kernel, positions) where positions[i] is the index in `files` of
+        the i-th sample of the cached kernel, (None, None) if there is no such kernel.
+    """
+    import glob
+    import json
+
+    position = {tuple(signature): i for i, signature in enumerate(get_files_signatures(files))}
+    best_key, best_positions = None, None
+    for index_file in glob.glob(os.path.join(os.path.dirname(get_kernel_cache_file('', root)), '*.json')):
+        try:
+            with open(index_file, 'r') as f:
+                index = json.load(f)
+        except (OSError, IOError, ValueError):
+            continue
+        if index.get('version') != FEATURE_STORE_VERSION or index.get('parameters_key') != parameters_key:
+            continue
+        positions = [position.get(tuple(signature)) for signature in index['files']]
+        if None in positions or (best_positions is not None and len(positions) <= len(best_positions)):
+            continue
+        best_key, best_positions = index['key'], positions
+
+    if best_key is None:
+        return None, None
+    kernel = load_cached_kernel(best_key, root)
+    if kernel is None or kernel.shape != (len(best_positions), len(best_positions)):
+        return None, None
+    return kernel, np.array(best_positions, dtype=int)
@@ -5,10 +5,10 @@ import abc
 import os.path as path
 
 import numpy as np
-from pandas.io import parsers
 
 from clinica.utils.stream import cprint
 from clinica.pipelines.machine_learning import base
+from clinica.pipelines.machine_learning.cohort import get_cohort_index
 import clinica.pipelines.machine_learning.voxel_based_io as vbio
 import clinica.pipelines.machine_learning.vertex_based_io as vtxbio
 import clinica.pipelines.machine_learning.region_based_io as rbio
@@ -27,6 +27,11 @@ __maintainer__ = "Jorge Samper-Gonzalez"
 __email__ = "jorge.samper-gonzalez@inria.fr"
 __status__ = "Development"
 
+# Input parameters determining the features, and therefore the kernel, of a list of images
+KERNEL_KEY_PARAMETERS = ['image_type', 'group_id', 'fwhm', 'modulated', 'pvc', 'mask_zeros', 'atlas']
+# Input parameters determining the paths of the images of a cohort
+IMAGES_KEY_PARAMETERS = ['caps_directory', 'image_type', 'group_id', 'fwhm', 'modulated', 'pvc', 'atlas']
+
 
 class CAPSInput(base.MLInput):
 
@@ -36,16 +41,11 @@ class CAPSInput(base.MLInput):
 
         self._images = None
 
-        subjects_visits = parsers.read_csv(self._input_params['subjects_visits_tsv'], sep='\t')
-        if list(subjects_visits.columns.values) != ['participant_id', 'session_id']:
-            raise Exception('Subjects and visits file is not in the correct format.')
-        self._subjects = list(subjects_visits.participant_id)
-        self._sessions = list(subjects_visits.session_id)
-
-        diagnoses = parsers.read_csv(self._input_params['diagnoses_tsv'], sep='\t')
-        if 'diagnosis' not in list(diagnoses.columns.values):
-            raise Exception('Diagnoses file is not in the correct format.')
-        self._diagnoses = list(diagnoses.diagnosis)
+        # Participants, sessions, labels and images are shared by the inputs of the same cohort in the process
+        self._cohort = get_cohort_index(self._input_params['subjects_visits_tsv'], self._input_params['diagnoses_tsv'])
+        self._subjects = self._cohort.subjects
+        self._sessions = self._cohort.sessions
+        self._diagnoses = self._cohort.diagnoses
 
         if self._input_params['image_type'] not in ['T1', 'fdg', 'av45', 'pib', 'flute', 'dwi']:
             raise Exception("Incorrect image type. It must be one of the values 'T1', 'fdg', 'av45', "
@@ -59,12 +59,15 @@ class CAPSInput(base.MLInput):
                     raise Exception("""Precomputed kernel provided is not in the correct format.
                     It must be a numpy.ndarray object with number of rows and columns equal to the number of subjects,
                     or a filename to a numpy txt file containing an object with the described format.""")
-            elif type(self._input_params['precomputed_kernel'] == str):
-                self._kernel = np.loadtxt(self._input_params['precomputed_kernel'])
+            elif isinstance(self._input_params['precomputed_kernel'], str):
+                if self._input_params['precomputed_kernel'].endswith('.npy'):
+                    self._kernel = np.load(self._input_params['precomputed_kernel'])
+                else:
+                    self._kernel = np.loadtxt(self._input_params['precomputed_kernel'])
             else:
                 raise Exception("""Precomputed kernel provided is not in the correct format.
                 It must be a numpy.ndarray object with number of rows and columns equal to the number of subjects,
-                or a filename to a numpy txt file containing an object with the described format.""")
+                or a filename to a numpy txt or npy file containing an object with the described format.""")
 
     @abc.abstractmethod
     def get_images(self):
@@ -93,39 +96,130 @@ class CAPSInput(base.MLInput):
         if self._y is not None:
             return self._y
 
-        unique = sorted(list(set(self._diagnoses)))
-        self._y = np.array([unique.index(x) for x in self._diagnoses])
+        # Diagnoses encoded once by the cohort index (index of the diagnosis in the sorted distinct diagnoses)
+        self._y = np.array(self._cohort.labels)
         return self._y
 
-    def get_kernel(self, kernel_function=utils.gram_matrix_linear, recompute_if_exists=False):
+    def get_cohort_images(self, build_function):
+        """
+        Images of the subjects, built once per cohort and input parameters (see cohort.py).
+
+        Args:
+            build_function: Function taking the lists of participants and sessions as arguments and returning
+                the images.
+
+        Returns: a list of filenames
+
+        """
+        key = (self.__class__.__name__,) + tuple(str(self._input_params.get(name))
+                                                 for name in IMAGES_KEY_PARAMETERS)
+        return self._cohort.get_images(key, build_function)
+
+    def get_kernel(self, kernel_function=None, recompute_if_exists=False):
         """
 
+        Args:
+            kernel_function: Function computing the kernel from the features (default: linear kernel computed
+                by blocks of features with n_threads threads, see ml_utils.gram_matrix_linear()).
+            recompute_if_exists: If True, the kernel is computed even if it already exists.
+
         Returns: a numpy 2d-array.
 
         """
+        from clinica.pipelines.machine_learning.feature_store import (find_cached_kernel_subset, get_files_key,
+                                                                      get_paths_key, load_cached_kernel,
+                                                                      save_cached_kernel)
+
         if self._kernel is not None and not recompute_if_exists:
             return self._kernel
 
+        # The kernel is reused from the kernel cache if it was computed with the same images and parameters
+        kernel_cache_directory = self._input_params['kernel_cache_directory']
+        parameters = self.get_kernel_parameters(utils.gram_matrix_linear if kernel_function is None
+                                                else kernel_function)
+        key = None if parameters is None else get_files_key(self.get_images(), **parameters)
+        if key is not None and not recompute_if_exists:
+            kernel = load_cached_kernel(key, kernel_cache_directory)
+            if kernel is not None and kernel.shape == (len(self._subjects), len(self._subjects)):
+                cprint("Kernel loaded from cache")
+                self._kernel = kernel
+                return self._kernel
+
         if self._x is None:
             self.get_x()
 
-        cprint("Computing kernel ...")
-        self._kernel = kernel_function(self._x)
+        # An entry of the linear kernel only depends on its two images (voxels removed by the mask are zero):
+        # if the kernel of a subset of the images is cached, only the rows of the new images are computed.
+        cached_kernel = None
+        if key is not None and kernel_function is None and self._input_params['incremental_kernel'] \
+                and not recompute_if_exists:
+            cached_kernel, positions = find_cached_kernel_subset(self.get_images(), get_files_key([], **parameters),
+                                                                 kernel_cache_directory)
+
+        if cached_kernel is not None:
+            n_subjects = len(self._subjects)
+            new_subjects = np.setdiff1d(np.arange(n_subjects), positions)
+            cprint("Computing kernel of %d new subjects (%d subjects in cache) ..."
+                   % (len(new_subjects), len(positions)))
+            kernel = np.zeros((n_subjects, n_subjects), dtype=np.float64)
+            kernel[np.ix_(positions, positions)] = cached_kernel
+            kernel_rows = utils.gram_matrix_linear_rows(self._x, new_subjects,
+                                                        n_threads=self._input_params['n_threads'])
+            kernel[new_subjects, :] = kernel_rows
+            kernel[:, new_subjects] = kernel_rows.T
+            self._kernel = kernel
+        else:
+            cprint("Computing kernel ...")
+            if kernel_function is None:
+                self._kernel = utils.gram_matrix_linear(self._x, n_threads=self._input_params['n_threads'])
+            else:
+                self._kernel = kernel_function(self._x)
         cprint("Kernel computed")
+
+        # The kernel replaces the cached kernel of the same images with older files, and the kernel it completed
+        if key is not None:
+            save_cached_kernel(key, self._kernel, kernel_cache_directory, files=self.get_images(),
+                               parameters_key=get_files_key([], **parameters),
+                               lineage=get_paths_key(self.get_images(), **parameters),
+                               remove_subsets=cached_kernel is not None)
         return self._kernel
 
+    def get_kernel_parameters(self, kernel_function):
+        """
+        Parameters identifying the kernel of the images in the kernel cache (see feature_store.py).
+
+        The key of a kernel is built from the images (path, size and modification time) and these parameters:
+        the parameters used to compute the features (e.g. mask, FWHM, modulation) and the name of the kernel function.
+
+        Args:
+            kernel_function: Function computing the kernel from the features.
+
+        Returns: a dictionary, None if the kernel cannot be cached (no image files, several files per image such
+            as the surfaces of the hemispheres, or function without a stable name such as a lambda).
+
+        """
+        images = self.get_images()
+        function_name = '%s.%s' % (getattr(kernel_function, '__module__', None),
+                                   getattr(kernel_function, '__qualname__', '<unknown>'))
+        if not images or '<' in function_name or any(isinstance(image, (list, tuple)) for image in images):
+            return None
+
+        parameters = {name: self._input_params[name] for name in KERNEL_KEY_PARAMETERS if name in self._input_params}
+        parameters.update({'type': 'kernel', 'input': self.__class__.__name__, 'kernel_function': function_name})
+        return parameters
+
     def save_kernel(self, output_dir):
         """
 
         Args:
             output_dir:
 
-        Returns:
+        Returns: the filename of the kernel (kernel.npy, which can be given as precomputed_kernel).
 
         """
         if self._kernel is not None:
-            filename = path.join(output_dir, 'kernel.txt')
-            np.savetxt(filename, self._kernel)
+            filename = path.join(output_dir, 'kernel.npy')
+            np.save(filename, self._kernel)
             return filename
         raise Exception("Unable to save the kernel. Kernel must have been computed before.")
 
@@ -141,7 +235,11 @@ class CAPSInput(base.MLInput):
                            'diagnoses_tsv': None,
                            'group_id': None,
                            'image_type': None,
-                           'precomputed_kernel': None}
+                           'precomputed_kernel': None,
+                           'n_threads': 15,
+                           'kernel_cache_directory': None,
+                           'incremental_kernel': True,
+                           'feature_store_directory': None}
 
         return parameters_dict
 
@@ -167,30 +265,32 @@ class CAPSVoxelBasedInput(CAPSInput):
         if self._images is not None:
             return self._images
 
-        if self._input_params['image_type'] == 'T1':
-            fwhm = '' if self._input_params['fwhm'] == 0 else '_fwhm-%dmm' % int(self._input_params['fwhm'])
+        def build(subjects, sessions):
+            if self._input_params['image_type'] == 'T1':
+                fwhm = '' if self._input_params['fwhm'] == 0 else '_fwhm-%dmm' % int(self._input_params['fwhm'])
+
+                return [path.join(self._input_params['caps_directory'], 'subjects', subjects[i], sessions[i],
+                                  't1/spm/dartel/group-' + self._input_params['group_id'],
+                                  '%s_%s_T1w_segm-graymatter_space-Ixi549Space_modulated-%s%s_probability.nii.gz'
+                                  % (subjects[i], sessions[i], self._input_params['modulated'], fwhm))
+                        for i in range(len(subjects))]
 
-            self._images = [path.join(self._input_params['caps_directory'], 'subjects', self._subjects[i],
-                                      self._sessions[i], 't1/spm/dartel/group-' + self._input_params['group_id'],
-                                      '%s_%s_T1w_segm-graymatter_space-Ixi549Space_modulated-%s%s_probability.nii.gz'
-                                      % (self._subjects[i], self._sessions[i], self._input_params['modulated'], fwhm))
-                            for i in range(len(self._subjects))]
-        else:
             pvc = '' if self._input_params['pvc'] is None else '_pvc-%s' % self._input_params['pvc']
             fwhm = '' if self._input_params['fwhm'] == 0 else '_fwhm-%dmm' % int(self._input_params['fwhm'])
             suvr = 'pons' if self._input_params['image_type'] == 'fdg' else 'cerebellumPons'
 
-            self._images = [path.join(self._input_params['caps_directory'], 'subjects', self._subjects[i],
-                                      self._sessions[i], 'pet/preprocessing/group-' + self._input_params['group_id'],
-                                      '%s_%s_task-rest_acq-%s_pet_space-Ixi549Space%s_suvr-%s_mask-brain%s_pet.nii.gz'
-                                      % (self._subjects[i], self._sessions[i], self._input_params['image_type'], pvc,
-                                         suvr, fwhm))
-                            for i in range(len(self._subjects))]
+            return [path.join(self._input_params['caps_directory'], 'subjects', subjects[i], sessions[i],
+                              'pet/preprocessing/group-' + self._input_params['group_id'],
+                              '%s_%s_task-rest_acq-%s_pet_space-Ixi549Space%s_suvr-%s_mask-brain%s_pet.nii.gz'
+                              % (subjects[i], sessions[i], self._input_params['image_type'], pvc, suvr, fwhm))
+                    for i in range(len(subjects))]
 
-        for image in self._images:
-            if not path.exists(image):
-                raise Exception("File %s doesn't exists." % image)
+        images = self.get_cohort_images(build)
+        missing_files = self._cohort.get_missing_files(images)
+        if len(missing_files) > 0:
+            raise Exception("File %s doesn't exists." % missing_files[0])
 
+        self._images = images
         return self._images
 
     def get_x(self):
@@ -203,7 +303,10 @@ class CAPSVoxelBasedInput(CAPSInput):
             return self._x
 
         cprint('Loading ' + str(len(self.get_images())) + ' subjects')
-        self._x, self._orig_shape, self._data_mask = vbio.load_data(self._images, mask=self._input_params['mask_zeros'])
+        # Features are stored once in a float32 memory map, reused while the images and mask are unchanged
+        self._x, self._orig_shape, self._data_mask = vbio.load_data_from_feature_store(
+            self._images, mask=self._input_params['mask_zeros'],
+            store_root=self._input_params['feature_store_directory'])
         cprint('Subjects loaded')
 
         return self._x
@@ -251,27 +354,30 @@ class CAPSRegionBasedInput(CAPSInput):
         if self._images is not None:
             return self._images
 
-        if self._input_params['image_type'] == 'T1':
-            self._images = [path.join(self._input_params['caps_directory'], 'subjects', self._subjects[i],
-                                      self._sessions[i], 't1/spm/dartel/group-' + self._input_params['group_id'],
-                                      'atlas_statistics/', '%s_%s_T1w_space-%s_map-graymatter_statistics.tsv'
-                                      % (self._subjects[i], self._sessions[i], self._input_params['atlas']))
-                            for i in range(len(self._subjects))]
-        else:
+        def build(subjects, sessions):
+            if self._input_params['image_type'] == 'T1':
+                return [path.join(self._input_params['caps_directory'], 'subjects', subjects[i], sessions[i],
+                                  't1/spm/dartel/group-' + self._input_params['group_id'],
+                                  'atlas_statistics/', '%s_%s_T1w_space-%s_map-graymatter_statistics.tsv'
+                                  % (subjects[i], sessions[i], self._input_params['atlas']))
+                        for i in range(len(subjects))]
+
             pvc = '' if self._input_params['pvc'] is None else '_pvc-%s' % self._input_params['pvc']
             suvr = 'pons' if self._input_params['image_type'] == 'fdg' else 'cerebellumPons'
 
-            self._images = [path.join(self._input_params['caps_directory'], 'subjects', self._subjects[i],
-                                      self._sessions[i], 'pet/preprocessing/group-' + self._input_params['group_id'],
-                                      'atlas_statistics', '%s_%s_task-rest_acq-%s_pet_space-%s%s_suvr-%s_statistics.tsv'
-                                      % (self._subjects[i], self._sessions[i], self._input_params['image_type'],
-                                         self._input_params['atlas'], pvc, suvr))
-                            for i in range(len(self._subjects))]
+            return [path.join(self._input_params['caps_directory'], 'subjects', subjects[i], sessions[i],
+                              'pet/preprocessing/group-' + self._input_params['group_id'],
+                              'atlas_statistics', '%s_%s_task-rest_acq-%s_pet_space-%s%s_suvr-%s_statistics.tsv'
+                              % (subjects[i], sessions[i], self._input_params['image_type'],
+                                 self._input_params['atlas'], pvc, suvr))
+                    for i in range(len(subjects))]
 
-        for image in self._images:
-            if not path.exists(image):
-                raise Exception("File %s doesn't exists." % image)
+        images = self.get_cohort_images(build)
+        missing_files = self._cohort.get_missing_files(images)
+        if len(missing_files) > 0:
+            raise Exception("File %s doesn't exists." % missing_files[0])
 
+        self._images = images
         return self._images
 
     def get_x(self):
@@ -284,7 +390,9 @@ class CAPSRegionBasedInput(CAPSInput):
             return self._x
 
         cprint('Loading ' + str(len(self.get_images())) + ' subjects')
-        self._x = rbio.load_data(self._images, self._subjects)
+        # Regional features are stored once in a float32 memory map, reused while the TSV files are unchanged
+        self._x = rbio.load_data_from_feature_store(self._images, n_threads=self._input_params['n_threads'],
+                                                    store_root=self._input_params['feature_store_directory'])
         cprint('Subjects loaded')
 
         return self._x
@@ -322,6 +430,7 @@ class CAPSVertexBasedInput(CAPSInput):
     def __init__(self, input_params):
 
         super().__init__(input_params)
+        self._n_vertices = None
 
     def get_images(self):
         import os
@@ -333,21 +442,18 @@ class CAPSVertexBasedInput(CAPSInput):
             return self._images
 
         if self._input_params['image_type'] == 'fdg' and self._images is None:
-            self._images = []
-            hemi = ['lh', 'rh']
-            for i in range(len(self._subjects)):
-                self._images.append([os.path.join(self._input_params['caps_directory'], 'subjects', self._subjects[i],
-                                                  self._sessions[i], 'pet', 'surface', self._subjects[i] + '_' +
-                                                  self._sessions[i] + '_task-rest_acq-fdg_pet_space-fsaverage_'
-                                                                      'suvr-pons_pvc-iy_hemi-' + h + '_fwhm-' +
-                                                  str(self._input_params['fwhm']) + '_projection.mgh') for h in hemi])
-            missing_files = []
-            missing_files_string_error = ''
-            for img in self._images:
-                for side in img:
-                    if not os.path.exists(side):
-                        missing_files.append(side)
-                        missing_files_string_error += side + '\n'
+            def build(subjects, sessions):
+                hemi = ['lh', 'rh']
+                return [[os.path.join(self._input_params['caps_directory'], 'subjects', subjects[i],
+                                      sessions[i], 'pet', 'surface', subjects[i] + '_' +
+                                      sessions[i] + '_task-rest_acq-fdg_pet_space-fsaverage_'
+                                                    'suvr-pons_pvc-iy_hemi-' + h + '_fwhm-' +
+                                      str(self._input_params['fwhm']) + '_projection.mgh') for h in hemi]
+                        for i in range(len(subjects))]
+
+            self._images = self.get_cohort_images(build)
+            missing_files = self._cohort.get_missing_files(self._images)
+            missing_files_string_error = ''.join(side + '\n' for side in missing_files)
             if len(missing_files) > 0:
                 raise IOError('Could not find the following files : \n' + missing_files_string_error
                               + '\n' + str(len(missing_files)) + ' files missing')
@@ -362,30 +468,25 @@ class CAPSVertexBasedInput(CAPSInput):
             return self._x
 
         cprint('Loading ' + str(len(self.get_images())) + ' subjects')
-        self._x = vtxbio.load_data(self._images)
+        self._x, self._n_vertices = vtxbio.load_data_from_feature_store(
+            self._images, n_threads=self._input_params['n_threads'],
+            store_root=self._input_params['feature_store_directory'])
         cprint(str(len(self._x)) + ' subjects loaded')
         return self._x
 
     def save_weights_as_datasurface(self, weights, output_dir):
-        import numpy as np
-        import nibabel as nib
         import os
 
         if self._images is None:
             self.get_images()
 
-        sample = nib.load(self._images[0][0])
+        # Weights are in the layout of the features: the surfaces of a subject one after the other
+        n_vertices = self._n_vertices
+        if n_vertices is None:
+            n_vertices = vtxbio.get_n_vertices(self._images[0])
 
-        infinite_norm = np.max(np.abs(weights))
-
-        left_hemi_data = np.atleast_3d(np.divide(weights[:np.int(weights.size / 2)], infinite_norm))
-        left_hemi_mgh = nib.MGHImage(left_hemi_data, affine=sample.affine, header=sample.header)
-        nib.save(left_hemi_mgh, os.path.join(output_dir, 'weights_lh.mgh'))
-
-        right_hemi_data = np.atleast_3d(np.divide(weights[np.int(weights.size/2):], infinite_norm))
-        right_hemi_mgh = nib.MGHImage(right_hemi_data, affine=sample.affine, header=sample.header)
-        nib.save(right_hemi_mgh, os.path.join(output_dir, 'weights_rh.mgh'))
-        pass
+        vtxbio.weights_to_surfaces(weights, n_vertices, self._images[0],
+                                   [os.path.join(output_dir, 'weights_' + h + '.mgh') for h in ['lh', 'rh']])
 
     def save_weights_as_nifti(self, weights, output_dir):
         pass
@@ -435,8 +536,9 @@ class CAPSTSVBasedInput(CAPSInput):
         string = str('group-' + self._input_params['group_id'] + '_T1w_space-' + self._input_params['atlas'] +
                      '_map-graymatter')
 
-        self._x = tbio.load_data(string, self._input_params['caps_directory'], self._subjects, self._sessions,
-                                 self._input_params['dataset'])
+        self._x = tbio.load_data_from_feature_store(string, self._input_params['caps_directory'], self._subjects,
+                                                    self._sessions,
+                                                    store_root=self._input_params['feature_store_directory'])
 
         cprint('Subjects loaded')
 
@@ -483,28 +585,30 @@ class CAPSVoxelBasedInputREGSVM(CAPSVoxelBasedInput):
         if self._images is not None:
             return self._images
 
-        if self._input_params['image_type'] == 'T1':
-            fwhm = '' if self._input_params['fwhm'] == 0 else '_fwhm-%dmm' % int(self._input_params['fwhm'])
+        def build(subjects, sessions):
+            if self._input_params['image_type'] == 'T1':
+                fwhm = '' if self._input_params['fwhm'] == 0 else '_fwhm-%dmm' % int(self._input_params['fwhm'])
+
+                return [path.join(self._input_params['caps_directory'],
+                                  'regul_%s_%s_T1w_segm-graymatter_space-Ixi549Space_modulated-%s%s_probability.nii'
+                                  % (subjects[i], sessions[i], self._input_params['modulated'], fwhm))
+                        for i in range(len(subjects))]
 
-            self._images = [path.join(self._input_params['caps_directory'],
-                                      'regul_%s_%s_T1w_segm-graymatter_space-Ixi549Space_modulated-%s%s_probability.nii'
-                                      % (self._subjects[i], self._sessions[i], self._input_params['modulated'], fwhm))
-                            for i in range(len(self._subjects))]
-        else:
             pvc = '' if self._input_params['pvc'] is None else '_pvc-%s' % self._input_params['pvc']
             fwhm = '' if self._input_params['fwhm'] == 0 else '_fwhm-%dmm' % int(self._input_params['fwhm'])
             suvr = 'pons' if self._input_params['image_type'] == 'fdg' else 'cerebellumPons'
-            self._images = [path.join(self._input_params['caps_directory'], 'subjects', self._subjects[i],
-                                      self._sessions[i], 'pet/preprocessing/group-' + self._input_params['group_id'],
-                                      '%s_%s_task-rest_acq-%s_pet_space-Ixi549Space%s_suvr-%s_mask-brain%s_pet.nii.gz'
-                                      % (self._subjects[i], self._sessions[i], self._input_params['image_type'],
-                                         pvc, suvr, fwhm))
-                            for i in range(len(self._subjects))]
-
-        for image in self._images:
-            if not path.exists(image):
-                raise Exception("File %s doesn't exists." % image)
-
+            return [path.join(self._input_params['caps_directory'], 'subjects', subjects[i], sessions[i],
+                              'pet/preprocessing/group-' + self._input_params['group_id'],
+                              '%s_%s_task-rest_acq-%s_pet_space-Ixi549Space%s_suvr-%s_mask-brain%s_pet.nii.gz'
+                              % (subjects[i], sessions[i], self._input_params['image_type'], pvc, suvr, fwhm))
+                    for i in range(len(subjects))]
+
+        images = self.get_cohort_images(build)
+        missing_files = self._cohort.get_missing_files(images)
+        if len(missing_files) > 0:
+            raise Exception("File %s doesn't exists." % missing_files[0])
+
+        self._images = images
         return self._images
 
 
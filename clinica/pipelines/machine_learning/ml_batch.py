@@ -0,0 +1,334 @@
+# coding: utf8
+
+"""
+Batch of machine learning workflows sharing their inputs.
+
+A batch runs a grid of configurations (input, algorithm, validation and
+parameters, e.g. atlas or FWHM) as a dependency graph:
+
+- the input of each distinct set of input parameters is created once, and
+  its features and labels are loaded once (see feature_store.py);
+- the kernel of an input is computed once for all the kernel-based
+  algorithms using it;
+- the splits of each validation scheme are computed once per cohort, so
+  that all the configurations are evaluated on the same subjects;
+- the evaluations (validation of an algorithm on an input) are dispatched
+  as soon as their dependencies are available.
+
+The steps of the graph run in a pool of n_jobs threads, and all the
+evaluations share one executor of n_workers workers (see base.get_executor()),
+so that the number of concurrent folds is bounded whatever the number of
+configurations. Artifacts are released once all the steps using them are
+done. The results of each configuration are saved in its own folder, and
+the mean results of all the configurations in a single table.
+"""
+
+import collections
+import itertools
+import json
+import os
+
+from clinica.utils.stream import cprint
+from clinica.pipelines.machine_learning import base
+
+__author__ = "Jorge Samper-Gonzalez"
+__copyright__ = "Copyright 2016-2019 The Aramis Lab Team"
+__credits__ = ["Jorge Samper-Gonzalez"]
+__license__ = "See LICENSE.txt file"
+__version__ = "0.1.0"
+__maintainer__ = "Jorge Samper-Gonzalez"
+__email__ = "jorge.samper-gonzalez@inria.fr"
+__status__ = "Development"
+
+# Input parameters identifying the cohort (subjects and labels) of an input
+COHORT_KEY_PARAMETERS = ['subjects_visits_tsv', 'diagnoses_tsv', 'data_tsv']
+
+# Validation parameters not changing the splits of a validation
+SPLITS_IGNORED_PARAMETERS = ['n_threads', 'splits_indices']
+
+
+def _get_key(**values):
+    return json.dumps(values, sort_keys=True, default=str)
+
+
+class MLConfiguration(object):
+    """Input, validation and algorithm classes of a workflow, with their parameters."""
+
+    def __init__(self, name, input_class, validation_class, algorithm_class, parameters):
+        self._name = name
+        self._input_class = input_class
+        self._validation_class = validation_class
+        self._algorithm_class = algorithm_class
+        self._parameters = parameters
+
+    @property
+    def name(self): return self._name
+
+    @property
+    def input_class(self): return self._input_class
+
+    @property
+    def validation_class(self): return self._validation_class
+
+    @property
+    def algorithm_class(self): return self._algorithm_class
+
+    @property
+    def parameters(self): return self._parameters
+
+    def create_workflow(self, output_dir):
+        """Return the workflow of the configuration, saving its results in output_dir/<name>."""
+        return base.MLWorkflow(self._input_class, self._validation_class, self._algorithm_class, self._parameters,
+                               os.path.join(output_dir, self._name))
+
+
+class MLBatch(object):
+    """
+    Batch of machine learning workflows sharing their inputs, kernels and splits.
+
+    Example:
+        batch = MLBatch(output_dir, n_workers=16)
+        batch.add_grid([input.CAPSVoxelBasedInput, input.CAPSRegionBasedInput],
+                       [validation.RepeatedHoldOut],
+                       [algorithm.DualSVMAlgorithm, algorithm.LogisticReg],
+                       {'fwhm': [0, 8], 'atlas': ['AAL2', 'AICHA']},
+                       caps_directory=caps_directory, subjects_visits_tsv=subjects_visits_tsv, ...)
+        results = batch.run()
+    """
+
+    def __init__(self, output_dir, n_workers=15, n_jobs=None, executor=None):
+        """
+        Args:
+            output_dir: Folder of the results (one folder per configuration and batch_results.tsv).
+            n_workers: Maximum number of tasks (folds, grid search) run at the same time by all the evaluations.
+            n_jobs: Maximum number of steps (loading of an input, kernel, evaluation) run at the same time
+                (default: n_workers).
+            executor: Backend of the evaluations: 'thread', 'process', 'serial' or an MLExecutor (default:
+                CLINICA_ML_EXECUTOR environment variable or 'thread'). See base.get_executor().
+        """
+        self._output_dir = output_dir
+        self._n_workers = n_workers
+        self._n_jobs = n_workers if n_jobs is None else n_jobs
+        self._executor = executor
+        self._ml_executor = None
+        self._configurations = []
+
+    @property
+    def configurations(self): return self._configurations
+
+    def add(self, input_class, validation_class, algorithm_class, name=None, **parameters):
+        """
+        Add a configuration to the batch.
+
+        Args:
+            input_class: Input class (e.g. input.CAPSVoxelBasedInput).
+            validation_class: Validation class (e.g. validation.RepeatedHoldOut).
+            algorithm_class: Algorithm class (e.g. algorithm.DualSVMAlgorithm).
+            name: Name of the configuration, used as folder of its results (default: names of the classes).
+            parameters: Parameters of the input, validation and algorithm (as for the workflows of
+                ml_workflows.py).
+
+        Returns: the MLConfiguration.
+        """
+        if name is None:
+            name = '%s_%s_%s' % (input_class.__name__, algorithm_class.__name__, validation_class.__name__)
+        if name in [configuration.name for configuration in self._configurations]:
+            raise ValueError('A configuration named %s already exists.' % name)
+        configuration = MLConfiguration(name, input_class, validation_class, algorithm_class, parameters)
+        self._configurations.append(configuration)
+        return configuration
+
+    def add_grid(self, input_classes, validation_classes, algorithm_classes, grid=None, **parameters):
+        """
+        Add the configurations of a grid: all the combinations of classes and of values of the grid parameters.
+
+        A grid parameter only multiplies the configurations of the classes using it: e.g. with
+        {'fwhm': [0, 8], 'atlas': ['AAL2', 'AICHA']}, voxel-based inputs are run for each FWHM and
+        region-based inputs for each atlas.
+
+        Args:
+            input_classes: List of input classes.
+            validation_classes: List of validation classes.
+            algorithm_classes: List of algorithm classes.
+            grid: Dictionary of lists of values of parameters.
+            parameters: Parameters common to all the configurations.
+
+        Returns: the list of the MLConfiguration added.
+        """
+        grid = {} if grid is None else grid
+        configurations = []
+        for input_class, validation_class, algorithm_class in itertools.product(input_classes, validation_classes,
+                                                                                 algorithm_classes):
+            used_parameters = set(input_class.get_default_parameters()) \
+                | set(validation_class.get_default_parameters()) | set(algorithm_class.get_default_parameters())
+            names = sorted(name for name in grid if name in used_parameters)
+            for values in itertools.product(*[grid[name] for name in names]):
+                name = '_'.join([input_class.__name__] + ['%s-%s' % (n, v) for n, v in zip(names, values)]
+                                + [algorithm_class.__name__, validation_class.__name__])
+                configurations.append(self.add(input_class, validation_class, algorithm_class, name,
+                                               **dict(parameters, **dict(zip(names, values)))))
+        return configurations
+
+    def get_graph(self):
+        """
+        Dependency graph of the batch.
+
+        Returns: an ordered dictionary {step key: (function, keys of the steps whose results are its arguments)},
+            each step being after its dependencies.
+        """
+        graph = collections.OrderedDict()
+        cohort_inputs = {}
+
+        for configuration in self._configurations:
+            input_params = base.MLWorkflow.create_parameters_dict(configuration.parameters,
+                                                                  configuration.input_class)
+            validation_params = base.MLWorkflow.create_parameters_dict(configuration.parameters,
+                                                                       configuration.validation_class)
+
+            input_key = ('input', _get_key(input_class=configuration.input_class.__name__, **input_params))
+            if input_key not in graph:
+                graph[input_key] = (self._get_load_function(configuration.input_class, input_params), ())
+
+            dependencies = [input_key]
+            if configuration.algorithm_class.uses_kernel():
+                kernel_key = ('kernel', input_key[1])
+                if kernel_key not in graph:
+                    graph[kernel_key] = (self._compute_kernel, (input_key,))
+                dependencies = [kernel_key]
+
+            # Splits only depend on the labels: they are computed from the first input of the cohort
+            if configuration.validation_class.get_splits_indices is not base.MLValidation.get_splits_indices:
+                cohort_key = _get_key(**{name: input_params.get(name) for name in COHORT_KEY_PARAMETERS})
+                splits_key = ('splits', _get_key(cohort=cohort_key,
+                                                 validation=configuration.validation_class.__name__,
+                                                 **{name: value for name, value in validation_params.items()
+                                                    if name not in SPLITS_IGNORED_PARAMETERS}))
+                if splits_key not in graph:
+                    graph[splits_key] = (self._get_split_function(configuration.validation_class,
+                                                                  validation_params),
+                                         (cohort_inputs.setdefault(cohort_key, input_key),))
+                dependencies.append(splits_key)
+
+            graph[('evaluation', configuration.name)] = (self._get_evaluation_function(configuration),
+                                                         tuple(dependencies))
+        return graph
+
+    @staticmethod
+    def _get_load_function(input_class, input_params):
+        def load():
+            ml_input = input_class(input_params)
+            ml_input.get_x()
+            ml_input.get_y()
+            return ml_input
+        return load
+
+    @staticmethod
+    def _compute_kernel(ml_input):
+        ml_input.get_kernel()
+        return ml_input
+
+    @staticmethod
+    def _get_split_function(validation_class, validation_params):
+        def split(ml_input):
+            return validation_class(None, validation_params).get_splits_indices(ml_input.get_y())
+        return split
+
+    def _get_evaluation_function(self, configuration):
+        def evaluate(ml_input, splits_indices=None):
+            workflow = configuration.create_workflow(self._output_dir)
+            workflow.evaluate(ml_input, self._ml_executor, splits_indices)
+            return os.path.join(self._output_dir, configuration.name)
+        return evaluate
+
+    def run(self):
+        """
+        Run all the configurations of the batch.
+
+        A configuration whose input or evaluation fails does not stop the batch: its error is reported in the
+        results table.
+
+        Returns: the results table (pandas DataFrame, one row per configuration with its name, classes, grid
+            parameters, mean results and error), also saved as output_dir/batch_results.tsv.
+        """
+        from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+        graph = self.get_graph()
+        n_users = collections.Counter(dependency for _, dependencies in graph.values()
+                                      for dependency in dependencies)
+        remaining = collections.OrderedDict(graph)
+        results = {}
+        errors = {}
+        running = {}
+
+        def release(key):
+            # Artifacts (features, kernels, splits) are released once all their users are done
+            for dependency in graph[key][1]:
+                n_users[dependency] -= 1
+                if n_users[dependency] == 0:
+                    results.pop(dependency, None)
+
+        cprint('Running %d configurations (%d steps)' % (len(self._configurations), len(graph)))
+        with base.get_executor(self._executor, self._n_workers) as self._ml_executor, \
+                ThreadPoolExecutor(max_workers=max(1, self._n_jobs)) as pool:
+            while remaining or running:
+                for key, (function, dependencies) in list(remaining.items()):
+                    if any(dependency in remaining or dependency in running.values()
+                           for dependency in dependencies):
+                        continue
+                    del remaining[key]
+                    failed = [dependency for dependency in dependencies if dependency in errors]
+                    if failed:
+                        errors[key] = errors[failed[0]]
+                        release(key)
+                        continue
+                    running[pool.submit(function, *[results[dependency] for dependency in dependencies])] = key
+
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    key = running.pop(future)
+                    try:
+                        results[key] = future.result()
+                    except Exception as e:
+                        errors[key] = e
+                        cprint('%s failed: %s' % (key[1] if key[0] == 'evaluation' else 'Step ' + key[0], e))
+                    release(key)
+        self._ml_executor = None
+
+        return self.save_results(errors)
+
+    def save_results(self, errors=None):
+        """
+        Gather the mean results of the configurations in output_dir/batch_results.tsv.
+
+        Args:
+            errors: Dictionary {('evaluation', configuration name): exception} of the failed configurations.
+
+        Returns: the results table (pandas DataFrame).
+        """
+        import pandas as pd
+
+        errors = {} if errors is None else errors
+        rows = []
+        for configuration in self._configurations:
+            row = collections.OrderedDict([('name', configuration.name),
+                                           ('input', configuration.input_class.__name__),
+                                           ('algorithm', configuration.algorithm_class.__name__),
+                                           ('validation', configuration.validation_class.__name__)])
+            input_params = base.MLWorkflow.create_parameters_dict(configuration.parameters,
+                                                                  configuration.input_class)
+            for name in ['image_type', 'atlas', 'fwhm', 'modulated', 'pvc']:
+                if name in input_params:
+                    row[name] = input_params[name]
+
+            mean_results = os.path.join(self._output_dir, configuration.name, 'mean_results.tsv')
+            if ('evaluation', configuration.name) not in errors and os.path.isfile(mean_results):
+                row.update(pd.io.parsers.read_csv(mean_results, sep='\t').iloc[0].to_dict())
+            error = errors.get(('evaluation', configuration.name))
+            row['error'] = '' if error is None else '%s: %s' % (error.__class__.__name__, error)
+            rows.append(row)
+
+        results = pd.DataFrame(rows)
+        if not os.path.exists(self._output_dir):
+            os.makedirs(self._output_dir)
+        results.to_csv(os.path.join(self._output_dir, 'batch_results.tsv'), index=False, sep='\t', encoding='utf-8')
+        return results
@@ -5,72 +5,294 @@ import numpy as np
 from sklearn.metrics import balanced_accuracy_score, accuracy_score, classification_report
 
 
-def evaluate_prediction(y, y_hat):
+def get_confusion_counts(y, y_hat):
+    """
+    Count the true/false positives/negatives of one or several predictions.
+
+    A sample is positive if its label is 1 and negative otherwise. A positive
+    sample is correctly predicted if its prediction is 1, a negative sample if
+    its prediction is 0.
+
+    Args:
+        y: Labels (n_samples,).
+        y_hat: Predictions (n_samples,) or batch of predictions (n_predictions, n_samples).
+
+    Returns:
+        Counts (tp, tn, fp, fn) as an int array of shape (4,) or (n_predictions, 4).
+    """
+    positive = np.asarray(y) == 1
+    y_hat = np.asarray(y_hat)
+    batch = np.atleast_2d(y_hat)
+
+    correct = np.where(positive, batch == 1, batch == 0)
+    # Code of each prediction: 4 * prediction index + 2 * positive + correct
+    codes = 4 * np.arange(batch.shape[0])[:, None] + 2 * positive + correct
+    fp_tn_fn_tp = np.bincount(codes.ravel(), minlength=4 * batch.shape[0]).reshape(-1, 4)
+    counts = fp_tn_fn_tp[:, [3, 1, 0, 2]]
+
+    return counts if y_hat.ndim > 1 else counts[0]
 
-    true_positive = 0.0
-    true_negative = 0.0
-    false_positive = 0.0
-    false_negative = 0.0
-
-    tp = []
-    tn = []
-    fp = []
-    fn = []
-
-    for i in range(len(y)):
-        if y[i] == 1:
-            if y_hat[i] == 1:
-                true_positive += 1
-                tp.append(i)
-            else:
-                false_negative += 1
-                fn.append(i)
-        else:  # -1
-            if y_hat[i] == 0:
-                true_negative += 1
-                tn.append(i)
-            else:
-                false_positive += 1
-                fp.append(i)
-
-    accuracy = (true_positive + true_negative) / (true_positive + true_negative + false_positive + false_negative)
-
-    if (true_positive + false_negative) != 0:
-        sensitivity = true_positive / (true_positive + false_negative)
-    else:
-        sensitivity = 0.0
-
-    if (false_positive + true_negative) != 0:
-        specificity = true_negative / (false_positive + true_negative)
-    else:
-        specificity = 0.0
-
-    if (true_positive + false_positive) != 0:
-        ppv = true_positive / (true_positive + false_positive)
-    else:
-        ppv = 0.0
-
-    if (true_negative + false_negative) != 0:
-        npv = true_negative / (true_negative + false_negative)
-    else:
-        npv = 0.0
 
+def _safe_divide(numerator, denominator):
+    return np.where(denominator != 0, numerator / np.maximum(denominator, 1), 0.0)
+
+
+def evaluate_predictions(y, y_hats):
+    """
+    Evaluate a batch of predictions of the same samples (e.g. the predictions of each value of a parameter).
+
+    Args:
+        y: Labels (n_samples,).
+        y_hats: Predictions (n_predictions, n_samples).
+
+    Returns:
+        List of dictionaries as returned by evaluate_prediction(), one per prediction.
+    """
+    counts = get_confusion_counts(y, np.atleast_2d(y_hats)).astype(float)
+    tp, tn, fp, fn = counts.T
+
+    accuracy = _safe_divide(tp + tn, counts.sum(axis=1))
+    sensitivity = _safe_divide(tp, tp + fn)
+    specificity = _safe_divide(tn, fp + tn)
+    ppv = _safe_divide(tp, tp + fp)
+    npv = _safe_divide(tn, tn + fn)
     balanced_accuracy = (sensitivity + specificity) / 2
 
-    results = {'accuracy': accuracy,
-               'balanced_accuracy': balanced_accuracy,
-               'sensitivity': sensitivity,
-               'specificity': specificity,
-               'ppv': ppv,
-               'npv': npv,
-               'confusion_matrix': {'tp': len(tp), 'tn': len(tn), 'fp': len(fp), 'fn': len(fn)}
-               }
+    return [{'accuracy': float(accuracy[i]),
+             'balanced_accuracy': float(balanced_accuracy[i]),
+             'sensitivity': float(sensitivity[i]),
+             'specificity': float(specificity[i]),
+             'ppv': float(ppv[i]),
+             'npv': float(npv[i]),
+             'confusion_matrix': {'tp': int(tp[i]), 'tn': int(tn[i]), 'fp': int(fp[i]), 'fn': int(fn[i])}
+             }
+            for i in range(len(counts))]
+
+
+def evaluate_prediction(y, y_hat):
+    """
+    Evaluate the predictions of a binary classifier.
+
+    Args:
+        y: Labels (n_samples,), 1 for the positive class.
+        y_hat: Predictions (n_samples,).
+
+    Returns:
+        Dictionary with accuracy, balanced_accuracy, sensitivity, specificity,
+        ppv, npv (0 if undefined) and confusion_matrix (tp, tn, fp and fn counts).
+    """
+    return evaluate_predictions(y, [y_hat])[0]
+
+
+def _read_column_blocks(data, max_block_memory, reduction_size):
+    """
+    Yield the blocks of columns of `data` (2d-arrays), the next block being read while the current one is processed.
+
+    A block has at most `max_block_memory` bytes and, for float32 data, at most `reduction_size` columns.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    n_samples, n_features = data.shape
+    dtype = np.float32 if data.dtype == np.float32 else np.float64
+    n_columns = max(1, min(n_features, max_block_memory // max(1, n_samples * np.dtype(dtype).itemsize)))
+    if dtype == np.float32:
+        n_columns = min(n_columns, reduction_size)
+    column_starts = range(0, n_features, n_columns)
+
+    def read_block(start):
+        return np.ascontiguousarray(data[:, start:start + n_columns], dtype=dtype)
+
+    with ThreadPoolExecutor(max_workers=1) as reader:
+        next_block = reader.submit(read_block, column_starts[0]) if n_features > 0 else None
+        for k in range(len(column_starts)):
+            block = next_block.result()
+            if k + 1 < len(column_starts):
+                next_block = reader.submit(read_block, column_starts[k + 1])
+            yield block
 
-    return results
 
+def gram_matrix_linear(data, n_threads=1, block_size=256, max_block_memory=2 ** 28, reduction_size=2 ** 16):
+    """
+    Compute the linear kernel (Gram matrix) of the samples tile by tile.
+
+    The features are read by blocks of columns, so `data` can be a memory map
+    (e.g. a feature store) that does not fit in memory. Within a block of
+    columns, the tiles of the upper triangle of the Gram matrix are computed
+    in a thread pool in the precision of `data` (float32 for feature stores)
+    and summed in a float64 Gram matrix: float32 sums never run over more than
+    `reduction_size` features. The lower triangle is filled by symmetry. The
+    next block of columns is read while the current one is processed.
+
+    Args:
+        data: 2d-array or memory map (n_samples, n_features).
+        n_threads: Number of threads computing the tiles.
+        block_size: Number of samples (rows) of a tile.
+        max_block_memory: Maximum size in bytes of a block of columns loaded in memory.
+        reduction_size: Maximum number of features of a block of columns of float32 data.
+
+    Returns:
+        Gram matrix (n_samples, n_samples) as a float64 2d-array.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    n_samples = data.shape[0]
+    row_starts = range(0, n_samples, block_size)
+    tiles = [(i, j) for i in row_starts for j in row_starts if j >= i]
+    kernel = np.zeros((n_samples, n_samples), dtype=np.float64)
+
+    def add_tile(block, i, j):
+        # Tiles are disjoint: no lock is needed
+        kernel[i:i + block_size, j:j + block_size] += np.dot(block[i:i + block_size],
+                                                             block[j:j + block_size].T)
+
+    with ThreadPoolExecutor(max_workers=max(1, n_threads)) as pool:
+        for block in _read_column_blocks(data, max_block_memory, reduction_size):
+            for future in [pool.submit(add_tile, block, i, j) for i, j in tiles]:
+                future.result()
+
+    for i, j in tiles:
+        tile = kernel[i:i + block_size, j:j + block_size]
+        if i == j:
+            tile[...] = np.triu(tile) + np.triu(tile, 1).T
+        else:
+            kernel[j:j + block_size, i:i + block_size] = tile.T
+    return kernel
+
+
+def gram_matrix_linear_rows(data, rows, n_threads=1, block_size=256, max_block_memory=2 ** 28,
+                            reduction_size=2 ** 16):
+    """
+    Compute the rows of the linear kernel (Gram matrix) of some samples against all the samples.
+
+    This is used to add samples to an existing kernel in O(n_rows x n_samples)
+    instead of O(n_samples^2). The features are read and the products are
+    accumulated as in gram_matrix_linear().
+
+    Args:
+        data: 2d-array or memory map (n_samples, n_features).
+        rows: Indices of the samples whose rows are computed.
+        n_threads: Number of threads computing the tiles.
+        block_size: Number of samples (columns of the result) of a tile.
+        max_block_memory: Maximum size in bytes of a block of columns loaded in memory.
+        reduction_size: Maximum number of features of a block of columns of float32 data.
+
+    Returns:
+        Rows of the Gram matrix (len(rows), n_samples) as a float64 2d-array.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    rows = np.asarray(rows, dtype=int)
+    n_samples = data.shape[0]
+    kernel_rows = np.zeros((len(rows), n_samples), dtype=np.float64)
+
+    def add_tile(block, j):
+        kernel_rows[:, j:j + block_size] += np.dot(block[rows], block[j:j + block_size].T)
+
+    with ThreadPoolExecutor(max_workers=max(1, n_threads)) as pool:
+        for block in _read_column_blocks(data, max_block_memory, reduction_size):
+            for future in [pool.submit(add_tile, block, j) for j in range(0, n_samples, block_size)]:
+                future.result()
+
+    return kernel_rows
+
+
+def get_kernel_slice(kernel, rows, columns):
+    """
+    Return the sub-matrix kernel[rows, :][:, columns] of a kernel.
+
+    The sub-matrix is copied once from the kernel (which can be a memory map),
+    without the intermediate copy of the rows made by chained indexing. It is
+    a C-contiguous float64 array, the layout expected by libsvm, so that SVC
+    fits and predictions use it without copying it again. It is read-only so
+    that it can be shared by concurrent tasks (e.g. the fits of all the C
+    values of a grid search).
+
+    Args:
+        kernel: Kernel (n_samples, n_samples).
+        rows: Indices of the rows.
+        columns: Indices of the columns.
+
+    Returns:
+        Read-only 2d-array (len(rows), len(columns)).
+    """
+    block = np.ascontiguousarray(np.asarray(kernel)[np.ix_(rows, columns)], dtype=np.float64)
+    block.flags.writeable = False
+    return block
+
+
+def get_feature_rows(x, rows, dtype=np.float32):
+    """
+    Return the rows of a feature matrix as a C-contiguous array.
+
+    Only the given rows are read from `x` (which can be a memory map, e.g. a
+    feature store), and they are copied once, in the dtype used by the tree
+    ensembles (float32), so that the estimators use them without copying them
+    again.
 
-def gram_matrix_linear(data):
-    return np.dot(data, data.transpose())
+    Args:
+        x: Features (n_samples, n_features), 2d-array or memory map.
+        rows: Indices of the rows.
+        dtype: Type of the returned array.
+
+    Returns:
+        2d-array (len(rows), n_features).
+    """
+    return np.ascontiguousarray(x[np.asarray(rows)], dtype=dtype)
+
+
+def get_row_batches(x, rows, max_block_memory=2 ** 28):
+    """
+    Split rows of a feature matrix in batches of at most `max_block_memory` bytes of float32 features.
+
+    Args:
+        x: Features (n_samples, n_features), 2d-array or memory map.
+        rows: Indices of the rows.
+        max_block_memory: Maximum size in bytes of the features of a batch.
+
+    Returns:
+        List of arrays of indices of rows.
+    """
+    rows = np.asarray(rows)
+    batch_size = max(1, int(max_block_memory // (4 * max(1, x.shape[1]))))
+    return [rows[start:start + batch_size] for start in range(0, len(rows), batch_size)]
+
+
+def get_svm_weights(dual_coefficients, sv_indices, x, max_block_memory=2 ** 28):
+    """
+    Compute the weights of linear kernel SVMs in the feature space (dual_coefficients x features of the support vectors).
+
+    The product is computed by blocks of features: only the rows of the
+    support vectors are read, and at most `max_block_memory` bytes of them at
+    a time, so that `x` can be a memory map (e.g. a feature store) that does
+    not fit in memory. If it fits, the product is computed in a single block.
+
+    Args:
+        dual_coefficients: Dual coefficients (n_classifiers, n_support_vectors) or (n_support_vectors,).
+        sv_indices: Indices of the support vectors in `x`.
+        x: Features (n_samples, n_features), 2d-array or memory map.
+        max_block_memory: Maximum size in bytes of a block of features of the support vectors.
+
+    Returns:
+        Weights as a float64 array (n_classifiers, n_features), or (n_features,) if dual_coefficients is 1-D.
+    """
+    dual_coefficients = np.asarray(dual_coefficients, dtype=np.float64)
+    coefficients = np.atleast_2d(dual_coefficients)
+    sv_indices = np.asarray(sv_indices, dtype=int)
+    if coefficients.shape[1] != len(sv_indices):
+        raise ValueError('The number of support vectors indices and the number of coefficients must be the same.')
+
+    # Rows are read in increasing order (sequential reads of a memory map)
+    order = np.argsort(sv_indices, kind='stable')
+    sv_indices, coefficients = sv_indices[order], coefficients[:, order]
+
+    n_features = x.shape[1]
+    n_columns = max(1, min(n_features, max_block_memory // max(1, len(sv_indices) * 8)))
+    weights = np.zeros((coefficients.shape[0], n_features), dtype=np.float64)
+    for start in range(0, n_features, n_columns):
+        block = np.asarray(x[sv_indices, start:start + n_columns], dtype=np.float64)
+        weights[:, start:start + n_columns] = np.dot(coefficients, block)
+
+    return weights if dual_coefficients.ndim > 1 else weights[0]
 
 
 def evaluate_prediction_multiclass(y, y_hat):
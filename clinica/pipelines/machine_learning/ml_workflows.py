@@ -21,7 +21,8 @@ class VoxelBasedKFoldDualSVM(base.MLWorkflow):
 
     def __init__(self, caps_directory, subjects_visits_tsv, diagnoses_tsv, group_id, image_type, output_dir, fwhm=0,
                  modulated="on", pvc=None, precomputed_kernel=None, mask_zeros=True, n_threads=15, n_folds=10,
-                 grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17), splits_indices=None):
+                 grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17), splits_indices=None,
+                 feature_store_directory=None, kernel_cache_directory=None, incremental_kernel=True):
 
         super(VoxelBasedKFoldDualSVM, self).__init__(input.CAPSVoxelBasedInput,
                                                      validation.KFoldCV,
@@ -34,7 +35,9 @@ class VoxelBasedRepKFoldDualSVM(base.MLWorkflow):
 
     def __init__(self, caps_directory, subjects_visits_tsv, diagnoses_tsv, group_id, image_type, output_dir, fwhm=0,
                  modulated="on", pvc=None, precomputed_kernel=None, mask_zeros=True, n_threads=15, n_iterations=100,
-                 n_folds=10, grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17), splits_indices=None):
+                 n_folds=10, grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17), splits_indices=None,
+                 feature_store_directory=None, kernel_cache_directory=None, incremental_kernel=True,
+                 export_fold_tsv=False):
 
         super(VoxelBasedRepKFoldDualSVM, self).__init__(input.CAPSVoxelBasedInput,
                                                         validation.RepeatedKFoldCV,
@@ -48,7 +51,8 @@ class VoxelBasedRepHoldOutDualSVM(base.MLWorkflow):
     def __init__(self, caps_directory, subjects_visits_tsv, diagnoses_tsv, group_id, image_type, output_dir, fwhm=0,
                  modulated="on", pvc=None, precomputed_kernel=None, mask_zeros=True, n_threads=15, n_iterations=100,
                  test_size=0.3, grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17),
-                 splits_indices=None):
+                 splits_indices=None, feature_store_directory=None, kernel_cache_directory=None,
+                 incremental_kernel=True, export_fold_tsv=False):
 
         super().__init__(input.CAPSVoxelBasedInput,
                          validation.RepeatedHoldOut,
@@ -61,7 +65,8 @@ class VertexBasedRepHoldOutDualSVM(base.MLWorkflow):
 
     def __init__(self, caps_directory, subjects_visits_tsv, diagnoses_tsv, group_id, output_dir, image_type='fdg', fwhm=20,
                  precomputed_kernel=None, n_threads=15, n_iterations=100, test_size=0.3, grid_search_folds=10,
-                 balanced=True, c_range=np.logspace(-10, 2, 1000), splits_indices=None):
+                 balanced=True, c_range=np.logspace(-10, 2, 1000), splits_indices=None, feature_store_directory=None,
+                 kernel_cache_directory=None, incremental_kernel=True, export_fold_tsv=False):
 
         super(VertexBasedRepHoldOutDualSVM, self).__init__(input.CAPSVertexBasedInput,
                                                            validation.RepeatedHoldOut,
@@ -74,7 +79,9 @@ class RegionBasedRepHoldOutDualSVM(base.MLWorkflow):
 
     def __init__(self, caps_directory, subjects_visits_tsv, diagnoses_tsv, group_id, image_type,  atlas,
                  output_dir, pvc=None, n_threads=15, n_iterations=100, test_size=0.3,
-                 grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17), splits_indices=None):
+                 grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17), splits_indices=None,
+                 feature_store_directory=None, kernel_cache_directory=None, incremental_kernel=True,
+                 export_fold_tsv=False):
 
         super(RegionBasedRepHoldOutDualSVM, self).__init__(input.CAPSRegionBasedInput,
                                                            validation.RepeatedHoldOut,
@@ -87,7 +94,8 @@ class RegionBasedRepHoldOutLogisticRegression(base.MLWorkflow):
 
     def __init__(self, caps_directory, subjects_visits_tsv, diagnoses_tsv, group_id, image_type, atlas,
                  output_dir, pvc=None, n_threads=15, n_iterations=100, test_size=0.3,
-                 grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17), splits_indices=None):
+                 grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17), splits_indices=None,
+                 feature_store_directory=None, regularization_path=True, export_fold_tsv=False):
 
         super(RegionBasedRepHoldOutLogisticRegression, self).__init__(input.CAPSRegionBasedInput,
                                                                       validation.RepeatedHoldOut,
@@ -102,7 +110,8 @@ class RegionBasedRepHoldOutRandomForest(base.MLWorkflow):
                  output_dir, pvc=None, n_threads=15, n_iterations=100, test_size=0.3,
                  grid_search_folds=10, balanced=True, n_estimators_range=(100, 200, 400),
                  max_depth_range=[None], min_samples_split_range=[2],
-                 max_features_range=('auto', 0.25, 0.5), splits_indices=None):
+                 max_features_range=('auto', 0.25, 0.5), splits_indices=None, feature_store_directory=None,
+                 export_fold_tsv=False):
 
         super(RegionBasedRepHoldOutRandomForest, self).__init__(input.CAPSRegionBasedInput,
                                                                 validation.RepeatedHoldOut,
@@ -115,7 +124,8 @@ class RegionBasedLearningCurveRepHoldOutDualSVM(base.MLWorkflow):
 
     def __init__(self, caps_directory, subjects_visits_tsv, diagnoses_tsv, group_id, image_type,  atlas,
                  output_dir, pvc=None, precomputed_kernel=None, n_threads=15, n_iterations=100, test_size=0.3,
-                 n_learning_points=10, grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17)):
+                 n_learning_points=10, grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17),
+                 feature_store_directory=None, kernel_cache_directory=None, incremental_kernel=True):
 
         super(RegionBasedLearningCurveRepHoldOutDualSVM, self).__init__(input.CAPSRegionBasedInput,
                                                                         validation.LearningCurveRepeatedHoldOut,
@@ -129,7 +139,8 @@ class VoxelBasedLearningCurveRepHoldOutDualSVM(base.MLWorkflow):
     def __init__(self, caps_directory, subjects_visits_tsv, diagnoses_tsv, group_id, image_type, output_dir, fwhm=0,
                  modulated="on", pvc=None, precomputed_kernel=None, mask_zeros=True, n_threads=15, n_iterations=100,
                  test_size=0.3, n_learning_points=10, grid_search_folds=10, balanced=True,
-                 c_range=np.logspace(-6, 2, 17)):
+                 c_range=np.logspace(-6, 2, 17), feature_store_directory=None, kernel_cache_directory=None,
+                 incremental_kernel=True):
 
         super(VoxelBasedLearningCurveRepHoldOutDualSVM, self).__init__(input.CAPSVoxelBasedInput,
                                                                        validation.LearningCurveRepeatedHoldOut,
@@ -142,7 +153,9 @@ class RegionBasedRepKFoldDualSVM(base.MLWorkflow):
 
     def __init__(self, caps_directory, subjects_visits_tsv, diagnoses_tsv, group_id, image_type,  atlas,
                  output_dir, pvc=None, n_threads=15, n_iterations=100, test_size=0.3, n_folds=10,
-                 grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17), splits_indices=None):
+                 grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17), splits_indices=None,
+                 feature_store_directory=None, kernel_cache_directory=None, incremental_kernel=True,
+                 export_fold_tsv=False):
 
         super(RegionBasedRepKFoldDualSVM, self).__init__(input.CAPSRegionBasedInput,
                                                          validation.RepeatedKFoldCV,
@@ -155,7 +168,9 @@ class CAPSTsvRepHoldOutDualSVM(base.MLWorkflow):
 
     def __init__(self, caps_directory, subjects_visits_tsv, diagnoses_tsv, group_id, image_type,  atlas, dataset,
                  output_dir, pvc=None, n_threads=15, n_iterations=100, test_size=0.3,
-                 grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17), splits_indices=None):
+                 grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17), splits_indices=None,
+                 feature_store_directory=None, kernel_cache_directory=None, incremental_kernel=True,
+                 export_fold_tsv=False):
 
         super(CAPSTsvRepHoldOutDualSVM, self).__init__(input.CAPSTSVBasedInput,
                                                        validation.RepeatedHoldOut,
@@ -169,7 +184,8 @@ class CAPSTsvRepHoldOutRandomForest(base.MLWorkflow):
                  output_dir, pvc=None, n_threads=15, n_iterations=100, test_size=0.3,
                  grid_search_folds=10, balanced=True, n_estimators_range=(100, 200, 400),
                  max_depth_range=[None], min_samples_split_range=[2],
-                 max_features_range=('auto', 0.25, 0.5), splits_indices=None):
+                 max_features_range=('auto', 0.25, 0.5), splits_indices=None, feature_store_directory=None,
+                 export_fold_tsv=False):
 
         super(CAPSTsvRepHoldOutRandomForest, self).__init__(input.CAPSTSVBasedInput,
                                                             validation.RepeatedHoldOut,
@@ -186,7 +202,8 @@ class VoxelBasedREGRepKFoldDualSVM(base.MLWorkflow):
                  modulated="on", pvc=None, precomputed_kernel=None, mask_zeros=True, n_threads=15, n_iterations=100,
                  n_folds=10,
                  test_size=0.1, grid_search_folds=10, balanced=True, c_range=np.logspace(-6, 2, 17),
-                 splits_indices=None):
+                 splits_indices=None, feature_store_directory=None, kernel_cache_directory=None,
+                 incremental_kernel=True, export_fold_tsv=False):
 
         super(VoxelBasedREGRepKFoldDualSVM, self).__init__(input.CAPSTSVBasedInput,
                                                            validation.RepeatedKFoldCV,
@@ -202,7 +219,7 @@ class TsvRepHoldOutRandomForest(base.MLWorkflow):
     def __init__(self, data_tsv, columns, output_dir, n_threads=20, n_iterations=250, test_size=0.2,
                  grid_search_folds=10, balanced=True, n_estimators_range=(100, 200, 400), max_depth_range=[None],
                  min_samples_split_range=[2], max_features_range=('auto', 0.25, 0.5), splits_indices=None,
-                 inner_cv=False):
+                 inner_cv=False, export_fold_tsv=False):
 
         super(TsvRepHoldOutRandomForest, self).__init__(input.TsvInput,
                                                         validation.RepeatedHoldOut,
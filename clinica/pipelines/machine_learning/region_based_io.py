@@ -69,47 +69,102 @@ def get_caps_pet_list(input_directory, subjects_visits_tsv, group_id, atlas_id):
     return image_list
 
 
-def load_data(image_list, subjects):
+def _read_regional_features(tsv_file):
+    """Return the mean_scalar column (one value per region) of an atlas statistics TSV file."""
+    return pd.io.parsers.read_csv(tsv_file, sep='\t', usecols=['mean_scalar']).mean_scalar.values
+
+
+def _read_regional_features_into(image_list, data, n_threads=1):
+    """Read the regional features of a list of TSV files into the rows of a preallocated matrix.
+
+    The files are read by a pool of n_threads threads, each of them writing the
+    features of a file directly in its row of `data`.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def read(i):
+        features = _read_regional_features(image_list[i])
+        if len(features) != data.shape[1]:
+            raise ValueError('File %s has %d regions instead of %d.' % (image_list[i], len(features), data.shape[1]))
+        data[i, :] = features
+
+    with ThreadPoolExecutor(max_workers=max(1, n_threads)) as pool:
+        list(pool.map(read, range(len(image_list))))
+
+
+def load_data(image_list, subjects, n_threads=1):
     """
+    Load the regional features (mean_scalar column) of atlas statistics TSV files.
 
     Args:
-        image_list:
-        subjects:
+        image_list: List of TSV files (same atlas).
+        subjects: List of subjects (one per file).
+        n_threads: Number of files read at the same time.
 
     Returns:
-
+        np 2D array (n_subjects, n_regions).
     """
 
-    subj_average = []
-    all_vector = np.array([])
-    read_file = pd.io.parsers.read_csv(image_list[0], sep='\t', usecols=[2], header=0)
-    read_file = read_file.mean_scalar
-    data = np.zeros((len(subjects), len(read_file)))
-
-    for i in range(len(image_list)):
-        tsv_file = pd.io.parsers.read_csv(image_list[i], sep='\t', usecols=[2], header=0)
-        subj_average = tsv_file.mean_scalar
-        all_vector = np.append(all_vector, subj_average)
-    data_temp = np.split(all_vector, len(image_list))
-
-    for i in range(len(image_list)):
-        for j in range(len(subj_average)):
-            data[i][j] = data_temp[i][j]
+    if len(image_list) != len(subjects):
+        raise ValueError('The number of files and the number of subjects must be the same.')
+
+    n_regions = len(_read_regional_features(image_list[0]))
+    data = np.zeros((len(image_list), n_regions))
+    _read_regional_features_into(image_list, data, n_threads)
     return data
 
 
-def features_weights(image_list, dual_coefficients, sv_indices, scaler=None):
+def load_data_from_feature_store(image_list, n_threads=1, store_root=None):
     """
+    Load the regional features of TSV files in a float32 feature store (see feature_store.py), reused while the
+    files are unchanged.
+
+    The files are read once, in parallel, into a memory map on disk.
 
     Args:
-        image_list:
-        dual_coefficients:
-        sv_indices:
-        scaler:
+        image_list: List of TSV files (same atlas).
+        n_threads: Number of files read at the same time.
+        store_root: Folder containing the feature stores (default: Clinica cache directory).
 
     Returns:
+        Read-only float32 memory map (n_subjects, n_regions).
+    """
+    import os
+    from clinica.pipelines.machine_learning.feature_store import get_feature_store
 
+    def build(directory):
+        n_regions = len(_read_regional_features(image_list[0]))
+        data = np.lib.format.open_memmap(os.path.join(directory, 'data.npy'), mode='w+', dtype=np.float32,
+                                         shape=(len(image_list), n_regions))
+        _read_regional_features_into(image_list, data, n_threads)
+        data.flush()
+        del data
+        return {'type': 'region', 'n_samples': len(image_list), 'n_features': n_regions,
+                'images': list(image_list)}
+
+    store = get_feature_store(image_list, build, store_root, type='region', column='mean_scalar')
+    return store.get_data()
+
+
+def features_weights(image_list, dual_coefficients, sv_indices, scaler=None, features=None):
     """
+    Compute the regional weights of a linear SVM from the features of its support vectors.
+
+    The weights are computed as a single product of the dual coefficients and
+    the features of the support vectors.
+
+    Args:
+        image_list: List of the TSV files of the subjects.
+        dual_coefficients: Dual coefficients of the support vectors.
+        sv_indices: Indices of the support vectors in image_list.
+        scaler: Not used.
+        features: Features of the subjects (n_subjects, n_regions), e.g. from load_data(). If not given,
+            only the TSV files of the support vectors are read.
+
+    Returns:
+        Weights (n_regions,).
+    """
+    from clinica.pipelines.machine_learning.ml_utils import get_svm_weights
 
     if len(sv_indices) != len(dual_coefficients):
         print("Length dual coefficients: " + str(len(dual_coefficients)))
@@ -119,17 +174,11 @@ def features_weights(image_list, dual_coefficients, sv_indices, scaler=None):
     if len(image_list) == 0:
         raise ValueError('The number of images must be greater than 0.')
 
-    sv_images = [image_list[i] for i in sv_indices]
-
-    shape = pd.io.parsers.read_csv(sv_images[0], sep='\t', usecols=[2], header=0)
-    weights = np.zeros(len(shape))
-
-    for i in range(len(sv_images)):
-        subj = pd.io.parsers.read_csv(sv_images[i], sep='\t', usecols=[2], header=0)
-        subj_data = subj.mean_scalar
-        weights += dual_coefficients[i] * subj_data
+    if features is None:
+        sv_images = [image_list[i] for i in sv_indices]
+        features, sv_indices = load_data(sv_images, sv_images), np.arange(len(sv_images))
 
-    return weights
+    return get_svm_weights(np.asarray(dual_coefficients).ravel(), sv_indices, features)
 
 
 def weights_to_nifti(weights, atlas, output_filename):
@@ -0,0 +1,143 @@
+# coding: utf8
+
+"""
+Columnar storage of the results of the folds of a validation.
+
+The results of all the folds (metrics, and labels and predictions of the
+test and train subjects) are gathered in preallocated arrays and written in a
+single .npz file: one column per array, the subjects of all the folds being
+concatenated and identified by the index of their fold (record). The summary
+of the validation is written in TSV files by the validations, and the former
+per-fold TSV files can still be exported from the arrays.
+"""
+
+import numpy as np
+
+__author__ = "Jorge Samper-Gonzalez"
+__copyright__ = "Copyright 2016-2019 The Aramis Lab Team"
+__credits__ = ["Jorge Samper-Gonzalez"]
+__license__ = "See LICENSE.txt file"
+__version__ = "0.1.0"
+__maintainer__ = "Jorge Samper-Gonzalez"
+__email__ = "jorge.samper-gonzalez@inria.fr"
+__status__ = "Development"
+
+# Columns of the results of a fold (in the order of the results TSV files)
+METRICS = ['balanced_accuracy', 'auc', 'accuracy', 'sensitivity', 'specificity', 'ppv', 'npv',
+           'train_balanced_accuracy', 'train_accuracy', 'train_sensitivity', 'train_specificity', 'train_ppv',
+           'train_npv']
+
+
+def get_fold_metrics(result):
+    """Return the metrics of the result of a fold (see algorithm evaluate()) in the order of METRICS."""
+    evaluation, evaluation_train = result['evaluation'], result['evaluation_train']
+    return [evaluation['balanced_accuracy'], result['auc'], evaluation['accuracy'], evaluation['sensitivity'],
+            evaluation['specificity'], evaluation['ppv'], evaluation['npv'], evaluation_train['balanced_accuracy'],
+            evaluation_train['accuracy'], evaluation_train['sensitivity'], evaluation_train['specificity'],
+            evaluation_train['ppv'], evaluation_train['npv']]
+
+
+def _get_subjects(arrays, prefix):
+    import pandas as pd
+
+    record = arrays[prefix + '_record']
+    return pd.DataFrame({'record': record,
+                         'iteration': arrays['iteration'][record],
+                         'fold': arrays['fold'][record],
+                         'y': arrays[prefix + '_y'],
+                         'y_hat': arrays[prefix + '_y_hat'],
+                         'subject_index': arrays[prefix + '_subject_index']})
+
+
+class ResultsSink(object):
+    """
+    Results of the folds of a validation, stored in preallocated columnar arrays.
+
+    Each fold is a record identified by its iteration and fold numbers. The
+    test subjects (y, y_hat, y_index of the results) of all the records are
+    concatenated in the test_* arrays, test_record giving the record of each
+    of them; the train subjects (y_train, y_hat_train, x_index) are stored in
+    the same way in the train_* arrays if `train` is True.
+    """
+
+    def __init__(self, results, iterations, folds, train=False):
+        """
+        Args:
+            results: List of the results of the folds (dictionaries returned by the evaluate() methods of the
+                algorithms).
+            iterations: Iteration of each result.
+            folds: Fold of each result.
+            train: If True, the predictions of the train subjects are also stored.
+        """
+        n_records = len(results)
+        self._arrays = {'metric_names': np.array(METRICS),
+                        'iteration': np.array(iterations, dtype=np.int32),
+                        'fold': np.array(folds, dtype=np.int32),
+                        'metrics': np.full((n_records, len(METRICS)), np.nan)}
+
+        subjects = [('test', 'y', 'y_hat', 'y_index')]
+        if train:
+            subjects.append(('train', 'y_train', 'y_hat_train', 'x_index'))
+
+        for prefix, y_key, y_hat_key, index_key in subjects:
+            sizes = np.array([len(result[y_key]) for result in results], dtype=np.int64)
+            offsets = np.concatenate([[0], np.cumsum(sizes)])
+            first = results[0] if n_records > 0 else {y_key: [], y_hat_key: []}
+            arrays = {'record': np.repeat(np.arange(n_records, dtype=np.int32), sizes),
+                      'y': np.empty(offsets[-1], dtype=np.asarray(first[y_key]).dtype),
+                      'y_hat': np.empty(offsets[-1], dtype=np.asarray(first[y_hat_key]).dtype),
+                      'subject_index': np.empty(offsets[-1], dtype=np.int64)}
+            for i, result in enumerate(results):
+                arrays['y'][offsets[i]:offsets[i + 1]] = result[y_key]
+                arrays['y_hat'][offsets[i]:offsets[i + 1]] = result[y_hat_key]
+                arrays['subject_index'][offsets[i]:offsets[i + 1]] = result[index_key]
+            self._arrays.update({'%s_%s' % (prefix, name): array for name, array in arrays.items()})
+
+        for i, result in enumerate(results):
+            self._arrays['metrics'][i, :] = get_fold_metrics(result)
+
+    @property
+    def arrays(self): return self._arrays
+
+    @property
+    def n_records(self): return len(self._arrays['iteration'])
+
+    def get_results(self):
+        """Return the metrics of the records as a DataFrame (columns METRICS)."""
+        import pandas as pd
+
+        return pd.DataFrame(self._arrays['metrics'], columns=METRICS)
+
+    def get_subjects(self, prefix='test'):
+        """Return the subjects of the records ('test' or 'train') as a DataFrame (record, iteration, fold, y,
+        y_hat, subject_index)."""
+        return _get_subjects(self._arrays, prefix)
+
+    def save(self, filename):
+        """Save the arrays in a .npz file (see load_results())."""
+        np.savez(filename, **self._arrays)
+
+
+def load_results(filename):
+    """
+    Load the results saved by ResultsSink.save().
+
+    Args:
+        filename: .npz file (e.g. results.npz in the output folder of a validation).
+
+    Returns: a dictionary of DataFrames: 'results' (iteration, fold and metrics of each record), 'test_subjects'
+        and, if saved, 'train_subjects' (record, iteration, fold, y, y_hat and subject_index of each subject).
+    """
+    import pandas as pd
+
+    with np.load(filename) as npz:
+        arrays = {name: npz[name] for name in npz.files}
+
+    results = pd.DataFrame(arrays['metrics'], columns=[str(name) for name in arrays['metric_names']])
+    results.insert(0, 'fold', arrays['fold'])
+    results.insert(0, 'iteration', arrays['iteration'])
+    loaded = {'results': results}
+    for prefix in ['test', 'train']:
+        if prefix + '_record' in arrays:
+            loaded[prefix + '_subjects'] = _get_subjects(arrays, prefix)
+    return loaded
@@ -15,39 +15,81 @@ __email__ = "simona.bottani@icm-institute.com"
 __status__ = "Development"
 
 
+def _read_features(images, tsv_file, subjects, sessions):
+    """Read the columns containing `images` of the rows of the given participants/sessions of a merged TSV file.
+
+    The file is read once, keeping only the participant_id, session_id and
+    selected columns, and indexed on participant (and session if the file has
+    a session_id column), so that all the rows are selected at once.
+
+    Returns:
+        Tuple (DataFrame (n_subjects, n_features) in the order of `subjects`, list of the selected columns).
+    """
+    df = pd.io.parsers.read_csv(tsv_file, sep='\t',
+                                usecols=lambda col: col in ['participant_id', 'session_id'] or images in col)
+    columns = [col for col in df.columns if images in col and col not in ['participant_id', 'session_id']]
+    if len(columns) == 0:
+        raise ValueError('No column of %s contains %s.' % (tsv_file, images))
+
+    if 'session_id' in df.columns:
+        df = df.set_index(['participant_id', 'session_id'])
+        rows = pd.MultiIndex.from_arrays([list(subjects), list(sessions)])
+    else:
+        df = df.set_index('participant_id')
+        rows = pd.Index(list(subjects))
+    if not df.index.is_unique:
+        raise ValueError('Several rows of %s have the same participant and session.' % tsv_file)
+
+    missing = rows[~rows.isin(df.index)]
+    if len(missing) > 0:
+        raise ValueError('%d participants/sessions not found in %s: %s'
+                         % (len(missing), tsv_file, ', '.join(str(row) for row in missing[:10])))
+
+    return df.loc[rows, columns], columns
+
+
 def load_data(images, caps_directory, subjects, sessions, dataset):
     """
 
     Args:
-        images:
-        caps_directory:
-        subjects_visits_tsv:
-        dataset:
+        images: Part of the name of the columns of the features (e.g. group-<group_id>_T1w_space-<atlas>_map-graymatter).
+        caps_directory: Merged TSV file containing the features.
+        subjects: List of participants.
+        sessions: List of sessions (one per participant).
+        dataset: Not used.
 
     Returns:
         np 2D array
 
     """
 
-    df = pd.io.parsers.read_csv(os.path.join(caps_directory), sep='\t')
-
-    all_vector = np.array([])
+    features, _ = _read_features(images, caps_directory, subjects, sessions)
+    return np.array(features.values, dtype=np.float64)
 
-    participant_id = subjects
 
-    session_id = sessions
-
-    for i in range(len(participant_id)):
-        df_sub = df[df.participant_id == participant_id[i]]
+def load_data_from_feature_store(images, tsv_file, subjects, sessions, store_root=None):
+    """
+    Load the features of a merged TSV file in a float32 feature store (see feature_store.py), reused while the file,
+    columns and participants/sessions are unchanged.
 
-        df_analysis = df_sub[[col for col in df_sub.columns if images in col]]
+    Args:
+        images: Part of the name of the columns of the features.
+        tsv_file: Merged TSV file containing the features.
+        subjects: List of participants.
+        sessions: List of sessions (one per participant).
+        store_root: Folder containing the feature stores (default: Clinica cache directory).
 
-        all_vector = np.append(all_vector, df_analysis.values)
-    data = np.zeros((len(participant_id), df_analysis.shape[1]))
-    data_temp = np.split(all_vector, len(participant_id))
+    Returns:
+        Read-only float32 memory map (n_subjects, n_features).
+    """
+    from clinica.pipelines.machine_learning.feature_store import get_feature_store
 
-    for i in range(len(participant_id)):
-        for j in range(df_analysis.shape[1]):
-            data[i][j] = data_temp[i][j]
+    def build(directory):
+        features, columns = _read_features(images, tsv_file, subjects, sessions)
+        np.save(os.path.join(directory, 'data.npy'), np.ascontiguousarray(features.values, dtype=np.float32))
+        return {'type': 'tsv', 'n_samples': features.shape[0], 'n_features': features.shape[1],
+                'columns': columns}
 
-    return data
+    store = get_feature_store([tsv_file], build, store_root, type='tsv', columns=images, subjects=list(subjects),
+                              sessions=list(sessions))
+    return store.get_data()
@@ -5,9 +5,9 @@ from os import path
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import StratifiedKFold, StratifiedShuffleSplit
-from multiprocessing.pool import ThreadPool
 
 from clinica.pipelines.machine_learning import base
+from clinica.pipelines.machine_learning.results_sink import METRICS, ResultsSink
 
 __author__ = "Jorge Samper-Gonzalez"
 __copyright__ = "Copyright 2016-2019 The Aramis Lab Team"
@@ -21,25 +21,28 @@ __status__ = "Development"
 
 class KFoldCV(base.MLValidation):
 
-    def validate(self, y):
+    def get_splits_indices(self, y):
 
         if self._validation_params['splits_indices'] is None:
             skf = StratifiedKFold(n_splits=self._validation_params['n_folds'], shuffle=True)
             self._validation_params['splits_indices'] = list(skf.split(np.zeros(len(y)), y))
 
-        async_pool = ThreadPool(self._validation_params['n_threads'])
-        async_result = {}
+        return self._validation_params['splits_indices']
+
+    def validate(self, y):
 
-        for i in range(self._validation_params['n_folds']):
+        self.get_splits_indices(y)
 
-            train_index, test_index = self._validation_params['splits_indices'][i]
-            async_result[i] = async_pool.apply_async(self._ml_algorithm.evaluate, (train_index, test_index))
+        with self.executor_scope() as async_pool:
+            async_result = {}
 
-        async_pool.close()
-        async_pool.join()
+            for i in range(self._validation_params['n_folds']):
 
-        for i in range(self._validation_params['n_folds']):
-            self._validation_results.append(async_result[i].get())
+                train_index, test_index = self._validation_params['splits_indices'][i]
+                async_result[i] = async_pool.apply_async(self._ml_algorithm.evaluate, (train_index, test_index))
+
+            for i in range(self._validation_params['n_folds']):
+                self._validation_results.append(async_result[i].get())
 
         self._classifier, self._best_params = self._ml_algorithm.apply_best_parameters(self._validation_results)
 
@@ -114,7 +117,7 @@ class KFoldCV(base.MLValidation):
 
 class RepeatedKFoldCV(base.MLValidation):
 
-    def validate(self, y):
+    def get_splits_indices(self, y):
 
         if self._validation_params['splits_indices'] is None:
             self._validation_params['splits_indices'] = []
@@ -123,29 +126,28 @@ class RepeatedKFoldCV(base.MLValidation):
                 skf = StratifiedKFold(n_splits=self._validation_params['n_folds'], shuffle=True)
                 self._validation_params['splits_indices'].append(list(skf.split(np.zeros(len(y)), y)))
 
-        async_pool = ThreadPool(self._validation_params['n_threads'])
-        async_result = {}
+        return self._validation_params['splits_indices']
 
-        for i in range(self._validation_params['n_iterations']):
+    def validate(self, y):
 
-            train_index, test_index = self._validation_params['splits_indices'][i]
-            async_result[i] = async_pool.apply_async(self._ml_algorithm.evaluate, (train_index, test_index))
+        self.get_splits_indices(y)
 
-        for r in range(self._validation_params['n_iterations']):
+        with self.executor_scope() as async_pool:
+            async_result = {}
 
-            async_result[r] = {}
-            self._validation_results.append([])
+            for r in range(self._validation_params['n_iterations']):
 
-            for i in range(self._validation_params['n_folds']):
+                async_result[r] = {}
+                self._validation_results.append([])
 
-                train_index, test_index = self._validation_params['splits_indices'][r][i]
-                async_result[r][i] = async_pool.apply_async(self._ml_algorithm.evaluate, (train_index, test_index))
+                for i in range(self._validation_params['n_folds']):
 
-        async_pool.close()
-        async_pool.join()
-        for r in range(self._validation_params['n_iterations']):
-            for i in range(self._validation_params['n_folds']):
-                self._validation_results[r].append(async_result[r][i].get())
+                    train_index, test_index = self._validation_params['splits_indices'][r][i]
+                    async_result[r][i] = async_pool.apply_async(self._ml_algorithm.evaluate, (train_index, test_index))
+
+            for r in range(self._validation_params['n_iterations']):
+                for i in range(self._validation_params['n_folds']):
+                    self._validation_results[r].append(async_result[r][i].get())
 
         # TODO Find a better way to estimate best parameter
         flat_results = [result for fold in self._validation_results for result in fold]
@@ -157,55 +159,76 @@ class RepeatedKFoldCV(base.MLValidation):
         if self._validation_results is None:
             raise Exception("No results to save. Method validate() must be run before save_results().")
 
-        all_results_list = []
-        all_subjects_list = []
+        if not path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        # Results of all the folds in one columnar file
+        records = [(iteration, i, result) for iteration, iteration_results in enumerate(self._validation_results)
+                   for i, result in enumerate(iteration_results)]
+        sink = ResultsSink([record[2] for record in records], [record[0] for record in records],
+                           [record[1] for record in records])
+        sink.save(path.join(output_dir, 'results.npz'))
+
+        # Summary: mean results of each iteration and of all the iterations
+        # (computed per metric, as the means of the former per-iteration results)
+        metrics = sink.arrays['metrics']
+        iterations = sink.arrays['iteration']
+        all_results_df = pd.DataFrame([[np.nanmean(column) for column in metrics[iterations == iteration].T]
+                                       for iteration in np.unique(iterations)], columns=METRICS)
+        all_results_df.to_csv(path.join(output_dir, 'results.tsv'),
+                              index=False, sep='\t', encoding='utf-8')
 
-        for iteration in range(len(self._validation_results)):
+        mean_results_df = pd.DataFrame(all_results_df.apply(np.nanmean).to_dict(),
+                                       columns=all_results_df.columns, index=[0, ])
+        mean_results_df.to_csv(path.join(output_dir, 'mean_results.tsv'),
+                               index=False, sep='\t', encoding='utf-8')
 
-            iteration_dir = path.join(output_dir, 'iteration-' + str(iteration))
-            if not path.exists(iteration_dir):
-                os.makedirs(iteration_dir)
+        if self._validation_params['export_fold_tsv']:
+            self.export_fold_tsv(sink, output_dir)
 
-            iteration_subjects_list = []
-            iteration_results_list = []
-            folds_dir = path.join(iteration_dir, 'folds')
+        print("Mean results of the classification:")
+        print("Balanced accuracy: %s" % (mean_results_df['balanced_accuracy'].to_string(index=False)))
+        print("specificity: %s" % (mean_results_df['specificity'].to_string(index=False)))
+        print("sensitivity: %s" % (mean_results_df['sensitivity'].to_string(index=False)))
+        print("auc: %s" % (mean_results_df['auc'].to_string(index=False)))
 
+    @staticmethod
+    def export_fold_tsv(sink, output_dir):
+        """
+        Write the results of each iteration and fold in TSV files (iteration-<i>/ folders and subjects.tsv).
+
+        Args:
+            sink: ResultsSink of the validation.
+            output_dir: Output folder of the validation.
+
+        """
+        columns = ['y', 'y_hat', 'y_index']
+        subjects_df = sink.get_subjects('test').rename(columns={'subject_index': 'y_index'})
+        subjects_df[columns].to_csv(path.join(output_dir, 'subjects.tsv'), index=False, sep='\t', encoding='utf-8')
+        record_subjects = dict(list(subjects_df.groupby('record')))
+        results_df = sink.get_results()
+        iterations = sink.arrays['iteration']
+        folds = sink.arrays['fold']
+
+        for iteration in np.unique(iterations):
+            iteration_dir = path.join(output_dir, 'iteration-' + str(iteration))
+            folds_dir = path.join(iteration_dir, 'folds')
             if not path.exists(folds_dir):
                 os.makedirs(folds_dir)
 
-            for i in range(len(self._validation_results[iteration])):
-                subjects_df = pd.DataFrame({'y': self._validation_results[iteration][i]['y'],
-                                            'y_hat': self._validation_results[iteration][i]['y_hat'],
-                                            'y_index': self._validation_results[iteration][i]['y_index']})
-                subjects_df.to_csv(path.join(folds_dir, 'subjects_fold-' + str(i) + '.tsv'),
-                                   index=False, sep='\t', encoding='utf-8')
-                iteration_subjects_list.append(subjects_df)
-
-                results_df = pd.DataFrame(
-                    {'balanced_accuracy': self._validation_results[iteration][i]['evaluation']['balanced_accuracy'],
-                     'auc': self._validation_results[iteration][i]['auc'],
-                     'accuracy': self._validation_results[iteration][i]['evaluation']['accuracy'],
-                     'sensitivity': self._validation_results[iteration][i]['evaluation']['sensitivity'],
-                     'specificity': self._validation_results[iteration][i]['evaluation']['specificity'],
-                     'ppv': self._validation_results[iteration][i]['evaluation']['ppv'],
-                     'npv': self._validation_results[iteration][i]['evaluation']['npv'],
-                     'train_balanced_accuracy': self._validation_results[iteration][i]['evaluation_train']['balanced_accuracy'],
-                     'train_accuracy': self._validation_results[iteration][i]['evaluation_train']['accuracy'],
-                     'train_sensitivity': self._validation_results[iteration][i]['evaluation_train']['sensitivity'],
-                     'train_specificity': self._validation_results[iteration][i]['evaluation_train']['specificity'],
-                     'train_ppv': self._validation_results[iteration][i]['evaluation_train']['ppv'],
-                     'train_npv': self._validation_results[iteration][i]['evaluation_train']['npv']
-                     }, index=['i', ])
-                results_df.to_csv(path.join(folds_dir, 'results_fold-' + str(i) + '.tsv'),
-                                  index=False, sep='\t', encoding='utf-8')
-                iteration_results_list.append(results_df)
+            iteration_records = np.flatnonzero(iterations == iteration)
+            for record in iteration_records:
+                record_subjects[record][columns].to_csv(
+                    path.join(folds_dir, 'subjects_fold-' + str(folds[record]) + '.tsv'),
+                    index=False, sep='\t', encoding='utf-8')
+                results_df.iloc[[record]].to_csv(path.join(folds_dir, 'results_fold-' + str(folds[record]) + '.tsv'),
+                                                 index=False, sep='\t', encoding='utf-8')
 
-            iteration_subjects_df = pd.concat(iteration_subjects_list)
-            iteration_subjects_df.to_csv(path.join(iteration_dir, 'subjects.tsv'),
-                                         index=False, sep='\t', encoding='utf-8')
-            all_subjects_list.append(iteration_subjects_df)
+            iteration_subjects_df = pd.concat([record_subjects[record] for record in iteration_records])
+            iteration_subjects_df[columns].to_csv(path.join(iteration_dir, 'subjects.tsv'),
+                                                  index=False, sep='\t', encoding='utf-8')
 
-            iteration_results_df = pd.concat(iteration_results_list)
+            iteration_results_df = results_df.iloc[iteration_records]
             iteration_results_df.to_csv(path.join(iteration_dir, 'results.tsv'),
                                         index=False, sep='\t', encoding='utf-8')
 
@@ -213,26 +236,6 @@ class RepeatedKFoldCV(base.MLValidation):
                                            columns=iteration_results_df.columns, index=[0, ])
             mean_results_df.to_csv(path.join(iteration_dir, 'mean_results.tsv'),
                                    index=False, sep='\t', encoding='utf-8')
-            all_results_list.append(mean_results_df)
-
-        all_subjects_df = pd.concat(all_subjects_list)
-        all_subjects_df.to_csv(path.join(output_dir, 'subjects.tsv'),
-                               index=False, sep='\t', encoding='utf-8')
-
-        all_results_df = pd.concat(all_results_list)
-        all_results_df.to_csv(path.join(output_dir, 'results.tsv'),
-                              index=False, sep='\t', encoding='utf-8')
-
-        mean_results_df = pd.DataFrame(all_results_df.apply(np.nanmean).to_dict(),
-                                       columns=all_results_df.columns, index=[0, ])
-        mean_results_df.to_csv(path.join(output_dir, 'mean_results.tsv'),
-                               index=False, sep='\t', encoding='utf-8')
-
-        print("Mean results of the classification:")
-        print("Balanced accuracy: %s" % (mean_results_df['balanced_accuracy'].to_string(index=False)))
-        print("specificity: %s" % (mean_results_df['specificity'].to_string(index=False)))
-        print("sensitivity: %s" % (mean_results_df['sensitivity'].to_string(index=False)))
-        print("auc: %s" % (mean_results_df['auc'].to_string(index=False)))
 
     @staticmethod
     def get_default_parameters():
@@ -241,36 +244,41 @@ class RepeatedKFoldCV(base.MLValidation):
                            'n_folds': 10,
                            'n_threads': 15,
                            'splits_indices': None,
-                           'inner_cv': True}
+                           'inner_cv': True,
+                           'export_fold_tsv': False}
 
         return parameters_dict
 
 
 class RepeatedHoldOut(base.MLValidation):
 
-    def validate(self, y):
+    def get_splits_indices(self, y):
 
         if self._validation_params['splits_indices'] is None:
             splits = StratifiedShuffleSplit(n_splits=self._validation_params['n_iterations'],
                                             test_size=self._validation_params['test_size'])
             self._validation_params['splits_indices'] = list(splits.split(np.zeros(len(y)), y))
 
-        async_pool = ThreadPool(self._validation_params['n_threads'])
-        async_result = {}
+        return self._validation_params['splits_indices']
 
-        for i in range(self._validation_params['n_iterations']):
+    def validate(self, y):
 
-            train_index, test_index = self._validation_params['splits_indices'][i]
-            if self._validation_params['inner_cv']:
-                async_result[i] = async_pool.apply_async(self._ml_algorithm.evaluate, (train_index, test_index))
-            else:
-                async_result[i] = async_pool.apply_async(self._ml_algorithm.evaluate_no_cv, (train_index, test_index))
+        self.get_splits_indices(y)
+
+        with self.executor_scope() as async_pool:
+            async_result = {}
 
-        async_pool.close()
-        async_pool.join()
+            for i in range(self._validation_params['n_iterations']):
 
-        for i in range(self._validation_params['n_iterations']):
-            self._validation_results.append(async_result[i].get())
+                train_index, test_index = self._validation_params['splits_indices'][i]
+                if self._validation_params['inner_cv']:
+                    async_result[i] = async_pool.apply_async(self._ml_algorithm.evaluate, (train_index, test_index))
+                else:
+                    async_result[i] = async_pool.apply_async(self._ml_algorithm.evaluate_no_cv,
+                                                             (train_index, test_index))
+
+            for i in range(self._validation_params['n_iterations']):
+                self._validation_results.append(async_result[i].get())
 
         self._classifier, self._best_params = self._ml_algorithm.apply_best_parameters(self._validation_results)
         return self._classifier, self._best_params, self._validation_results
@@ -279,64 +287,17 @@ class RepeatedHoldOut(base.MLValidation):
         if self._validation_results is None:
             raise Exception("No results to save. Method validate() must be run before save_results().")
 
-        all_results_list = []
-        all_train_subjects_list = []
-        all_test_subjects_list = []
+        if not path.exists(output_dir):
+            os.makedirs(output_dir)
 
-        for iteration in range(len(self._validation_results)):
+        # Results of all the iterations (metrics, test and train subjects) in one columnar file
+        n_iterations = len(self._validation_results)
+        sink = ResultsSink(self._validation_results, range(n_iterations), np.zeros(n_iterations, dtype=int),
+                           train=True)
+        sink.save(path.join(output_dir, 'results.npz'))
 
-            iteration_dir = path.join(output_dir, 'iteration-' + str(iteration))
-            if not path.exists(iteration_dir):
-                os.makedirs(iteration_dir)
-            iteration_train_subjects_df = pd.DataFrame({'iteration': iteration,
-                                                        'y': self._validation_results[iteration]['y_train'],
-                                                        'y_hat': self._validation_results[iteration]['y_hat_train'],
-                                                        'subject_index': self._validation_results[iteration]['x_index']})
-            iteration_train_subjects_df.to_csv(path.join(iteration_dir, 'train_subjects.tsv'),
-                                               index=False, sep='\t', encoding='utf-8')
-            all_train_subjects_list.append(iteration_train_subjects_df)
-
-            iteration_test_subjects_df = pd.DataFrame({'iteration': iteration,
-                                                       'y': self._validation_results[iteration]['y'],
-                                                       'y_hat': self._validation_results[iteration]['y_hat'],
-                                                       'subject_index': self._validation_results[iteration]['y_index']})
-            iteration_test_subjects_df.to_csv(path.join(iteration_dir, 'test_subjects.tsv'),
-                                              index=False, sep='\t', encoding='utf-8')
-            all_test_subjects_list.append(iteration_test_subjects_df)
-
-            iteration_results_df = pd.DataFrame(
-                    {'balanced_accuracy': self._validation_results[iteration]['evaluation']['balanced_accuracy'],
-                     'auc': self._validation_results[iteration]['auc'],
-                     'accuracy': self._validation_results[iteration]['evaluation']['accuracy'],
-                     'sensitivity': self._validation_results[iteration]['evaluation']['sensitivity'],
-                     'specificity': self._validation_results[iteration]['evaluation']['specificity'],
-                     'ppv': self._validation_results[iteration]['evaluation']['ppv'],
-                     'npv': self._validation_results[iteration]['evaluation']['npv'],
-                     'train_balanced_accuracy': self._validation_results[iteration]['evaluation_train']['balanced_accuracy'],
-                     'train_accuracy': self._validation_results[iteration]['evaluation_train']['accuracy'],
-                     'train_sensitivity': self._validation_results[iteration]['evaluation_train']['sensitivity'],
-                     'train_specificity': self._validation_results[iteration]['evaluation_train']['specificity'],
-                     'train_ppv': self._validation_results[iteration]['evaluation_train']['ppv'],
-                     'train_npv': self._validation_results[iteration]['evaluation_train']['npv']
-                     }, index=['i', ])
-            iteration_results_df.to_csv(path.join(iteration_dir, 'results.tsv'),
-                                        index=False, sep='\t', encoding='utf-8')
-
-            # mean_results_df = pd.DataFrame(iteration_results_df.apply(np.nanmean).to_dict(),
-            #                                columns=iteration_results_df.columns, index=[0, ])
-            # mean_results_df.to_csv(path.join(iteration_dir, 'mean_results.tsv'),
-            #                        index=False, sep='\t', encoding='utf-8')
-            all_results_list.append(iteration_results_df)
-
-        all_train_subjects_df = pd.concat(all_train_subjects_list)
-        all_train_subjects_df.to_csv(path.join(output_dir, 'train_subjects.tsv'),
-                                     index=False, sep='\t', encoding='utf-8')
-
-        all_test_subjects_df = pd.concat(all_test_subjects_list)
-        all_test_subjects_df.to_csv(path.join(output_dir, 'test_subjects.tsv'),
-                                    index=False, sep='\t', encoding='utf-8')
-
-        all_results_df = pd.concat(all_results_list)
+        # Summary: results of each iteration and mean results
+        all_results_df = sink.get_results()
         all_results_df.to_csv(path.join(output_dir, 'results.tsv'),
                               index=False, sep='\t', encoding='utf-8')
 
@@ -345,12 +306,48 @@ class RepeatedHoldOut(base.MLValidation):
         mean_results_df.to_csv(path.join(output_dir, 'mean_results.tsv'),
                                index=False, sep='\t', encoding='utf-8')
 
+        if self._validation_params['export_fold_tsv']:
+            self.export_fold_tsv(sink, output_dir)
+
         print("Mean results of the classification:")
         print("Balanced accuracy: %s" % (mean_results_df['balanced_accuracy'].to_string(index=False)))
         print("specificity: %s" % (mean_results_df['specificity'].to_string(index=False)))
         print("sensitivity: %s" % (mean_results_df['sensitivity'].to_string(index=False)))
         print("auc: %s" % (mean_results_df['auc'].to_string(index=False)))
 
+    @staticmethod
+    def export_fold_tsv(sink, output_dir):
+        """
+        Write the results of each iteration in TSV files (iteration-<i>/ folders, train_subjects.tsv and
+        test_subjects.tsv).
+
+        Args:
+            sink: ResultsSink of the validation.
+            output_dir: Output folder of the validation.
+
+        """
+        columns = ['iteration', 'y', 'y_hat', 'subject_index']
+        train_subjects_df = sink.get_subjects('train')
+        test_subjects_df = sink.get_subjects('test')
+        train_subjects_df[columns].to_csv(path.join(output_dir, 'train_subjects.tsv'),
+                                          index=False, sep='\t', encoding='utf-8')
+        test_subjects_df[columns].to_csv(path.join(output_dir, 'test_subjects.tsv'),
+                                         index=False, sep='\t', encoding='utf-8')
+        train_record_subjects = dict(list(train_subjects_df.groupby('record')))
+        test_record_subjects = dict(list(test_subjects_df.groupby('record')))
+        results_df = sink.get_results()
+
+        for iteration in range(sink.n_records):
+            iteration_dir = path.join(output_dir, 'iteration-' + str(iteration))
+            if not path.exists(iteration_dir):
+                os.makedirs(iteration_dir)
+            train_record_subjects[iteration][columns].to_csv(path.join(iteration_dir, 'train_subjects.tsv'),
+                                                             index=False, sep='\t', encoding='utf-8')
+            test_record_subjects[iteration][columns].to_csv(path.join(iteration_dir, 'test_subjects.tsv'),
+                                                            index=False, sep='\t', encoding='utf-8')
+            results_df.iloc[[iteration]].to_csv(path.join(iteration_dir, 'results.tsv'),
+                                                index=False, sep='\t', encoding='utf-8')
+
     @staticmethod
     def get_default_parameters():
 
@@ -358,45 +355,49 @@ class RepeatedHoldOut(base.MLValidation):
                            'test_size': 0.2,
                            'n_threads': 15,
                            'splits_indices': None,
-                           'inner_cv': True}
+                           'inner_cv': True,
+                           'export_fold_tsv': False}
 
         return parameters_dict
 
 
 class LearningCurveRepeatedHoldOut(base.MLValidation):
 
-    def validate(self, y):
+    def get_splits_indices(self, y):
 
         if self._validation_params['splits_indices'] is None:
             splits = StratifiedShuffleSplit(n_splits=self._validation_params['n_iterations'],
                                             test_size=self._validation_params['test_size'])
             self._validation_params['splits_indices'] = list(splits.split(np.zeros(len(y)), y))
 
-        async_pool = ThreadPool(self._validation_params['n_threads'])
-        async_result = {}
+        return self._validation_params['splits_indices']
 
-        for i in range(self._validation_params['n_iterations']):
-            train_index, test_index = self._validation_params['splits_indices'][i]
-            async_result[i] = {}
+    def validate(self, y):
 
-            skf = StratifiedKFold(n_splits=self._validation_params['n_learning_points'], shuffle=False)
-            inner_cv_splits = list(skf.split(np.zeros(len(y[train_index])), y[train_index]))
+        self.get_splits_indices(y)
 
-            for j in range(self._validation_params['n_learning_points']):
-                inner_train_index = np.concatenate([indexes[1] for indexes in
-                                                    inner_cv_splits[:j + 1]]).ravel()
-                async_result[i][j] = async_pool.apply_async(self._ml_algorithm.evaluate,
-                                                            (train_index[inner_train_index], test_index))
+        with self.executor_scope() as async_pool:
+            async_result = {}
 
-        async_pool.close()
-        async_pool.join()
-
-        for j in range(self._validation_params['n_learning_points']):
-            learning_point_results = []
             for i in range(self._validation_params['n_iterations']):
-                learning_point_results.append(async_result[i][j].get())
+                train_index, test_index = self._validation_params['splits_indices'][i]
+                async_result[i] = {}
+
+                skf = StratifiedKFold(n_splits=self._validation_params['n_learning_points'], shuffle=False)
+                inner_cv_splits = list(skf.split(np.zeros(len(y[train_index])), y[train_index]))
+
+                for j in range(self._validation_params['n_learning_points']):
+                    inner_train_index = np.concatenate([indexes[1] for indexes in
+                                                        inner_cv_splits[:j + 1]]).ravel()
+                    async_result[i][j] = async_pool.apply_async(self._ml_algorithm.evaluate,
+                                                                (train_index[inner_train_index], test_index))
+
+            for j in range(self._validation_params['n_learning_points']):
+                learning_point_results = []
+                for i in range(self._validation_params['n_iterations']):
+                    learning_point_results.append(async_result[i][j].get())
 
-            self._validation_results.append(learning_point_results)
+                self._validation_results.append(learning_point_results)
 
         self._classifier = []
         self._best_params = []
@@ -488,29 +489,28 @@ class RepeatedKFoldCV_Multiclass(base.MLValidation):
         self._classifier = None
         self._best_params = None
         self._cv = None
+        self._executor = None
 
     def validate(self, y, n_iterations=100, n_folds=10, n_threads=15):
 
-        async_pool = ThreadPool(self._validation_params['n_threads'])
-        async_result = {}
-        self._cv = []
+        with self.executor_scope(n_threads) as async_pool:
+            async_result = {}
+            self._cv = []
 
-        for r in range(n_iterations):
-            skf = StratifiedKFold(n_splits=n_folds, shuffle=True)
-            self._cv.append(list(skf.split(np.zeros(len(y)), y)))
-            async_result[r] = {}
-            self._repeated_validation_results.append([])
+            for r in range(n_iterations):
+                skf = StratifiedKFold(n_splits=n_folds, shuffle=True)
+                self._cv.append(list(skf.split(np.zeros(len(y)), y)))
+                async_result[r] = {}
+                self._repeated_validation_results.append([])
 
-            for i in range(n_folds):
+                for i in range(n_folds):
 
-                train_index, test_index = self._cv[r][i]
-                async_result[r][i] = async_pool.apply_async(self._ml_algorithm.evaluate, (train_index, test_index))
+                    train_index, test_index = self._cv[r][i]
+                    async_result[r][i] = async_pool.apply_async(self._ml_algorithm.evaluate, (train_index, test_index))
 
-        async_pool.close()
-        async_pool.join()
-        for r in range(n_iterations):
-            for i in range(n_folds):
-                self._repeated_validation_results[r].append(async_result[r][i].get())
+            for r in range(n_iterations):
+                for i in range(n_folds):
+                    self._repeated_validation_results[r].append(async_result[r][i].get())
 
         # TODO Find a better way to estimate best parameter
         flat_results = [result for fold in self._repeated_validation_results for result in fold]
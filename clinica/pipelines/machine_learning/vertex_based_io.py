@@ -15,31 +15,114 @@ __email__ = "arnaud.marcoux@inria.fr"
 __status__ = "Development"
 
 
-def load_data(mgh_list):
+def get_n_vertices(mgh_files):
+    """Return the number of vertices of each surface of a subject (e.g. [lh, rh])."""
+    return [int(np.prod(nib.load(f).header.get_data_shape())) for f in mgh_files]
+
+
+def _read_surfaces_into(mgh_list, data, n_vertices, n_threads=1):
+    """Read the surfaces of a list of subjects into the rows of a preallocated matrix.
+
+    The subjects are read by a pool of n_threads threads, each of them writing
+    the surfaces of a subject directly in its row of `data`, one after the
+    other (n_vertices[h] columns for the h-th surface).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    offsets = np.concatenate(([0], np.cumsum(n_vertices)))
+
+    def read(s):
+        if len(mgh_list[s]) != len(n_vertices):
+            raise ValueError('Subject %d has %d surfaces instead of %d.' % (s, len(mgh_list[s]), len(n_vertices)))
+        for h, mgh_file in enumerate(mgh_list[s]):
+            surface = np.asanyarray(nib.load(mgh_file).dataobj)
+            if surface.size != n_vertices[h]:
+                raise ValueError('File %s has %d vertices instead of %d.' % (mgh_file, surface.size, n_vertices[h]))
+            data[s, offsets[h]:offsets[h + 1]] = surface.ravel(order='F')
+
+    with ThreadPoolExecutor(max_workers=max(1, n_threads)) as pool:
+        list(pool.map(read, range(len(mgh_list))))
+
+
+def load_data(mgh_list, n_threads=1):
     """
 
     Args: mgh_list : list of mgh files. Each element contains as many paths as
     needed (each element must be associated to a single subject). Surfaces must
     have the same number of vertices accross subjects.
+    n_threads : number of subjects read at the same time.
 
     Returns: data : matrix of raw data
 
     """
-    import nibabel as nib
-    import numpy as np
 
     # Construct 0-matrix with the good size, based on the size of the surfaces
     # provided by the first subject
-    N_vertex = []  # array containing the surface size of the different surfaces of a subject
-    sample = mgh_list[0]
-    for i in range(len(sample)):
-        N_vertex.append(np.max(nib.load(sample[i]).header.get_data_shape()))
-    data = np.zeros((len(mgh_list), np.sum(N_vertex)))
+    n_vertices = get_n_vertices(mgh_list[0])
+    data = np.zeros((len(mgh_list), np.sum(n_vertices)))
 
     # Fill data matrix
-    N_cumul = np.concatenate(([0], np.cumsum(N_vertex)))
-    for s in range(len(mgh_list)):
-        for h in range(len(mgh_list[s])):
-            current_data = np.squeeze(nib.load(mgh_list[s][h]).get_data())
-            data[s, N_cumul[h]: N_cumul[h+1]] = current_data
+    _read_surfaces_into(mgh_list, data, n_vertices, n_threads)
     return data
+
+
+def load_data_from_feature_store(mgh_list, n_threads=1, store_root=None):
+    """
+    Load the surfaces of the subjects in a float32 feature store (see feature_store.py), reused while the mgh files
+    are unchanged.
+
+    The files are read once, in parallel, into a memory map on disk: each row
+    holds the surfaces of a subject one after the other.
+
+    Args:
+        mgh_list: List of mgh files, each element containing the surfaces of a subject (e.g. [lh, rh]).
+        n_threads: Number of subjects read at the same time.
+        store_root: Folder containing the feature stores (default: Clinica cache directory).
+
+    Returns:
+        Tuple (read-only float32 memory map (n_subjects, n_vertices), number of vertices of each surface).
+    """
+    import os
+    from clinica.pipelines.machine_learning.feature_store import get_feature_store
+
+    def build(directory):
+        n_vertices = get_n_vertices(mgh_list[0])
+        data = np.lib.format.open_memmap(os.path.join(directory, 'data.npy'), mode='w+', dtype=np.float32,
+                                         shape=(len(mgh_list), int(np.sum(n_vertices))))
+        _read_surfaces_into(mgh_list, data, n_vertices, n_threads)
+        data.flush()
+        del data
+        return {'type': 'vertex', 'n_samples': len(mgh_list), 'n_features': int(np.sum(n_vertices)),
+                'n_vertices': n_vertices, 'images': [list(mgh_files) for mgh_files in mgh_list]}
+
+    store = get_feature_store([f for mgh_files in mgh_list for f in mgh_files], build, store_root, type='vertex',
+                              n_surfaces=[len(mgh_files) for mgh_files in mgh_list])
+    return store.get_data(), store.header['n_vertices']
+
+
+def weights_to_surfaces(weights, n_vertices, mgh_files, output_files):
+    """
+    Write weights in the layout of the features (surfaces one after the other) as mgh surfaces.
+
+    The weights are normalised by their maximum absolute value. Each surface is
+    written with the affine, header and shape of the corresponding surface of
+    a subject.
+
+    Args:
+        weights: Weights (sum(n_vertices),).
+        n_vertices: Number of vertices of each surface.
+        mgh_files: mgh files of the surfaces of a subject, used as templates.
+        output_files: Output mgh files, one per surface.
+    """
+    weights = np.asarray(weights).ravel()
+    if weights.size != np.sum(n_vertices):
+        raise ValueError('The weights have %d elements instead of %d.' % (weights.size, np.sum(n_vertices)))
+
+    infinite_norm = np.max(np.abs(weights))
+    offsets = np.concatenate(([0], np.cumsum(n_vertices)))
+    for h, (mgh_file, output_file) in enumerate(zip(mgh_files, output_files)):
+        sample = nib.load(mgh_file)
+        surface = np.divide(weights[offsets[h]:offsets[h + 1]], infinite_norm).astype(np.float32)
+        surface_mgh = nib.MGHImage(surface.reshape(sample.shape, order='F'), affine=sample.affine,
+                                   header=sample.header)
+        nib.save(surface_mgh, output_file)
@@ -84,6 +84,63 @@ def load_data(image_list, mask=True):
     return data, shape, data_mask
 
 
+def load_data_from_feature_store(image_list, mask=True, store_root=None):
+    """
+    Load the images in a float32 feature store (see feature_store.py), reused while the images and mask are unchanged.
+
+    The images are written in a memory map on disk. If `mask` is True, the
+    voxels that are zero for all the images are found by a first pass over the
+    images, and only the other voxels are written in the store.
+
+    Args:
+        image_list: List of NIfTI images (same shape).
+        mask: If True, the voxels that are zero in all images are removed.
+        store_root: Folder containing the feature stores (default: Clinica cache directory).
+
+    Returns:
+        Tuple (read-only float32 memory map (n_images, n_features), shape of
+        the images, mask (flattened boolean array, None if `mask` is False)).
+    """
+    import os
+    from clinica.pipelines.machine_learning.feature_store import get_feature_store
+
+    def read(image, shape):
+        subj = nib.load(image)
+        if subj.shape != shape:
+            raise ValueError('Image %s has shape %s instead of %s.' % (image, subj.shape, shape))
+        return np.nan_to_num(np.asanyarray(subj.dataobj).astype(np.float32).flatten())
+
+    def build(directory):
+        shape = nib.load(image_list[0]).shape
+        n_voxels = int(np.prod(shape))
+        n_images = len(image_list)
+
+        # If the mask is used, it is computed by a first pass over the images (nothing is written), so that
+        # only the masked voxels are written in the store by the second pass
+        voxels = slice(None)
+        n_features = n_voxels
+        if mask:
+            data_mask = np.zeros(n_voxels, dtype=bool)
+            for image in image_list:
+                data_mask |= read(image, shape) != 0
+            voxels = np.flatnonzero(data_mask)
+            n_features = len(voxels)
+            np.save(os.path.join(directory, 'mask.npy'), data_mask)
+
+        data = np.lib.format.open_memmap(os.path.join(directory, 'data.npy'), mode='w+', dtype=np.float32,
+                                         shape=(n_images, n_features))
+        for i, image in enumerate(image_list):
+            data[i, :] = read(image, shape)[voxels]
+        data.flush()
+        del data
+
+        return {'type': 'voxel', 'n_samples': n_images, 'n_features': n_features, 'shape': list(shape),
+                'mask_zeros': bool(mask), 'images': list(image_list)}
+
+    store = get_feature_store(image_list, build, store_root, type='voxel', mask_zeros=bool(mask))
+    return store.get_data(), tuple(store.header['shape']), store.get_array('mask')
+
+
 def revert_mask(weights, mask, shape):
     """
 
@@ -104,7 +161,32 @@ def revert_mask(weights, mask, shape):
     return new_weights
 
 
-def features_weights(image_list, dual_coefficients, sv_indices, scaler=None, mask=None):
+def features_weights(image_list, dual_coefficients, sv_indices, scaler=None, mask=None, mask_zeros=True,
+                     store_root=None, max_block_memory=2 ** 28):
+    """
+    Compute the weight map of a linear SVM from the features of its support vectors.
+
+    The features are read from the feature store of the images (see
+    load_data_from_feature_store(), reused if the images were already loaded
+    with the same `mask_zeros` and `store_root`) and the weights are computed
+    as a single product of the dual coefficients and the features of the
+    support vectors, by blocks of features. If a scaler is given, the support
+    vectors are transformed by blocks of rows.
+
+    Args:
+        image_list: List of NIfTI images of the subjects.
+        dual_coefficients: Dual coefficients of the support vectors.
+        sv_indices: Indices of the support vectors in image_list.
+        scaler: Scaler applied to the features selected by `mask` (used only if `mask` is given).
+        mask: Flattened boolean mask of the features the scaler was fitted on.
+        mask_zeros: Parameter of the feature store (mask_zeros parameter of the input).
+        store_root: Folder containing the feature stores (feature_store_directory parameter of the input).
+        max_block_memory: Maximum size in bytes of a block of support vectors transformed by the scaler.
+
+    Returns:
+        Weight map (array with the shape of the images).
+    """
+    from clinica.pipelines.machine_learning.ml_utils import get_svm_weights
 
     if len(sv_indices) != len(dual_coefficients):
         print("Length dual coefficients: " + str(len(dual_coefficients)))
@@ -114,22 +196,25 @@ def features_weights(image_list, dual_coefficients, sv_indices, scaler=None, mas
     if len(image_list) == 0:
         raise ValueError('The number of images must be greater than 0.')
 
-    sv_images = [image_list[i] for i in sv_indices]
-
-    shape = nib.load(sv_images[0]).get_data().shape
-    weights = np.zeros(shape)
-
-    for i in range(len(sv_images)):
-        subj = nib.load(sv_images[i])
-        subj_data = np.nan_to_num(subj.get_data())
-
-        if scaler is not None and mask is not None:
-            subj_data = subj_data.flatten()[mask]
-            subj_data = scaler.transform(subj_data)
-            subj_data = revert_mask(subj_data, mask, shape)
-        weights += dual_coefficients[i] * subj_data
-
-    return weights
+    data, shape, data_mask = load_data_from_feature_store(image_list, mask=mask_zeros, store_root=store_root)
+    n_voxels = int(np.prod(shape))
+    if data_mask is None:
+        data_mask = np.ones(n_voxels, dtype=bool)
+
+    if scaler is not None and mask is not None:
+        sv_indices = np.asarray(sv_indices, dtype=int)
+        dual_coefficients = np.asarray(dual_coefficients, dtype=np.float64).ravel()
+        weights = np.zeros(int(np.count_nonzero(mask)))
+        block_size = max(1, int(max_block_memory // (8 * n_voxels)))
+        for start in range(0, len(sv_indices), block_size):
+            block = slice(start, start + block_size)
+            sv_data = np.zeros((len(sv_indices[block]), n_voxels))
+            sv_data[:, data_mask] = data[sv_indices[block]]
+            weights += np.dot(dual_coefficients[block], scaler.transform(sv_data[:, mask]))
+        return revert_mask(weights, mask, shape)
+
+    weights = get_svm_weights(np.asarray(dual_coefficients).ravel(), sv_indices, data)
+    return revert_mask(weights, data_mask, shape)
 
 
 def weights_to_nifti(weights, image, output_filename):
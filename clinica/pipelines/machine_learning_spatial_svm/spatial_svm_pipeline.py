@@ -146,10 +146,14 @@ class SpatialSVM(cpe.Pipeline):
         import nipype.pipeline.engine as npe
         import nipype.interfaces.io as nio
 
+        # Upper bounds of the peak memory: the Fisher tensor holds a 3x3 matrix
+        # per voxel of the DARTEL template, and each heat solver also holds the
+        # image and the intermediate arrays of the conjugate gradient
         fisher_tensor_generation = npe.Node(name="obtain_g_fisher_tensor",
                                             interface=nutil.Function(input_names=['dartel_input', 'FWHM'],
                                                                      output_names=['fisher_tensor', 'fisher_tensor_path'],
-                                                                     function=utils.obtain_g_fisher_tensor))
+                                                                     function=utils.obtain_g_fisher_tensor),
+                                            mem_gb=3)
         fisher_tensor_generation.inputs.FWHM = self.parameters['fwhm']
 
         time_step_generation = npe.Node(name='estimation_time_step',
@@ -163,7 +167,8 @@ class SpatialSVM(cpe.Pipeline):
                                                                                  'FWHM', 't_step', 'dartel_input'],
                                                                     output_names=['regularized_image'],
                                                                     function=utils.heat_solver_equation),
-                                           iterfield=['input_image'])
+                                           iterfield=['input_image'],
+                                           mem_gb=4)
         heat_solver_equation.inputs.FWHM = self.parameters['fwhm']
 
         datasink = npe.Node(nio.DataSink(),
@@ -411,7 +411,8 @@ class PETVolume(cpe.Pipeline):
 
         # Spatially normalize PET into MNI
         # ================================
-        dartel_mni_reg = npe.Node(spm.DARTELNorm2MNI(), name='dartel_mni_reg')
+        # Upper bound of the peak memory (MATLAB runtime, flow field and images)
+        dartel_mni_reg = npe.Node(spm.DARTELNorm2MNI(), name='dartel_mni_reg', mem_gb=2)
         dartel_mni_reg.inputs.modulate = False
         dartel_mni_reg.inputs.fwhm = 0
 
@@ -518,13 +519,15 @@ class PETVolume(cpe.Pipeline):
                                 name='pvc_mask')
             # PET PVC
             # =======
-            petpvc = npe.Node(PETPVC(), name='pvc')
+            # Upper bound of the peak memory of the RBV correction (PET image and
+            # one image per tissue in double precision)
+            petpvc = npe.Node(PETPVC(), name='pvc', mem_gb=2)
             petpvc.inputs.pvc = 'RBV'
             petpvc.inputs.out_file = 'pvc.nii'
 
             # Spatially normalize PET into MNI
             # ================================
-            dartel_mni_reg_pvc = npe.Node(spm.DARTELNorm2MNI(), name='dartel_mni_reg_pvc')
+            dartel_mni_reg_pvc = npe.Node(spm.DARTELNorm2MNI(), name='dartel_mni_reg_pvc', mem_gb=2)
             dartel_mni_reg_pvc.inputs.modulate = False
             dartel_mni_reg_pvc.inputs.fwhm = 0
 
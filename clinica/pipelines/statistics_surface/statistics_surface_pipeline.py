@@ -179,7 +179,9 @@ class StatisticsSurface(cpe.Pipeline):
         init_input.inputs.base_dir = os.path.join(self.base_dir, self.name)
         init_input.inputs.subjects_visits_tsv = self.tsv_file
 
-        # Node to wrap the SurfStat matlab script
+        # Node to wrap the SurfStat matlab script. Upper bound of the peak
+        # memory: MATLAB runtime and the thickness of both hemispheres on
+        # fsaverage (less than 0.01 GB per subject, copied by the GLM)
         surfstat = npe.Node(name='1-RunSurfStat',
                             interface=nutil.Function(
                                 input_names=['caps_dir',
@@ -188,7 +190,8 @@ class StatisticsSurface(cpe.Pipeline):
                                              'pipeline_parameters',
                                              ],
                                 output_names=['output_dir'],
-                                function=utils.run_matlab))
+                                function=utils.run_matlab),
+                            mem_gb=2 + 0.01 * len(self.subjects))
         surfstat.inputs.caps_dir = self.caps_directory
         surfstat.inputs.subjects_visits_tsv = self.tsv_file
         surfstat.inputs.pipeline_parameters = self.parameters
@@ -32,6 +32,12 @@ class T1FreeSurfer(cpe.Pipeline):
             image_ids = extract_image_ids(t1_freesurfer_files)
         return image_ids
 
+    def get_ledger_information(self):
+        """Describe the files recorded for each image in the completion ledger."""
+        from clinica.utils.input_files import T1W_NII, T1_FS_DESTRIEUX
+
+        return [(self.bids_directory, T1W_NII)], [T1_FS_DESTRIEUX]
+
     def check_pipeline_parameters(self):
         """Check pipeline parameters."""
         from colorama import Fore
@@ -186,8 +192,18 @@ class T1FreeSurfer(cpe.Pipeline):
 
         # Run recon-all command
         # FreeSurfer segmentation will be in <subjects_dir>/<image_id>/
+        # Upper bound of the peak memory of recon-all (mri_ca_register). It runs
+        # the number of threads given with -openmp, and 4 with -parallel
+        flags = self.parameters['recon_all_args'].split()
+        recon_all_threads = 1
+        if '-openmp' in flags[:-1] and flags[flags.index('-openmp') + 1].isdigit():
+            recon_all_threads = int(flags[flags.index('-openmp') + 1])
+        elif '-parallel' in flags:
+            recon_all_threads = 4
         recon_all = npe.Node(interface=ReconAll(),
-                             name='1-SegmentationReconAll')
+                             name='1-SegmentationReconAll',
+                             mem_gb=4,
+                             n_procs=recon_all_threads)
         recon_all.inputs.directive = 'all'
 
         # Generate TSV files containing a summary of the regional statistics
@@ -36,6 +36,15 @@ class T1Linear(cpe.Pipeline):
             image_ids = extract_image_ids(cropped_files)
         return image_ids
 
+    def get_ledger_information(self):
+        """Describe the files recorded for each image in the completion ledger."""
+        from clinica.utils.input_files import T1W_NII, T1W_LINEAR, T1W_LINEAR_CROPPED
+
+        list_output_information = [T1W_LINEAR]
+        if not self.parameters.get('uncropped_image'):
+            list_output_information.append(T1W_LINEAR_CROPPED)
+        return [(self.bids_directory, T1W_NII)], list_output_information
+
     def check_custom_dependencies(self):
         """Check dependencies that can not be listed in the `info.json` file.
         """
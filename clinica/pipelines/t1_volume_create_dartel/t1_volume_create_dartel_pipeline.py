@@ -179,8 +179,12 @@ class T1VolumeCreateDartel(cpe.Pipeline):
 
         # DARTEL template
         # ===============
+        # Upper bound of the peak memory: DARTEL keeps the tissue images and
+        # the flow fields of all the subjects in memory (less than 0.1 GB per
+        # subject at 1.5 mm) in addition to the MATLAB runtime
         dartel_template = npe.Node(spm.DARTEL(),
-                                   name='dartel_template')
+                                   name='dartel_template',
+                                   mem_gb=2 + 0.1 * len(self.subjects))
 
         # Connection
         # ==========
@@ -204,9 +204,12 @@ class T1VolumeDartel2MNI(cpe.Pipeline):
 
         # DARTEL2MNI Registration
         # =======================
+        # Upper bound of the peak memory of each normalization (MATLAB runtime,
+        # flow field and images of one subject)
         dartel2mni_node = npe.MapNode(spm.DARTELNorm2MNI(),
                                       name='dartel2MNI',
-                                      iterfield=['apply_to_files', 'flowfield_files'])
+                                      iterfield=['apply_to_files', 'flowfield_files'],
+                                      mem_gb=2)
         if self.parameters['voxel_size'] is not None:
             dartel2mni_node.inputs.voxel_size = tuple(self.parameters['voxel_size'])
         dartel2mni_node.inputs.modulate = self.parameters['modulate']
@@ -159,9 +159,12 @@ class T1VolumeRegisterDartel(cpe.Pipeline):
                                         name='unzip_templates_node')
         # DARTEL with existing template
         # =============================
+        # Upper bound of the peak memory of each registration (MATLAB runtime,
+        # template, tissue images and flow field of one subject)
         dartel_existing_template = npe.MapNode(utils.DARTELExistingTemplate(),
                                                name='dartel_existing_template',
-                                               iterfield=['image_files'])
+                                               iterfield=['image_files'],
+                                               mem_gb=2.5)
 
         # Connection
         # ==========
@@ -145,8 +145,11 @@ class T1VolumeTissueSegmentation(cpe.Pipeline):
 
         # Unified Segmentation
         # ====================
+        # Upper bound of the peak memory: MATLAB runtime, T1w image, tissue
+        # probability maps and forward/inverse deformation fields
         new_segment = npe.Node(spm.NewSegment(),
-                               name='2-SpmSegmentation')
+                               name='2-SpmSegmentation',
+                               mem_gb=4)
         new_segment.inputs.write_deformation_fields = [True, True]
         new_segment.inputs.tissues = seg_utils.get_tissue_tuples(
             self.parameters['tissue_probability_maps'],
@@ -159,7 +162,8 @@ class T1VolumeTissueSegmentation(cpe.Pipeline):
         # Apply segmentation deformation to T1 (into MNI space)
         # =====================================================
         t1_to_mni = npe.Node(seg_utils.ApplySegmentationDeformation(),
-                             name='3-T1wToMni')
+                             name='3-T1wToMni',
+                             mem_gb=2)
 
         # Print end message
         # =================
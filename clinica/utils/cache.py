@@ -0,0 +1,42 @@
+# coding: utf8
+
+"""
+This module contains utilities to handle the Clinica cache directory.
+
+The cache directory stores data that can be recomputed at any time but that is
+expensive to obtain (e.g. catalog of the files of a BIDS/CAPS directory).
+It is located in the folder given by the CLINICA_CACHE_DIR environment variable
+if it is defined, in ~/.clinica/cache otherwise.
+"""
+
+
+def get_cache_directory(*subdirectories):
+    """Return the path of a folder located in the Clinica cache directory.
+
+    The folder is created if it does not exist yet.
+
+    Args:
+        subdirectories: Names of the subfolders (e.g. 'file_catalogs').
+
+    Returns:
+        Absolute path to the folder.
+
+    Raises:
+        OSError if the folder can not be created.
+    """
+    import os
+
+    cache_directory = os.environ.get('CLINICA_CACHE_DIR', '')
+    if not cache_directory:
+        cache_directory = os.path.join(os.path.expanduser('~'), '.clinica', 'cache')
+    cache_directory = os.path.join(os.path.abspath(cache_directory), *subdirectories)
+    os.makedirs(cache_directory, exist_ok=True)
+    return cache_directory
+
+
+def hash_path(path):
+    """Return a short hash identifying the absolute path of `path`."""
+    import hashlib
+    import os
+
+    return hashlib.sha1(os.path.realpath(path).encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,359 @@
+# coding: utf8
+
+"""
+This module contains a persistent catalog of the files of a BIDS or CAPS directory.
+
+The catalog is built with a single walk of the directory tree and stored in the
+Clinica cache directory (see clinica.utils.cache). On the next uses, only the
+folders whose modification time changed are listed again, the other ones are
+taken from the stored catalog. Pattern queries (e.g. from clinica_file_reader)
+are answered from the in-memory index instead of the filesystem, once the
+modification times of the queried folders and of their subfolders have been
+checked: files added or removed since the catalog was loaded (e.g. by a
+previous pipeline of the same process) are taken into account.
+
+Hidden files and folders (i.e. whose name starts with '.') are not indexed.
+"""
+
+import os
+import threading
+
+from .pattern_matching import compile_pattern
+
+CATALOG_VERSION = 1
+
+# Folders modified less than RACY_DELAY seconds before being listed are listed
+# again at the next update: otherwise, a file written during the same mtime
+# tick as the listing would be missed on filesystems with coarse timestamps.
+RACY_DELAY = 2
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+class FileCatalog(object):
+    """Catalog of the files and folders of a BIDS or CAPS directory.
+
+    Each indexed folder is stored with its modification time and its content.
+    Paths are relative to the root directory and use '/' as separator.
+
+    Attributes:
+        root (str): Absolute path to the indexed directory.
+        cache_file (str): File where the catalog is persisted (None if the
+            catalog is only kept in memory).
+    """
+
+    def __init__(self, root, cache_file=None):
+        self._root = os.path.abspath(root)
+        self._cache_file = cache_file
+        # Relative folder path -> (mtime_ns, subfolder names, file names)
+        self._folders = {}
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._reset_indexes()
+
+    @property
+    def root(self): return self._root
+
+    @property
+    def cache_file(self): return self._cache_file
+
+    def _reset_indexes(self):
+        self._lower_folders = None
+        self._descendants = {}
+
+    def _full_path(self, relative_path):
+        if relative_path:
+            return os.path.join(self._root, relative_path)
+        return self._root
+
+    def load(self):
+        """Load the catalog previously stored in `cache_file` (if any).
+
+        Returns:
+            True if a valid catalog was loaded, False otherwise.
+        """
+        import pickle
+
+        if not self._cache_file or not os.path.isfile(self._cache_file):
+            return False
+        try:
+            with open(self._cache_file, 'rb') as f:
+                content = pickle.load(f)
+        except Exception:
+            # Corrupted or incompatible file: the catalog will be rebuilt
+            return False
+        if not isinstance(content, dict) or content.get('version') != CATALOG_VERSION \
+                or content.get('root') != self._root:
+            return False
+        with self._lock:
+            self._folders = content['folders']
+            self._dirty = False
+            self._reset_indexes()
+        return True
+
+    def save(self):
+        """Store the catalog in `cache_file` if it changed since it was loaded."""
+        import pickle
+        import tempfile
+
+        if not self._cache_file or not self._dirty:
+            return
+        with self._lock:
+            content = {'version': CATALOG_VERSION, 'root': self._root, 'folders': self._folders}
+            try:
+                fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(self._cache_file), suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(content, f, protocol=pickle.HIGHEST_PROTOCOL)
+                # Atomic replacement: concurrent Clinica processes never read a partial file
+                os.replace(tmp_file, self._cache_file)
+                self._dirty = False
+            except OSError:
+                # The catalog will simply be rebuilt next time
+                pass
+
+    def update(self, relative_folder=''):
+        """Update the catalog below `relative_folder`.
+
+        Folders whose modification time did not change are not listed again,
+        only their subfolders are checked. Folders that disappeared are removed
+        from the catalog.
+
+        Args:
+            relative_folder: Folder (relative to the root) to update ('' for the whole catalog).
+        """
+        import time
+
+        with self._lock:
+            now = time.time()
+            changed = False
+            # Folders that disappeared: their subtree is removed from the catalog
+            removed_roots = []
+            # Each folder is walked with the inodes of its ancestors: a symbolic
+            # link pointing to one of them is not followed (infinite loop), while
+            # a link to another folder is indexed as well as the folder itself
+            stack = [(relative_folder, self._get_ancestor_inodes(relative_folder))]
+            while stack:
+                folder, ancestor_inodes = stack.pop()
+                try:
+                    stat = os.stat(self._full_path(folder))
+                except OSError:
+                    if folder in self._folders:
+                        removed_roots.append(folder)
+                    continue
+                inode = (stat.st_dev, stat.st_ino)
+                if inode in ancestor_inodes:
+                    continue
+                ancestor_inodes = ancestor_inodes | {inode}
+
+                cached = self._folders.get(folder)
+                if cached is not None and cached[0] == stat.st_mtime_ns:
+                    subfolders = cached[1]
+                else:
+                    subfolders, files = self._list_folder(folder)
+                    mtime = stat.st_mtime_ns if now - stat.st_mtime > RACY_DELAY else None
+                    if cached is None or cached[1:] != (subfolders, files):
+                        changed = True
+                    if cached is not None:
+                        removed_roots.extend(folder + '/' + s if folder else s
+                                             for s in cached[1] if s not in subfolders)
+                    self._folders[folder] = (mtime, subfolders, files)
+                    self._dirty = True
+                stack.extend((folder + '/' + s if folder else s, ancestor_inodes) for s in subfolders)
+
+            if removed_roots:
+                removed = [f for f in self._folders
+                           if any(f == r or not r or f.startswith(r + '/') for r in removed_roots)]
+                for folder in removed:
+                    del self._folders[folder]
+                self._dirty = True
+                changed = True
+            # The indexes are only rebuilt if the content of a folder changed
+            if changed:
+                self._reset_indexes()
+
+    def _get_ancestor_inodes(self, relative_folder):
+        """Return the inodes (device, inode) of the folders above `relative_folder`, up to the root."""
+        inodes = set()
+        parts = relative_folder.split('/') if relative_folder else []
+        for i in range(len(parts)):
+            try:
+                stat = os.stat(self._full_path('/'.join(parts[:i])))
+            except OSError:
+                continue
+            inodes.add((stat.st_dev, stat.st_ino))
+        return frozenset(inodes)
+
+    def _list_folder(self, folder):
+        subfolders = []
+        files = []
+        try:
+            with os.scandir(self._full_path(folder)) as it:
+                for entry in it:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        subfolders.append(entry.name)
+                    else:
+                        files.append(entry.name)
+        except OSError:
+            pass
+        return tuple(sorted(subfolders)), tuple(sorted(files))
+
+    def resolve_folder(self, relative_folder):
+        """Return the indexed folder matching `relative_folder` (case insensitive), None if not found."""
+        with self._lock:
+            if self._lower_folders is None:
+                self._lower_folders = {f.lower(): f for f in self._folders}
+            return self._lower_folders.get(relative_folder.strip('/').lower())
+
+    def descendants(self, relative_folder):
+        """List the paths of all the files and folders below `relative_folder`.
+
+        Returns:
+            List of paths relative to `relative_folder`.
+        """
+        with self._lock:
+            if relative_folder in self._descendants:
+                return self._descendants[relative_folder]
+            entries = []
+            stack = [(relative_folder, '')]
+            while stack:
+                folder, prefix = stack.pop()
+                content = self._folders.get(folder)
+                if content is None:
+                    continue
+                _, subfolders, files = content
+                entries.extend(prefix + f for f in files)
+                for s in subfolders:
+                    entries.append(prefix + s)
+                    stack.append((folder + '/' + s if folder else s, prefix + s + '/'))
+            entries.sort()
+            self._descendants[relative_folder] = entries
+            return entries
+
+    def find(self, pattern, relative_folder=''):
+        """Find the paths matching `pattern` anywhere below `relative_folder`.
+
+        This is equivalent to insensitive_glob(join(root, relative_folder, '**/', pattern), recursive=True).
+
+        Args:
+            pattern: Glob pattern or regular expression compiled by compile_pattern().
+            relative_folder: Folder where the search starts (case insensitive).
+
+        Returns:
+            Sorted list of absolute paths.
+        """
+        return self.find_in_folders(pattern, [relative_folder])[0]
+
+    def find_in_folders(self, pattern, relative_folders):
+        """Find the paths matching `pattern` below each folder of `relative_folders`.
+
+        The part of the catalog below each folder is updated first (see
+        find_patterns_in_folders()).
+
+        Args:
+            pattern: Glob pattern or regular expression compiled by compile_pattern().
+            relative_folders: List of folders where the search starts (case insensitive).
+
+        Returns:
+            List (same order as `relative_folders`) of sorted lists of absolute paths.
+        """
+        return self.find_patterns_in_folders([pattern], relative_folders)[0]
+
+    def find_patterns_in_folders(self, patterns, relative_folders):
+        """Find the paths matching each pattern of `patterns` below each folder of `relative_folders`.
+
+        The content of each folder is enumerated once for all the patterns.
+        Before being searched, each folder is checked against the filesystem:
+        the modification times of the folder and of its subfolders are
+        compared with the catalog, and the folders that changed are listed
+        again, so that the files added or removed since the catalog was loaded
+        are taken into account.
+
+        Args:
+            patterns: List of glob patterns or regular expressions compiled by compile_pattern().
+            relative_folders: List of folders where the search starts (case insensitive).
+
+        Returns:
+            List (same order as `patterns`) of lists (same order as
+            `relative_folders`) of sorted lists of absolute paths.
+        """
+        regexes = [compile_pattern(p) if isinstance(p, str) else p for p in patterns]
+        results = [[] for _ in regexes]
+        updated = set()
+        for relative_folder in relative_folders:
+            if relative_folder not in updated:
+                self._update_around(relative_folder)
+                updated.add(relative_folder)
+            found = self._find_in_folder(regexes, relative_folder)
+            for result, found_pattern in zip(results, found):
+                result.append(found_pattern)
+        self.save()
+        return results
+
+    def _find_in_folder(self, regexes, relative_folder):
+        folder = self.resolve_folder(relative_folder)
+        if folder is None:
+            return [[] for _ in regexes]
+        base = self._full_path(folder)
+        entries = self.descendants(folder)
+        return [[os.path.join(base, p) for p in entries if regex.match(p)] for regex in regexes]
+
+    def _update_around(self, relative_folder):
+        """Update the deepest indexed folder containing `relative_folder`."""
+        parts = [p for p in relative_folder.split('/') if p]
+        while parts:
+            folder = self.resolve_folder('/'.join(parts))
+            if folder is not None:
+                self.update(folder)
+                return
+            parts = parts[:-1]
+        self.update('')
+
+
+def get_file_catalog(root):
+    """Get the catalog of the BIDS or CAPS directory `root`.
+
+    The catalog is shared by all the callers of the current process. The first
+    call loads it from the Clinica cache directory and updates it, and stores
+    it back if needed.
+
+    Args:
+        root: Path to the BIDS or CAPS directory.
+
+    Returns:
+        FileCatalog object.
+    """
+    from .cache import get_cache_directory, hash_path
+
+    root = os.path.abspath(root)
+    with _catalogs_lock:
+        catalog = _catalogs.get(root)
+        if catalog is None:
+            try:
+                cache_file = os.path.join(get_cache_directory('file_catalogs'), hash_path(root) + '.pkl')
+            except OSError:
+                cache_file = None
+            catalog = FileCatalog(root, cache_file)
+            catalog.load()
+            catalog.update()
+            catalog.save()
+            _catalogs[root] = catalog
+    return catalog
+
+
+def refresh_file_catalog(root):
+    """Update the catalog of `root` against the filesystem and store it.
+
+    Use this function when files may have been removed or modified since the
+    catalog was loaded in the current process.
+    """
+    catalog = get_file_catalog(root)
+    catalog.update()
+    catalog.save()
+    return catalog
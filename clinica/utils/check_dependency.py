@@ -12,7 +12,9 @@ def is_binary_present(binary):
     Check if a binary is present.
 
     This function checks if the program is present. Do not use this function
-    with a binary GUI, it will open the GUI.
+    with a binary GUI, it will open the GUI. The result is stored in the
+    dependency cache (see clinica.utils.dependency_cache) until the binary
+    found in PATH changes.
 
     Taken from:
     https://stackoverflow.com/questions/11210104/check-if-a-program-exists-from-a-python-script
@@ -23,16 +25,22 @@ def is_binary_present(binary):
     Returns:
         True if the binary is present, False otherwise.
     """
-    import subprocess
+    import errno
     import os
+    import shutil
+    import subprocess
+    from .dependency_cache import cached_probe
 
-    try:
-        devnull = open(os.devnull)
-        subprocess.Popen([binary], stdout=devnull, stderr=devnull).communicate()
-    except OSError as e:
-        if e.errno == os.errno.ENOENT:
-            return False
-    return True
+    def probe():
+        try:
+            with open(os.devnull, 'w') as devnull:
+                subprocess.Popen([binary], stdout=devnull, stderr=devnull).communicate()
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return False
+        return True
+
+    return cached_probe('binary:' + binary, probe, paths=[shutil.which(binary)])
 
 
 def check_environment_variable(environment_variable, software_name):
@@ -104,15 +112,20 @@ def check_freesurfer(version_requirements=None):
 
 def check_fsl(version_requirements=None):
     """Check FSL software."""
+    import os
     import nipype.interfaces.fsl as fsl
     from colorama import Fore
     from clinica.utils.exceptions import ClinicaMissingDependencyError
     from clinica.utils.stream import cprint
+    from .dependency_cache import cached_probe
 
-    check_environment_variable('FSLDIR', 'FSL')
+    fsl_dir = check_environment_variable('FSLDIR', 'FSL')
 
     try:
-        if fsl.Info.version().split(".") < ['5', '0', '5']:
+        fsl_version = cached_probe('version:fsl', fsl.Info.version,
+                                   paths=[os.path.join(fsl_dir, 'etc', 'fslversion')],
+                                   environment_variables=['FSLDIR'])
+        if fsl_version.split(".") < ['5', '0', '5']:
             raise ClinicaMissingDependencyError(
                 '%sFSL version must be greater than 5.0.5%s'
                 % (Fore.RED, Fore.RESET))
@@ -0,0 +1,142 @@
+# coding: utf8
+
+"""
+This module contains the cache of the dependency checks of Clinica.
+
+Some dependency checks run external programs (e.g. to find a binary or get
+the version of FSL or SPM standalone), which takes time on every launch of
+Clinica. The results of these probes are stored in the Clinica cache directory
+(see clinica.utils.cache), with a key built from the paths, modification times
+and environment variables the probe depends on: a result is reused as long as
+the software is not reinstalled, moved or configured differently.
+
+The cache can be emptied with the --refresh_dependency_cache option of
+`clinica run`.
+"""
+
+import os
+import threading
+
+DEPENDENCY_CACHE_VERSION = 1
+
+# Content of the cache file, loaded once per process
+_cache = None
+_lock = threading.Lock()
+
+
+def get_dependency_cache_file():
+    """Return the path of the file storing the results of the dependency probes."""
+    from clinica.utils.cache import get_cache_directory
+
+    return os.path.join(get_cache_directory(), 'dependencies.json')
+
+
+def get_probe_key(name, paths=(), environment_variables=()):
+    """Return the key identifying a dependency probe in its current environment.
+
+    Args:
+        name: Name of the probe (e.g. 'binary:recon-all').
+        paths: Files or folders whose path and modification time are part of the key.
+        environment_variables: Environment variables whose value is part of the key.
+
+    Returns:
+        Hexadecimal sha256 hash (str).
+    """
+    import hashlib
+    import json
+
+    files = []
+    for path in paths:
+        if path is None:
+            files.append(None)
+            continue
+        try:
+            files.append([path, os.path.realpath(path), os.stat(path).st_mtime_ns])
+        except OSError:
+            files.append([path, None, None])
+    content = json.dumps({'version': DEPENDENCY_CACHE_VERSION,
+                          'name': name,
+                          'files': files,
+                          'environment': [[var, os.environ.get(var)] for var in environment_variables]},
+                         sort_keys=True)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def _load_cache():
+    import json
+
+    global _cache
+    if _cache is None:
+        try:
+            with open(get_dependency_cache_file(), 'r') as f:
+                _cache = json.load(f)
+            if not isinstance(_cache, dict):
+                _cache = {}
+        except (OSError, IOError, ValueError):
+            _cache = {}
+    return _cache
+
+
+def _save_cache(cache):
+    """Store the cache in the Clinica cache directory, if it is writable.
+
+    The cache is best-effort: if the cache directory can not be created or
+    written (e.g. read-only home directory on a compute node), the results of
+    the probes are simply not stored.
+    """
+    import json
+    import tempfile
+
+    tmp_file = None
+    try:
+        cache_file = get_dependency_cache_file()
+        # The file is replaced atomically: concurrent Clinica processes never read a partial file
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(cache_file), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f, indent=1, sort_keys=True)
+        os.replace(tmp_file, cache_file)
+    except (OSError, IOError):
+        if tmp_file is not None and os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def cached_probe(name, probe, paths=(), environment_variables=()):
+    """Return the result of a dependency probe, running it only if it is not in the cache.
+
+    Args:
+        name: Name of the probe (e.g. 'binary:recon-all').
+        probe: Function without argument returning a JSON-serializable result.
+        paths: Files or folders whose path and modification time invalidate the result.
+        environment_variables: Environment variables whose value invalidates the result.
+
+    Returns:
+        Result of the probe.
+    """
+    import datetime
+
+    key = get_probe_key(name, paths, environment_variables)
+    with _lock:
+        cache = _load_cache()
+        if key in cache:
+            return cache[key]['result']
+
+    result = probe()
+    with _lock:
+        cache = _load_cache()
+        cache[key] = {'name': name, 'result': result, 'date': datetime.datetime.now().isoformat()}
+        _save_cache(cache)
+    return result
+
+
+def clear_dependency_cache():
+    """Remove the results of all the dependency probes."""
+    global _cache
+    with _lock:
+        _cache = {}
+        try:
+            cache_file = get_dependency_cache_file()
+        except OSError:
+            # No cache directory: nothing was stored
+            return
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
@@ -0,0 +1,245 @@
+# coding: utf8
+
+"""
+This module contains the execution policy of the Clinica pipelines.
+
+The execution policy gathers the decisions that Clinica used to ask
+interactively before running a pipeline:
+    - n_procs: number of processes run in parallel,
+    - memory_gb: memory budget given to the Nipype scheduler,
+    - disk_policy: what to do when the disk space seems insufficient
+      ('warn' to run anyway, 'abort' to stop),
+    - cross_sectional: what to do when the BIDS dataset is cross-sectional
+      ('convert' to create a longitudinal copy, 'abort' to stop),
+    - profile: whether the runtime and memory of each node are reported
+      (see clinica.utils.profiling).
+
+It is read from the command line (clinica run options) or, for the options not
+given on the command line, from the CLINICA_N_PROCS, CLINICA_MEMORY_GB,
+CLINICA_DISK_POLICY, CLINICA_CROSS_SECTIONAL and CLINICA_PROFILE environment
+variables.
+When n_procs or memory_gb are not given, they are derived from the CPU and
+memory limits of the cgroup of the process (e.g. a SLURM allocation or a
+container), not from the hardware of the node: the default memory budget is
+90% of the memory limit (MEMORY_FRACTION).
+"""
+
+import os
+
+DISK_POLICIES = ('warn', 'abort')
+CROSS_SECTIONAL_POLICIES = ('convert', 'abort')
+
+# Minimum memory (in GB) available to each process when the number of
+# processes is derived from the resources of the machine
+MIN_MEMORY_GB_PER_PROC = 1.
+
+# Fraction of the available memory used as default budget (as the MultiProc
+# plugin of Nipype does with the memory of the machine)
+MEMORY_FRACTION = .9
+
+_execution_policy = None
+
+
+def _read_first_line(path):
+    try:
+        with open(path, 'r') as f:
+            return f.readline().strip()
+    except (OSError, IOError):
+        return None
+
+
+def get_available_cpus():
+    """Return the number of CPUs that the current process can use.
+
+    The CPU affinity of the process and the CPU quota of its cgroup (v1 or v2)
+    are taken into account.
+
+    Returns:
+        Number of CPUs (int, at least 1).
+    """
+    from math import ceil
+    from multiprocessing import cpu_count
+
+    try:
+        n_cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        n_cpus = cpu_count()
+
+    quota, period = None, None
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    cpu_max = _read_first_line('/sys/fs/cgroup/cpu.max')
+    if cpu_max:
+        values = cpu_max.split()
+        if len(values) == 2 and values[0] != 'max':
+            quota, period = int(values[0]), int(values[1])
+    else:
+        # cgroup v1: a quota of -1 means no limit
+        cfs_quota = _read_first_line('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+        cfs_period = _read_first_line('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+        if cfs_quota and cfs_period and int(cfs_quota) > 0:
+            quota, period = int(cfs_quota), int(cfs_period)
+    if quota and period:
+        n_cpus = min(n_cpus, int(ceil(float(quota) / period)))
+    return max(n_cpus, 1)
+
+
+def get_available_memory_gb():
+    """Return the memory (in GB) that the current process can use.
+
+    The memory limit of the cgroup (v1 or v2) of the process is taken into
+    account.
+
+    Returns:
+        Memory in GB (float), None if it can not be determined.
+    """
+    memory = None
+    try:
+        memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        pass
+
+    # cgroup v2 ("max" means no limit), then cgroup v1 (no limit is a huge number)
+    limit = _read_first_line('/sys/fs/cgroup/memory.max')
+    if limit is None:
+        limit = _read_first_line('/sys/fs/cgroup/memory/memory.limit_in_bytes')
+    if limit and limit.isdigit():
+        memory = min(memory, int(limit)) if memory else int(limit)
+
+    if memory is None:
+        return None
+    return memory / float(1 << 30)
+
+
+class ExecutionPolicy(object):
+    """Decisions taken by Clinica without asking the user when a pipeline is run.
+
+    Attributes:
+        n_procs (int): Number of processes run in parallel (None to derive it
+            from the CPU and memory limits).
+        memory_gb (float): Memory budget of the Nipype scheduler (None to use
+            MEMORY_FRACTION, i.e. 90%, of the memory limit of the process).
+        disk_policy (str): 'warn' or 'abort' when the disk space seems insufficient.
+        cross_sectional (str): 'convert' or 'abort' when the BIDS dataset is cross-sectional.
+        profile (bool): If True, a report of the runtime and memory of each node is written.
+    """
+
+    def __init__(self, n_procs=None, memory_gb=None, disk_policy='warn', cross_sectional='abort', profile=False):
+        from clinica.utils.exceptions import ClinicaException
+
+        try:
+            n_procs = int(n_procs) if n_procs is not None else None
+        except (TypeError, ValueError):
+            raise ClinicaException('The number of processes must be a positive integer (got %s).' % n_procs)
+        try:
+            memory_gb = float(memory_gb) if memory_gb is not None else None
+        except (TypeError, ValueError):
+            raise ClinicaException('The memory budget must be a positive number of GB (got %s).' % memory_gb)
+        if n_procs is not None and n_procs < 1:
+            raise ClinicaException('The number of processes must be a positive integer (got %s).' % n_procs)
+        if memory_gb is not None and memory_gb <= 0:
+            raise ClinicaException('The memory budget must be positive (got %s GB).' % memory_gb)
+        if disk_policy not in DISK_POLICIES:
+            raise ClinicaException('The disk policy must be one of %s (got %s).' % (', '.join(DISK_POLICIES),
+                                                                                    disk_policy))
+        if cross_sectional not in CROSS_SECTIONAL_POLICIES:
+            raise ClinicaException('The cross-sectional policy must be one of %s (got %s).'
+                                   % (', '.join(CROSS_SECTIONAL_POLICIES), cross_sectional))
+        self._n_procs = n_procs
+        self._memory_gb = memory_gb
+        self._disk_policy = disk_policy
+        self._cross_sectional = cross_sectional
+        self._profile = bool(profile)
+
+    @property
+    def n_procs(self): return self._n_procs
+
+    @property
+    def memory_gb(self): return self._memory_gb
+
+    @property
+    def disk_policy(self): return self._disk_policy
+
+    @property
+    def cross_sectional(self): return self._cross_sectional
+
+    @property
+    def profile(self): return self._profile
+
+    @classmethod
+    def from_environment(cls, environ=None):
+        """Build the execution policy from the CLINICA_* environment variables.
+
+        Raises:
+            ClinicaException if a variable has an invalid value (the message names the variable).
+        """
+        from clinica.utils.exceptions import ClinicaException
+
+        if environ is None:
+            environ = os.environ
+
+        def get_value(name, convert, description):
+            value = environ.get(name) or None
+            if value is None:
+                return None
+            try:
+                converted = convert(value)
+            except ValueError:
+                converted = None
+            if converted is None or converted <= 0:
+                raise ClinicaException('The %s environment variable must be %s (got %s).' % (name, description, value))
+            return converted
+
+        return cls(n_procs=get_value('CLINICA_N_PROCS', int, 'a positive integer'),
+                   memory_gb=get_value('CLINICA_MEMORY_GB', float, 'a positive number of GB'),
+                   disk_policy=environ.get('CLINICA_DISK_POLICY') or 'warn',
+                   cross_sectional=environ.get('CLINICA_CROSS_SECTIONAL') or 'abort',
+                   profile=environ.get('CLINICA_PROFILE', '').lower() in ('1', 'true', 'yes'))
+
+    def update(self, n_procs=None, memory_gb=None, disk_policy=None, cross_sectional=None, profile=None):
+        """Return a copy of the policy where the given (not None) values are replaced."""
+        return ExecutionPolicy(n_procs=n_procs if n_procs is not None else self._n_procs,
+                               memory_gb=memory_gb if memory_gb is not None else self._memory_gb,
+                               disk_policy=disk_policy if disk_policy is not None else self._disk_policy,
+                               cross_sectional=(cross_sectional if cross_sectional is not None
+                                                else self._cross_sectional),
+                               profile=profile if profile is not None else self._profile)
+
+    def get_memory_gb(self):
+        """Return the memory budget, i.e. memory_gb or 90% of the memory available to the process."""
+        if self._memory_gb is not None:
+            return self._memory_gb
+        memory_gb = get_available_memory_gb()
+        if memory_gb is None:
+            return None
+        return MEMORY_FRACTION * memory_gb
+
+    def get_n_procs(self):
+        """Return the number of processes to run in parallel.
+
+        If n_procs is not set, it is the number of available CPUs, reduced so
+        that each process has at least MIN_MEMORY_GB_PER_PROC of memory.
+        """
+        if self._n_procs is not None:
+            return self._n_procs
+        n_procs = get_available_cpus()
+        memory_gb = self.get_memory_gb()
+        if memory_gb is not None:
+            n_procs = min(n_procs, int(memory_gb // MIN_MEMORY_GB_PER_PROC))
+        return max(n_procs, 1)
+
+
+def get_execution_policy():
+    """Return the execution policy of the current process.
+
+    It is the policy given to set_execution_policy() (e.g. from the command
+    line), or the one defined by the environment variables otherwise.
+    """
+    if _execution_policy is None:
+        return ExecutionPolicy.from_environment()
+    return _execution_policy
+
+
+def set_execution_policy(policy):
+    """Set the execution policy of the current process (None to use the environment variables)."""
+    global _execution_policy
+    _execution_policy = policy
@@ -19,14 +19,11 @@ def insensitive_glob(pattern_glob, recursive=False):
         pattern_glob: sensitive-to-the-case pattern
         recursive: recursive parameter for glob.glob()
     Returns:
-         insensitive-to-the-case pattern
+         sorted list of the paths matching the pattern, whatever the case of their letters
     """
-    from glob import glob
+    from clinica.utils.pattern_matching import InsensitiveGlob
 
-    def either(c):
-        return '[%s%s]' % (c.lower(), c.upper()) if c.isalpha() else c
-
-    return glob(''.join(map(either, pattern_glob)), recursive=recursive)
+    return InsensitiveGlob(pattern_glob, recursive=recursive).glob()
 
 
 def determine_caps_or_bids(input_dir):
@@ -206,18 +203,63 @@ def clinica_file_reader(subjects,
         Note:
             This function is case insensitive, meaning that the pattern argument can, for example, contain maj letter
             that do not exists in the existing file path.
+            Files are looked up in the catalog of input_directory (see clinica.utils.catalog), which is built once
+            and then shared by all the calls of the current process.
 
     """
 
-    from os.path import join
-    from colorama import Fore
-    from clinica.utils.exceptions import ClinicaBIDSError, ClinicaCAPSError
+    return clinica_list_of_files_reader(subjects, sessions, input_directory, [information], raise_exception)[0]
 
+
+def _check_information(information):
+    """Check the `information` dictionary given to clinica_file_reader."""
     assert isinstance(information, dict), 'A dict must be provided for the argmuent \'dict\''
     assert all(elem in information.keys() for elem in ['pattern', 'description']), '\'information\' must contain the keys \'pattern\' and \'description'
     assert all(elem in ['pattern', 'description', 'needed_pipeline'] for elem in information.keys()), '\'information\' can only contain the keys \'pattern\', \'description\' and \'needed_pipeline\''
 
-    pattern = information['pattern']
+    # Some check on the formatting on the data
+    assert information['pattern'][0] != '/', 'pattern argument cannot start with char: / (does not work in os.path.join function). ' \
+                                             + 'If you want to indicate the exact name of the file, use the format' \
+                                             + ' directory_name/filename.extension or filename.extension in the pattern argument'
+
+
+def clinica_list_of_files_reader(subjects,
+                                 sessions,
+                                 input_directory,
+                                 list_information,
+                                 raise_exception=True):
+    """
+    This function grabs the files of several patterns relative to a subject and session list. It is equivalent to
+    several calls of clinica_file_reader, but the content of each subject/session folder is read only once for all the
+    patterns.
+    Args:
+        subjects: list of subjects
+        sessions: list of sessions (must be same size as subjects, and must correspond )
+        input_directory: location of the bids or caps directory
+        list_information: list of dictionaries (see clinica_file_reader for their content)
+        raise_exception: if True (normal behavior), an exception is raised if errors happen. If not, we return the file
+                        lists as they are
+
+    Returns:
+         list (same order as list_information) of list of files respecting the subject/session order provided in input,
+         You should always use clinica_list_of_files_reader in the following manner:
+         try:
+            t1w_files, dwi_files = clinica_list_of_files_reader(..., [T1W_NII, DWI_NII])
+         except ClinicaException as e:
+            # Deal with the error
+
+    Raises:
+        ClinicaCAPSError or ClinicaBIDSError if multiples files are found for 1 subject/session, or no file is found.
+        The error message gathers the problems encountered for all the patterns.
+        If raise_exception is False, no exception is raised
+    """
+    from colorama import Fore
+    from clinica.utils.catalog import get_file_catalog
+    from clinica.utils.exceptions import ClinicaBIDSError, ClinicaCAPSError
+
+    for information in list_information:
+        _check_information(information)
+
     is_bids = determine_caps_or_bids(input_directory)
 
     if is_bids:
@@ -225,54 +267,59 @@ def clinica_file_reader(subjects,
     else:
         check_caps_folder(input_directory)
 
-    # Some check on the formatting on the data
-    assert pattern[0] != '/', 'pattern argument cannot start with char: / (does not work in os.path.join function). ' \
-                              + 'If you want to indicate the exact name of the file, use the format' \
-                              + ' directory_name/filename.extension or filename.extension in the pattern argument'
     assert len(subjects) == len(sessions), 'Subjects and sessions must have the same length'
     if len(subjects) == 0:
-        return []
+        return [[] for _ in list_information]
 
-    # rez is the list containing the results
-    results = []
-    # error is the list of the errors that happen during the whole process
-    error_encountered = []
-    for sub, ses in zip(subjects, sessions):
-        if is_bids:
-            origin_pattern = join(input_directory, sub, ses)
-        else:
-            origin_pattern = join(input_directory, 'subjects', sub, ses)
-
-        current_pattern = join(origin_pattern, '**/', pattern)
-        current_glob_found = insensitive_glob(current_pattern, recursive=True)
-
-        # Error handling if more than 1 file are found, or when no file is found
-        if len(current_glob_found) > 1:
-            error_str = '\t*' + Fore.BLUE + ' (' + sub + ' | ' + ses + ') ' + Fore.RESET + ': More than 1 file found:\n'
-            for found_file in current_glob_found:
-                error_str += '\t\t' + found_file + '\n'
-            error_encountered.append(error_str)
-        elif len(current_glob_found) == 0:
-            error_encountered.append('\t*' + Fore.BLUE + ' (' + sub + ' | ' + ses + ') ' + Fore.RESET + ': No file found\n')
-        # Otherwise the file found is added to the result
-        else:
-            results.append(current_glob_found[0])
+    # Files are searched for all the subjects/sessions and all the patterns at once in the catalog of input_directory
+    if is_bids:
+        session_folders = [sub + '/' + ses for sub, ses in zip(subjects, sessions)]
+    else:
+        session_folders = ['subjects/' + sub + '/' + ses for sub, ses in zip(subjects, sessions)]
+    catalog = get_file_catalog(input_directory)
+    all_glob_found = catalog.find_patterns_in_folders([information['pattern'] for information in list_information],
+                                                      session_folders)
+
+    # list_results contains the results of each pattern
+    list_results = []
+    # error_message gathers the errors that happen for all the patterns
+    error_message = ''
+    for information, pattern_glob_found in zip(list_information, all_glob_found):
+        # rez is the list containing the results
+        results = []
+        # error is the list of the errors that happen during the whole process
+        error_encountered = []
+        for sub, ses, current_glob_found in zip(subjects, sessions, pattern_glob_found):
+            # Error handling if more than 1 file are found, or when no file is found
+            if len(current_glob_found) > 1:
+                error_str = '\t*' + Fore.BLUE + ' (' + sub + ' | ' + ses + ') ' + Fore.RESET + ': More than 1 file found:\n'
+                for found_file in current_glob_found:
+                    error_str += '\t\t' + found_file + '\n'
+                error_encountered.append(error_str)
+            elif len(current_glob_found) == 0:
+                error_encountered.append('\t*' + Fore.BLUE + ' (' + sub + ' | ' + ses + ') ' + Fore.RESET + ': No file found\n')
+            # Otherwise the file found is added to the result
+            else:
+                results.append(current_glob_found[0])
+        list_results.append(results)
+
+        if len(error_encountered) > 0:
+            error_message += Fore.RED + '\n[Error] Clinica encountered ' + str(len(error_encountered)) \
+                             + ' problem(s) while getting ' + information['description'] + ':\n' + Fore.RESET
+            if 'needed_pipeline' in information.keys():
+                if information['needed_pipeline']:
+                    error_message += Fore.YELLOW + 'Please note that the following clinica pipeline(s) must have run ' \
+                                     'to obtain these files: ' + information['needed_pipeline'] + Fore.RESET + '\n'
+            for msg in error_encountered:
+                error_message += msg
 
     # We do not raise an error, so that the developper can gather all the problems before Clinica crashes
-    if len(error_encountered) > 0 and raise_exception is True:
-        error_message = Fore.RED + '\n[Error] Clinica encountered ' + str(len(error_encountered)) \
-                        + ' problem(s) while getting ' + information['description'] + ':\n' + Fore.RESET
-        if 'needed_pipeline' in information.keys():
-            if information['needed_pipeline']:
-                error_message += Fore.YELLOW + 'Please note that the following clinica pipeline(s) must have run ' \
-                                 'to obtain these files: ' + information['needed_pipeline'] + Fore.RESET + '\n'
-        for msg in error_encountered:
-            error_message += msg
+    if len(error_message) > 0 and raise_exception is True:
         if is_bids:
             raise ClinicaBIDSError(error_message)
         else:
             raise ClinicaCAPSError(error_message)
-    return results
+    return list_results
 
 
 def clinica_group_reader(caps_directory, information, raise_exception=True):
@@ -295,8 +342,8 @@ def clinica_group_reader(caps_directory, information, raise_exception=True):
     Raises:
         ClinicaCAPSError if no file is found, or more than 1 files are found
     """
-    from os.path import join
     from colorama import Fore
+    from clinica.utils.catalog import get_file_catalog
     from clinica.utils.exceptions import ClinicaCAPSError
 
     assert isinstance(information, dict), 'A dict must be provided for the argmuent \'dict\''
@@ -312,8 +359,7 @@ def clinica_group_reader(caps_directory, information, raise_exception=True):
 
     check_caps_folder(caps_directory)
 
-    current_pattern = join(caps_directory, '**/', pattern)
-    current_glob_found = insensitive_glob(current_pattern, recursive=True)
+    current_glob_found = get_file_catalog(caps_directory).find(pattern)
 
     if len(current_glob_found) != 1 and raise_exception is True:
         error_string = Fore.RED + '\n[Error] Clinica encountered a problem while getting ' + information['description'] + '. '
@@ -0,0 +1,187 @@
+# coding: utf8
+
+"""
+This module contains the completion ledger of the Clinica pipelines.
+
+For each pipeline, the ledger stored in <caps_directory>/.clinica/ledgers/
+records the images that were successfully processed: image ID (e.g.
+sub-01_ses-M00), hash of the pipeline parameters, checksums of the input
+files and paths of the output files. When a pipeline is run again, the images
+whose parameters, inputs and outputs did not change since they were recorded
+are removed from the list of images to process before the Nipype graph is
+built.
+"""
+
+import os
+
+LEDGER_VERSION = 1
+
+
+def get_parameters_hash(pipeline_name, parameters):
+    """Return a hash identifying the parameters of a pipeline.
+
+    Args:
+        pipeline_name: Name of the pipeline (e.g. 't1-linear').
+        parameters: Dictionary of the parameters of the pipeline.
+
+    Returns:
+        Hexadecimal sha256 hash (str).
+    """
+    import hashlib
+    import json
+
+    content = json.dumps({'pipeline': pipeline_name, 'parameters': parameters}, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def get_file_signature(path, checksum=True):
+    """Return the signature of a file (size, modification time and sha256 checksum).
+
+    Args:
+        path: Path to the file.
+        checksum: If False, the sha256 checksum is not computed.
+
+    Returns:
+        Dictionary with the keys 'size', 'mtime_ns' and 'sha256' (None if not computed).
+    """
+    from clinica.utils.inputs import _sha256
+
+    stat = os.stat(path)
+    return {'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': _sha256(path) if checksum else None}
+
+
+class CompletionLedger(object):
+    """Completion ledger of a pipeline in a CAPS directory.
+
+    The ledger is a JSON lines file: each line records the completion of an
+    image, the last line of an image ID prevails. Lines are only appended, so
+    that several Clinica processes can fill the same ledger.
+
+    Attributes:
+        ledger_file (str): Path to the ledger file.
+    """
+
+    def __init__(self, caps_directory, pipeline_name):
+        self._ledger_file = os.path.join(os.path.abspath(caps_directory), '.clinica', 'ledgers',
+                                         pipeline_name + '.jsonl')
+        # Image ID -> last entry recorded
+        self._entries = {}
+        self.load()
+
+    @property
+    def ledger_file(self): return self._ledger_file
+
+    def load(self):
+        """Read the ledger file (invalid lines are ignored)."""
+        import json
+
+        self._entries = {}
+        if not os.path.isfile(self._ledger_file):
+            return
+        with open(self._ledger_file, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Line partially written by an interrupted process
+                    continue
+                if isinstance(entry, dict) and entry.get('version') == LEDGER_VERSION and 'image_id' in entry:
+                    self._entries[entry['image_id']] = entry
+
+    def get_entry(self, image_id):
+        """Return the last entry recorded for `image_id` (None if not found)."""
+        return self._entries.get(image_id)
+
+    def is_completed(self, image_id, parameters_hash, input_files):
+        """Check if an image was processed with the same parameters and inputs, and if its outputs still exist.
+
+        Input files whose size and modification time are the ones recorded are
+        considered unchanged. Otherwise, their checksum is computed and compared
+        to the recorded one.
+
+        Args:
+            image_id: Image ID (e.g. 'sub-01_ses-M00').
+            parameters_hash: Hash of the current parameters (see get_parameters_hash()).
+            input_files: List of the current input files of the image.
+
+        Returns:
+            True if the image does not need to be processed again.
+        """
+        entry = self._entries.get(image_id)
+        if entry is None or entry['parameters_hash'] != parameters_hash:
+            return False
+        if sorted(entry['inputs'].keys()) != sorted(input_files):
+            return False
+        for path, signature in entry['inputs'].items():
+            try:
+                current = get_file_signature(path, checksum=False)
+            except OSError:
+                return False
+            if current['size'] != signature['size']:
+                return False
+            if current['mtime_ns'] != signature['mtime_ns']:
+                from clinica.utils.inputs import _sha256
+                if _sha256(path) != signature['sha256']:
+                    return False
+        return all(os.path.exists(path) for path in entry['outputs'])
+
+    def record(self, image_id, parameters_hash, input_files, output_files):
+        """Record that `image_id` was successfully processed.
+
+        Args:
+            image_id: Image ID (e.g. 'sub-01_ses-M00').
+            parameters_hash: Hash of the parameters (see get_parameters_hash()).
+            input_files: List of the input files of the image.
+            output_files: List of the output files of the image.
+        """
+        import datetime
+        import json
+
+        entry = {'version': LEDGER_VERSION,
+                 'image_id': image_id,
+                 'parameters_hash': parameters_hash,
+                 'inputs': {path: get_file_signature(path) for path in input_files},
+                 'outputs': sorted(output_files),
+                 'date': datetime.datetime.now().isoformat()}
+        os.makedirs(os.path.dirname(self._ledger_file), exist_ok=True)
+        # A single write on a file opened in append mode: lines of concurrent processes are not interleaved
+        with open(self._ledger_file, 'a') as f:
+            f.write(json.dumps(entry, sort_keys=True) + '\n')
+        self._entries[image_id] = entry
+
+
+def find_image_files(directory, subjects, sessions, list_information):
+    """Find the files of each image described by a list of information dictionaries.
+
+    Args:
+        directory: BIDS or CAPS directory.
+        subjects: List of participant IDs.
+        sessions: List of session IDs (same size as subjects).
+        list_information: List of dictionaries with a 'pattern' key (see clinica_file_reader).
+
+    Returns:
+        List (same order as subjects) of lists of files, None for the images
+        where a pattern is not found exactly once.
+    """
+    from clinica.utils.catalog import get_file_catalog
+    from clinica.utils.inputs import determine_caps_or_bids
+
+    if len(subjects) == 0 or len(list_information) == 0:
+        return [[] for _ in subjects]
+    if determine_caps_or_bids(directory):
+        session_folders = [sub + '/' + ses for sub, ses in zip(subjects, sessions)]
+    else:
+        session_folders = ['subjects/' + sub + '/' + ses for sub, ses in zip(subjects, sessions)]
+    found = get_file_catalog(directory).find_patterns_in_folders(
+        [information['pattern'] for information in list_information], session_folders)
+
+    image_files = []
+    for i in range(len(subjects)):
+        files = [pattern_found[i] for pattern_found in found]
+        if all(len(f) == 1 for f in files):
+            image_files.append([f[0] for f in files])
+        else:
+            image_files.append(None)
+    return image_files
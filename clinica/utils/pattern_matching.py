@@ -0,0 +1,248 @@
+# coding: utf8
+
+"""
+This module contains a case-insensitive glob engine.
+
+Glob patterns are compiled once into case-insensitive regular expressions
+(one per path segment). The directory tree is then explored with os.scandir,
+listing each folder at most once and only entering the folders that can
+still lead to a match.
+"""
+
+import os
+from functools import lru_cache
+
+MAGIC_CHARACTERS = ('*', '?', '[')
+
+
+def translate_segment(segment):
+    """Translate a glob pattern segment (no '/') into a regular expression.
+
+    Args:
+        segment: Glob pattern of a single file or folder name (e.g. 'sub-*_ses-*').
+
+    Returns:
+        Regular expression (str) matching the same names.
+    """
+    import re
+
+    i, n = 0, len(segment)
+    regex = ''
+    while i < n:
+        c = segment[i]
+        i += 1
+        if c == '*':
+            regex += '[^/]*'
+        elif c == '?':
+            regex += '[^/]'
+        elif c == '[':
+            j = i
+            if j < n and segment[j] == '!':
+                j += 1
+            if j < n and segment[j] == ']':
+                j += 1
+            while j < n and segment[j] != ']':
+                j += 1
+            if j >= n:
+                regex += '\\['
+            else:
+                content = segment[i:j].replace('\\', '\\\\')
+                i = j + 1
+                if content[0] == '!':
+                    content = '^/' + content[1:]
+                elif content[0] == '^':
+                    content = '\\' + content
+                regex += '[%s]' % content
+        else:
+            regex += re.escape(c)
+    return regex
+
+
+def compile_pattern(pattern, recursive_prefix=True):
+    """Compile a glob pattern into a case-insensitive regular expression.
+
+    The regular expression is meant to be matched against paths relative to
+    the folder where the search starts, using '/' as separator.
+
+    Args:
+        pattern: Glob pattern (e.g. 't1/freesurfer_cross_sectional/sub-*_ses-*/mri/orig_nu.mgz').
+        recursive_prefix: If True, the pattern can be found in any subfolder
+            (i.e. it behaves like glob('**/' + pattern, recursive=True)).
+
+    Returns:
+        Compiled regular expression.
+    """
+    import re
+
+    segments = [s for s in pattern.split('/') if s]
+    regex = '(?:[^/]+/)*' if recursive_prefix else ''
+    for i, segment in enumerate(segments):
+        if segment == '**':
+            if i == len(segments) - 1:
+                regex += '(?:[^/]+(?:/[^/]+)*)?'
+            else:
+                regex += '(?:[^/]+/)*'
+        else:
+            regex += translate_segment(segment)
+            if i < len(segments) - 1:
+                regex += '/'
+    return re.compile(regex + '\\Z', re.IGNORECASE | re.DOTALL)
+
+
+@lru_cache(maxsize=1024)
+def _compile_segment(segment):
+    """Compile a glob pattern segment into a case-insensitive regular expression."""
+    import re
+
+    return re.compile(translate_segment(segment) + '\\Z', re.IGNORECASE | re.DOTALL)
+
+
+class InsensitiveGlob(object):
+    """Compiled case-insensitive glob pattern.
+
+    The matching rules are the ones of glob.glob(): '*', '?' and '[...]' never
+    match the '/' separator, names starting with '.' are only matched by
+    segments starting with '.', and '**' (if recursive) matches zero or more
+    non-hidden folders. Segments containing no letter and no magic character
+    (e.g. '..') are taken literally.
+
+    Example:
+        >>> InsensitiveGlob('/caps/subjects/sub-*/ses-M00/**/*_T1w.nii.gz', recursive=True).glob()
+    """
+
+    def __init__(self, pattern, recursive=False):
+        self._pattern = pattern
+        self._recursive = recursive
+        if pattern.startswith('/'):
+            self._base = '/'
+        else:
+            self._base = ''
+        parts = pattern.split('/')
+        # A trailing '/' means that only folders are matched
+        self._only_folders = len(parts) > 1 and parts[-1] == ''
+        self._segments = []
+        for part in parts:
+            if not part:
+                continue
+            if recursive and part == '**':
+                # Consecutive '**' segments are equivalent to a single one
+                if not self._segments or self._segments[-1] != '**':
+                    self._segments.append('**')
+            elif any(c in part for c in MAGIC_CHARACTERS):
+                self._segments.append((_compile_segment(part), None, part.startswith('.')))
+            elif any(c.isalpha() for c in part):
+                # Names without magic characters are simply compared in lower case
+                self._segments.append((None, part.lower(), part.startswith('.')))
+            else:
+                # Literal segment: its existence is checked without listing its parent folder
+                self._segments.append(part)
+        self._closures = [self._closure(state) for state in range(len(self._segments) + 1)]
+
+    @property
+    def pattern(self): return self._pattern
+
+    def _closure(self, state):
+        """Return the states reached from `state` by matching '**' with zero folder."""
+        closure = [state]
+        while state < len(self._segments) and self._segments[state] == '**':
+            state += 1
+            closure.append(state)
+        return closure
+
+    def glob(self):
+        """Return the sorted list of the paths matching the pattern."""
+        segments = self._segments
+        n_segments = len(segments)
+        if n_segments == 0:
+            return [self._pattern] if self._pattern and os.path.lexists(self._pattern) else []
+        only_folders = self._only_folders
+        closures = self._closures
+        final_double_star = segments[-1] == '**'
+        results = set()
+        # Each item is (path of the folder, states, real paths of the symbolic links followed by '**')
+        stack = [(self._base, set(closures[0]), frozenset())]
+        while stack:
+            folder, states, followed_links = stack.pop()
+            prefix = folder if not folder or folder.endswith('/') else folder + '/'
+            if final_double_star and n_segments in states and folder != self._base \
+                    and (only_folders or folder not in results):
+                # Final '**' matching zero folder: the folder itself matches (with a trailing separator, like glob)
+                results.add(prefix)
+
+            listing_states = []
+            for state in states:
+                if state == n_segments:
+                    continue
+                segment = segments[state]
+                if segment == '**' or not isinstance(segment, str):
+                    listing_states.append(state)
+                elif state == n_segments - 1:
+                    # Literal segments are checked without listing the folder
+                    path = prefix + segment
+                    if only_folders and os.path.isdir(path):
+                        results.add(path + '/')
+                    elif not only_folders and os.path.lexists(path):
+                        results.add(path)
+                else:
+                    stack.append((prefix + segment, set(closures[state + 1]), followed_links))
+            if not listing_states:
+                continue
+
+            try:
+                with os.scandir(folder or os.curdir) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            # Path of the subfolders to explore -> (DirEntry, states)
+            children = {}
+            for state in listing_states:
+                segment = segments[state]
+                is_last = state == n_segments - 1
+                if segment == '**':
+                    for entry in entries:
+                        name = entry.name
+                        if name[0] == '.':
+                            continue
+                        if is_last and not only_folders:
+                            results.add(prefix + name)
+                        if _is_dir(entry):
+                            children.setdefault(prefix + name, (entry, set()))[1].update(closures[state])
+                else:
+                    regex, lower_name, allow_hidden = segment
+                    if regex is not None:
+                        matching_entries = [e for e in entries if regex.match(e.name)]
+                    else:
+                        matching_entries = [e for e in entries if e.name.lower() == lower_name]
+                    for entry in matching_entries:
+                        name = entry.name
+                        if name[0] == '.' and not allow_hidden:
+                            continue
+                        if is_last:
+                            if not only_folders:
+                                results.add(prefix + name)
+                            elif _is_dir(entry):
+                                results.add(prefix + name + '/')
+                        elif _is_dir(entry):
+                            children.setdefault(prefix + name, (entry, set()))[1].update(closures[state + 1])
+
+            for path, (entry, child_states) in children.items():
+                links = followed_links
+                if any(s < n_segments and segments[s] == '**' for s in child_states) and entry.is_symlink():
+                    # Avoid infinite loops when '**' goes through a symbolic link pointing to one of its parents
+                    real_path = os.path.realpath(path)
+                    real_folder = os.path.realpath(folder or os.curdir)
+                    if real_path in links or real_folder == real_path \
+                            or real_folder.startswith(os.path.join(real_path, '')):
+                        child_states = {s for s in child_states if s == n_segments or segments[s] != '**'}
+                    links = links | {real_path}
+                if child_states:
+                    stack.append((path, child_states, links))
+        return sorted(results)
+
+
+def _is_dir(entry):
+    """Return True if the DirEntry `entry` is a folder (or a link to a folder)."""
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
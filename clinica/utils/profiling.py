@@ -0,0 +1,215 @@
+# coding: utf8
+
+"""
+This module contains the profiling mode of the Clinica pipelines.
+
+When it is enabled (--profile option of clinica run), the wall time, CPU time
+and peak memory (RSS) of each node are collected for each image while the
+pipeline runs. A TSV file (one line per node execution) and a JSON file (node
+executions, summary per node and information on the run) are written at the
+end of the run, and the slowest nodes are displayed.
+
+CPU time and peak memory are measured by the resource monitor of Nipype,
+which needs the psutil package: without it, only wall times are reported.
+"""
+
+import threading
+
+# Number of nodes displayed in the summary of the slowest nodes
+N_SLOWEST_NODES = 10
+
+# Columns of the TSV report
+PROFILE_COLUMNS = ['node', 'node_id', 'image_id', 'status', 'start', 'finish', 'wall_time_s', 'cpu_time_s',
+                   'peak_rss_gb', 'estimated_mem_gb', 'n_procs']
+
+
+def get_image_id(node):
+    """Guess the image (e.g. 'sub-01_ses-M00') processed by a node from its iterables and inputs.
+
+    Returns:
+        Image ID (str), None if the node is not specific to an image (e.g. group nodes).
+    """
+    import re
+
+    candidates = [str(getattr(node, 'parameterization', ''))]
+    result = getattr(node, 'result', None)
+    if result is not None and getattr(result, 'inputs', None):
+        candidates.append(str(result.inputs))
+    for candidate in candidates:
+        m = re.search(r'(sub-[a-zA-Z0-9]+)_(ses-[a-zA-Z0-9]+)', candidate)
+        if m is None:
+            m = re.search(r'(sub-[a-zA-Z0-9]+)/(ses-[a-zA-Z0-9]+)', candidate)
+        if m is not None:
+            return m.group(1) + '_' + m.group(2)
+    return None
+
+
+def get_cpu_time(prof_dict):
+    """Integrate the CPU usage sampled by the Nipype resource monitor.
+
+    Args:
+        prof_dict: Dictionary with the 'time' (in seconds) and 'cpus' (in %) samples.
+
+    Returns:
+        CPU time in seconds (float), None if there are not enough samples.
+    """
+    if not prof_dict or len(prof_dict.get('time', [])) < 2:
+        return None
+    times, cpus = prof_dict['time'], prof_dict['cpus']
+    cpu_time = 0.
+    for i in range(1, len(times)):
+        cpu_time += (times[i] - times[i - 1]) * cpus[i] / 100.
+    return cpu_time
+
+
+class PipelineProfiler(object):
+    """Collect the resources used by each node of a pipeline run.
+
+    Usage:
+        profiler = PipelineProfiler('t1-linear')
+        profiler.enable()
+        workflow.run(plugin='MultiProc', plugin_args={'status_callback': profiler.status_callback})
+        profiler.write_report(output_dir)
+
+    Attributes:
+        pipeline_name (str): Name of the profiled pipeline.
+        records (list): One dictionary (see PROFILE_COLUMNS) per node execution.
+    """
+
+    def __init__(self, pipeline_name):
+        self._pipeline_name = pipeline_name
+        self._records = []
+        self._lock = threading.Lock()
+        self._start_time = None
+        self._end_time = None
+        self._resource_monitor = False
+
+    @property
+    def pipeline_name(self): return self._pipeline_name
+
+    @property
+    def records(self): return self._records
+
+    def enable(self):
+        """Enable the Nipype resource monitor (if psutil is installed) and start the timer.
+
+        Returns:
+            True if CPU time and peak memory will be measured, False otherwise.
+        """
+        import time
+        from colorama import Fore
+        from nipype import config
+        from clinica.utils.stream import cprint
+
+        self._start_time = time.time()
+        try:
+            import psutil  # noqa: F401
+            config.enable_resource_monitor()
+            self._resource_monitor = True
+        except ImportError:
+            cprint('%s[Warning] The psutil package is not installed: only wall times will be profiled.%s'
+                   % (Fore.YELLOW, Fore.RESET))
+            self._resource_monitor = False
+        return self._resource_monitor
+
+    def status_callback(self, node, status):
+        """Callback given to the Nipype plugins (status_callback plugin argument)."""
+        if status not in ['end', 'exception']:
+            return
+        result = getattr(node, 'result', None) if status == 'end' else None
+        runtime = getattr(result, 'runtime', None)
+
+        record = {'node': node.name,
+                  'node_id': node.fullname if hasattr(node, 'fullname') else node._id,
+                  'image_id': get_image_id(node),
+                  'status': 'finished' if status == 'end' else 'failed',
+                  'start': getattr(runtime, 'startTime', None),
+                  'finish': getattr(runtime, 'endTime', None),
+                  'wall_time_s': getattr(runtime, 'duration', None),
+                  'cpu_time_s': get_cpu_time(getattr(runtime, 'prof_dict', None)),
+                  'peak_rss_gb': getattr(runtime, 'mem_peak_gb', None),
+                  'estimated_mem_gb': node.mem_gb,
+                  'n_procs': node.n_procs}
+        with self._lock:
+            self._records.append(record)
+
+    def summarize(self):
+        """Aggregate the node executions per node name.
+
+        Returns:
+            List of dictionaries (node, n_executions, total_wall_time_s,
+            mean_wall_time_s, total_cpu_time_s, max_peak_rss_gb,
+            estimated_mem_gb), sorted by decreasing total wall time.
+        """
+        summary = {}
+        with self._lock:
+            records = list(self._records)
+        for record in records:
+            node_summary = summary.setdefault(record['node'], {'node': record['node'],
+                                                               'n_executions': 0,
+                                                               'total_wall_time_s': 0.,
+                                                               'total_cpu_time_s': None,
+                                                               'max_peak_rss_gb': None,
+                                                               'estimated_mem_gb': record['estimated_mem_gb']})
+            node_summary['n_executions'] += 1
+            node_summary['total_wall_time_s'] += record['wall_time_s'] or 0.
+            if record['cpu_time_s'] is not None:
+                node_summary['total_cpu_time_s'] = (node_summary['total_cpu_time_s'] or 0.) + record['cpu_time_s']
+            if record['peak_rss_gb'] is not None:
+                node_summary['max_peak_rss_gb'] = max(node_summary['max_peak_rss_gb'] or 0., record['peak_rss_gb'])
+        for node_summary in summary.values():
+            node_summary['mean_wall_time_s'] = node_summary['total_wall_time_s'] / node_summary['n_executions']
+        return sorted(summary.values(), key=lambda s: s['total_wall_time_s'], reverse=True)
+
+    def write_report(self, output_dir, plugin_args=None):
+        """Write the TSV and JSON reports in `output_dir` and display the slowest nodes.
+
+        Args:
+            output_dir: Folder where the reports are written.
+            plugin_args (optional): Arguments of the Nipype plugin (n_procs, memory_gb) stored in the JSON report.
+
+        Returns:
+            Tuple (path of the TSV report, path of the JSON report).
+        """
+        import datetime
+        import json
+        import os
+        import time
+        import pandas as pd
+        from colorama import Fore
+        import clinica
+        from clinica.utils.stream import cprint
+
+        self._end_time = time.time()
+        timestamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        os.makedirs(output_dir, exist_ok=True)
+        basename = os.path.join(output_dir, '%s_profile_%s' % (self._pipeline_name, timestamp))
+
+        with self._lock:
+            records = list(self._records)
+        summary = self.summarize()
+
+        tsv_file = basename + '.tsv'
+        pd.DataFrame(records, columns=PROFILE_COLUMNS).to_csv(tsv_file, sep='\t', index=False, na_rep='n/a')
+
+        json_file = basename + '.json'
+        plugin_args = plugin_args or {}
+        report = {'pipeline': self._pipeline_name,
+                  'clinica_version': clinica.__version__,
+                  'resource_monitor': self._resource_monitor,
+                  'n_procs': plugin_args.get('n_procs'),
+                  'memory_gb': plugin_args.get('memory_gb'),
+                  'total_wall_time_s': (self._end_time - self._start_time) if self._start_time else None,
+                  'summary': summary,
+                  'nodes': records}
+        with open(json_file, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+
+        cprint('%sSlowest nodes of the pipeline (total wall time):%s' % (Fore.BLUE, Fore.RESET))
+        for node_summary in summary[:N_SLOWEST_NODES]:
+            peak = node_summary['max_peak_rss_gb']
+            cprint('\t%-40s %10.1f s (%d run(s), peak memory: %s)'
+                   % (node_summary['node'], node_summary['total_wall_time_s'], node_summary['n_executions'],
+                      '%.2f GB' % peak if peak is not None else 'n/a'))
+        cprint('Profiling reports: %s, %s' % (tsv_file, json_file))
+        return tsv_file, json_file
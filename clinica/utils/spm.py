@@ -99,6 +99,7 @@ def use_spm_standalone():
     from colorama import Fore
     import platform
     from clinica.utils.stream import cprint
+    from clinica.utils.dependency_cache import cached_probe
     from nipype.interfaces import spm
     # This section of code determines whether to use SPM standalone or not
     if all(elem in os.environ.keys() for elem in ['SPMSTANDALONE_HOME', 'MCR_HOME']):
@@ -115,6 +116,10 @@ def use_spm_standalone():
             else:
                 raise SystemError('Clinica only support macOS and Linux')
             spm.SPMCommand.set_mlab_paths(matlab_cmd=matlab_cmd, use_mcr=True)
-            cprint("Using SPM standalone version %s" % spm.SPMCommand().version)
+            # Getting the version starts the MATLAB Common Runtime
+            spm_version = cached_probe('version:spm-standalone', lambda: spm.SPMCommand().version,
+                                       paths=[os.path.join(spm_standalone_home, 'run_spm12.sh'), mcr_home],
+                                       environment_variables=['SPMSTANDALONE_HOME', 'MCR_HOME'])
+            cprint("Using SPM standalone version %s" % spm_version)
         else:
             raise FileNotFoundError('$SPMSTANDALONE_HOME and $MCR_HOME are defined, but linked to non existent folder ')
@@ -0,0 +1,62 @@
+# coding: utf8
+
+"""
+Benchmark of the startup time of the clinica command line.
+
+The lazy registry (clinica.engine.registry), where only the invoked
+sub-command is imported, is compared to the former behaviour, where the
+modules of all the sub-commands were imported and all their parsers were built.
+The registry is also checked: each registered command must have the name and
+description of its CmdParser class. Usage:
+
+    python test/benchmarks/bench_cli_startup.py [repeat]
+"""
+
+import subprocess
+import sys
+import timeit
+
+from clinica.engine.registry import COMMANDS
+
+COMMAND_LINES = [
+    ['run', '--help'],
+    ['run', 't1-linear', '--help'],
+    ['iotools', 'merge-tsv', '--help'],
+]
+
+# Snippet run in a new interpreter: argv is given as first argument
+LAZY = ('import sys; sys.argv = ["clinica"] + sys.argv[1:]; '
+        'from clinica.cmdline import execute; execute()')
+EAGER = ('import sys; sys.argv = ["clinica"] + sys.argv[1:]; '
+         'from clinica.engine.registry import COMMANDS; '
+         '[c.load() for commands in COMMANDS.values() for c in commands]; '
+         'from clinica.cmdline import execute; execute()')
+
+
+def check_registry():
+    for category, commands in COMMANDS.items():
+        for command in commands:
+            cmdparser = command.load()
+            assert cmdparser.name == command.name, (category, command.name, cmdparser.name)
+            assert cmdparser.description == command.help, (category, command.name)
+
+
+def run(snippet, command_line):
+    subprocess.run([sys.executable, '-c', snippet] + command_line,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main(repeat=10):
+    check_registry()
+    # Interpreter startup and import of clinica.cmdline, common to both versions
+    baseline = min(timeit.repeat(lambda: run('import clinica.cmdline', []), number=1, repeat=repeat))
+    print('python -c "import clinica.cmdline": %.3f s' % baseline)
+    for command_line in COMMAND_LINES:
+        eager = min(timeit.repeat(lambda: run(EAGER, command_line), number=1, repeat=repeat))
+        lazy = min(timeit.repeat(lambda: run(LAZY, command_line), number=1, repeat=repeat))
+        print('clinica %-28s eager: %.3f s  lazy: %.3f s  (without interpreter and imports: x%.1f)'
+              % (' '.join(command_line), eager, lazy, (eager - baseline) / max(lazy - baseline, 1e-3)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
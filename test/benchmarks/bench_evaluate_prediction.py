@@ -0,0 +1,118 @@
+# coding: utf8
+
+"""
+Benchmark of clinica.pipelines.machine_learning.ml_utils.evaluate_prediction
+against the former implementation (loop over the samples building the lists
+of true/false positives/negatives).
+
+The results of both implementations are first checked to be identical on
+random predictions, including degenerate cases (a single class, labels other
+than 0 and 1). The batch version (evaluate_predictions) is timed on the
+predictions of a grid of parameters. Usage:
+
+    python test/benchmarks/bench_evaluate_prediction.py [n_samples] [n_predictions]
+"""
+
+import sys
+import timeit
+
+import numpy as np
+
+from clinica.pipelines.machine_learning.ml_utils import evaluate_prediction, evaluate_predictions
+
+
+def legacy_evaluate_prediction(y, y_hat):
+    true_positive = 0.0
+    true_negative = 0.0
+    false_positive = 0.0
+    false_negative = 0.0
+
+    tp = []
+    tn = []
+    fp = []
+    fn = []
+
+    for i in range(len(y)):
+        if y[i] == 1:
+            if y_hat[i] == 1:
+                true_positive += 1
+                tp.append(i)
+            else:
+                false_negative += 1
+                fn.append(i)
+        else:  # -1
+            if y_hat[i] == 0:
+                true_negative += 1
+                tn.append(i)
+            else:
+                false_positive += 1
+                fp.append(i)
+
+    accuracy = (true_positive + true_negative) / (true_positive + true_negative + false_positive + false_negative)
+
+    if (true_positive + false_negative) != 0:
+        sensitivity = true_positive / (true_positive + false_negative)
+    else:
+        sensitivity = 0.0
+
+    if (false_positive + true_negative) != 0:
+        specificity = true_negative / (false_positive + true_negative)
+    else:
+        specificity = 0.0
+
+    if (true_positive + false_positive) != 0:
+        ppv = true_positive / (true_positive + false_positive)
+    else:
+        ppv = 0.0
+
+    if (true_negative + false_negative) != 0:
+        npv = true_negative / (true_negative + false_negative)
+    else:
+        npv = 0.0
+
+    balanced_accuracy = (sensitivity + specificity) / 2
+
+    return {'accuracy': accuracy,
+            'balanced_accuracy': balanced_accuracy,
+            'sensitivity': sensitivity,
+            'specificity': specificity,
+            'ppv': ppv,
+            'npv': npv,
+            'confusion_matrix': {'tp': len(tp), 'tn': len(tn), 'fp': len(fp), 'fn': len(fn)}
+            }
+
+
+def check(n_checks=2000):
+    rng = np.random.RandomState(0)
+    label_sets = [[0, 1], [0], [1], [-1, 1], [0, 1, 2]]
+    for k in range(n_checks):
+        n_samples = rng.randint(1, 40)
+        labels = label_sets[0] if k % 4 else label_sets[rng.randint(len(label_sets))]
+        y = rng.choice(labels, n_samples)
+        y_hats = rng.choice(labels, (3, n_samples))
+        batch = evaluate_predictions(y, y_hats)
+        for y_hat, result in zip(y_hats, batch):
+            expected = legacy_evaluate_prediction(y, y_hat)
+            assert evaluate_prediction(y, y_hat) == expected, (y, y_hat)
+            assert result == expected, (y, y_hat)
+
+
+def main(n_samples=200, n_predictions=17, repeat=5):
+    check()
+    print('Results identical to the former implementation')
+
+    rng = np.random.RandomState(0)
+    y = rng.randint(0, 2, n_samples)
+    y_hats = rng.randint(0, 2, (n_predictions, n_samples))
+    number = 100
+    legacy = min(timeit.repeat(lambda: [legacy_evaluate_prediction(y, y_hat) for y_hat in y_hats],
+                               number=number, repeat=repeat)) / number
+    current = min(timeit.repeat(lambda: [evaluate_prediction(y, y_hat) for y_hat in y_hats],
+                                number=number, repeat=repeat)) / number
+    batch = min(timeit.repeat(lambda: evaluate_predictions(y, y_hats), number=number, repeat=repeat)) / number
+    print('%d predictions of %d samples  legacy: %.2f ms  vectorized: %.2f ms (x%.1f)  batch: %.2f ms (x%.1f)'
+          % (n_predictions, n_samples, legacy * 1e3, current * 1e3, legacy / current, batch * 1e3, legacy / batch))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
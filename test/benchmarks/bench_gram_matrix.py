@@ -0,0 +1,59 @@
+# coding: utf8
+
+"""
+Benchmark of clinica.pipelines.machine_learning.ml_utils.gram_matrix_linear
+against the former implementation (np.dot on the whole in-memory matrix).
+
+Random features are written in a float32 memory map, as in the feature stores
+of the voxel-based inputs. The blocked version reads the memory map by blocks
+of columns; its peak memory allocation (traced by tracemalloc) and its error
+relative to the float64 Gram matrix are reported. Usage:
+
+    python test/benchmarks/bench_gram_matrix.py [n_samples] [n_features] [n_threads]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from clinica.pipelines.machine_learning.ml_utils import gram_matrix_linear
+
+
+def measure(function):
+    tracemalloc.start()
+    start = time.time()
+    result = function()
+    duration = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, duration, peak / 2. ** 20
+
+
+def main(n_samples=400, n_features=500000, n_threads=4):
+    filename = os.path.join(tempfile.mkdtemp(), 'data.npy')
+    data = np.lib.format.open_memmap(filename, mode='w+', dtype=np.float32, shape=(n_samples, n_features))
+    rng = np.random.RandomState(0)
+    for start in range(0, n_samples, 64):
+        data[start:start + 64] = rng.rand(min(64, n_samples - start), n_features)
+    data.flush()
+    del data
+    data = np.load(filename, mmap_mode='r')
+    print('Features: %d x %d float32 (%.0f MB) in %s' % (n_samples, n_features, n_samples * n_features * 4. / 2 ** 20,
+                                                         filename))
+
+    reference, legacy_time, legacy_memory = measure(lambda: np.dot(np.array(data, dtype=np.float64),
+                                                                   np.array(data, dtype=np.float64).T))
+    print('legacy (float64 np.dot)  %7.2f s  peak memory: %8.1f MB' % (legacy_time, legacy_memory))
+
+    for threads in sorted({1, n_threads}):
+        kernel, blocked_time, blocked_memory = measure(lambda: gram_matrix_linear(data, n_threads=threads))
+        print('blocked (%d thread(s))    %7.2f s  peak memory: %8.1f MB  max relative error: %.1e'
+              % (threads, blocked_time, blocked_memory, np.abs(kernel - reference).max() / np.abs(reference).max()))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:4]])
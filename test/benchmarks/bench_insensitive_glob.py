@@ -0,0 +1,73 @@
+# coding: utf8
+
+"""
+Benchmark of clinica.utils.inputs.insensitive_glob against the former
+implementation (every letter rewritten as a [aA] class, then glob.glob()).
+
+A fake CAPS directory with FreeSurfer-like subject folders is generated in a
+temporary folder. Usage:
+
+    python test/benchmarks/bench_insensitive_glob.py [n_subjects]
+"""
+
+import os
+import sys
+import tempfile
+import timeit
+from glob import glob
+
+from clinica.utils.inputs import insensitive_glob
+
+FREESURFER_FOLDERS = {
+    'mri': ['orig.mgz', 'orig_nu.mgz', 'T1.mgz', 'brainmask.mgz', 'aseg.mgz', 'wm.mgz', 'norm.mgz'],
+    'surf': ['lh.white', 'rh.white', 'lh.pial', 'rh.pial', 'lh.sphere', 'rh.sphere', 'lh.thickness', 'rh.thickness'],
+    'label': ['lh.cortex.label', 'rh.cortex.label', 'lh.aparc.annot', 'rh.aparc.annot'],
+    'stats': ['aseg.stats', 'lh.aparc.stats', 'rh.aparc.stats'],
+    'scripts': ['recon-all.log', 'recon-all.done'],
+}
+
+PATTERNS = [
+    ('subject surface', 'subjects/sub-ADNI%03d/ses-M00/**/sub-*_ses-*/surf/rh.white'),
+    ('subject volume', 'subjects/sub-ADNI%03d/ses-M00/**/mri/orig_nu.mgz'),
+    ('all subjects', 'subjects/*/ses-M00/t1/freesurfer_cross_sectional/*/stats/aseg.stats'),
+]
+
+
+def legacy_insensitive_glob(pattern_glob, recursive=False):
+    def either(c):
+        return '[%s%s]' % (c.lower(), c.upper()) if c.isalpha() else c
+
+    return glob(''.join(map(either, pattern_glob)), recursive=recursive)
+
+
+def build_caps(caps_dir, n_subjects):
+    for i in range(n_subjects):
+        subject = 'sub-ADNI%03d' % i
+        for session in ['ses-M00', 'ses-M12']:
+            fs_dir = os.path.join(caps_dir, 'subjects', subject, session, 't1', 'freesurfer_cross_sectional',
+                                  subject + '_' + session)
+            for folder, files in FREESURFER_FOLDERS.items():
+                os.makedirs(os.path.join(fs_dir, folder))
+                for f in files:
+                    open(os.path.join(fs_dir, folder, f), 'w').close()
+
+
+def main(n_subjects=50, repeat=5):
+    caps_dir = os.path.join(tempfile.mkdtemp(), 'caps')
+    build_caps(caps_dir, n_subjects)
+    print('CAPS directory with %d subjects: %s' % (n_subjects, caps_dir))
+    for name, pattern in PATTERNS:
+        patterns = [os.path.join(caps_dir, pattern % i if '%' in pattern else pattern)
+                    for i in range(n_subjects if '%' in pattern else 1)]
+        for p in patterns:
+            assert sorted(set(legacy_insensitive_glob(p, recursive=True))) == insensitive_glob(p, recursive=True)
+        legacy = min(timeit.repeat(lambda: [legacy_insensitive_glob(p, recursive=True) for p in patterns],
+                                   number=1, repeat=repeat))
+        current = min(timeit.repeat(lambda: [insensitive_glob(p, recursive=True) for p in patterns],
+                                    number=1, repeat=repeat))
+        print('%-16s legacy: %8.4f s  current: %8.4f s  speed-up: x%.1f'
+              % (name, legacy, current, legacy / current))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
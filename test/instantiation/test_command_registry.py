@@ -0,0 +1,27 @@
+# coding: utf8
+
+# Check that the registry of the command line (clinica.engine.registry) is
+# consistent with the CmdParser classes of the sub-commands: the registry
+# duplicates their names and descriptions so that the classes are only
+# imported when their sub-command is invoked.
+
+import pytest
+
+from clinica.engine.registry import COMMANDS
+
+REGISTERED_COMMANDS = [(category, command) for category, commands in sorted(COMMANDS.items())
+                       for command in commands]
+
+
+@pytest.mark.parametrize('category, command', REGISTERED_COMMANDS,
+                         ids=['%s-%s' % (category, command.name) for category, command in REGISTERED_COMMANDS])
+def test_registered_command_matches_cmdparser(category, command):
+    cmdparser = command.load()
+    assert cmdparser.name == command.name
+    assert cmdparser.description == command.help
+
+
+def test_registered_command_names_are_unique():
+    for category, commands in COMMANDS.items():
+        names = [command.name for command in commands]
+        assert len(names) == len(set(names)), category
@@ -0,0 +1,58 @@
+# coding: utf8
+
+# Tests of the file catalog of BIDS/CAPS directories (clinica.utils.catalog):
+# the catalog must find the same files as a recursive glob.
+
+import os
+
+import pytest
+
+
+def make_files(root, files):
+    for f in files:
+        path = os.path.join(root, f)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'w').close()
+
+
+def glob_files(root, pattern):
+    from glob import glob
+
+    return sorted(os.path.relpath(f, root) for f in glob(os.path.join(root, pattern), recursive=True))
+
+
+def find_files(catalog, pattern):
+    return sorted(os.path.relpath(f, catalog.root) for f in catalog.find(pattern))
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink'), reason='Symbolic links are not supported')
+def test_file_catalog_follows_symlink_to_folder(tmp_path):
+    from clinica.utils.catalog import FileCatalog
+
+    root = str(tmp_path)
+    make_files(root, ['A/b/C/file.nii', 'A/b/C/d/file.nii'])
+    os.makedirs(os.path.join(root, 'e'))
+    # A link walked before or after its target must not hide the target
+    os.symlink(os.path.join(os.pardir, 'A'), os.path.join(root, 'e', 'link'))
+
+    catalog = FileCatalog(root)
+    catalog.update()
+    expected = glob_files(root, '**/file.nii')
+    assert expected == ['A/b/C/d/file.nii', 'A/b/C/file.nii', 'e/link/b/C/d/file.nii', 'e/link/b/C/file.nii']
+    assert find_files(catalog, '**/file.nii') == expected
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink'), reason='Symbolic links are not supported')
+def test_file_catalog_stops_at_symlink_loop(tmp_path):
+    from clinica.utils.catalog import FileCatalog
+
+    root = str(tmp_path)
+    make_files(root, ['A/b/file.nii'])
+    os.symlink(os.pardir, os.path.join(root, 'A', 'b', 'up'))
+
+    catalog = FileCatalog(root)
+    catalog.update()
+    assert find_files(catalog, '**/file.nii') == ['A/b/file.nii']
+    # Updating a subfolder must give the same catalog as updating the whole directory
+    catalog.update('A/b')
+    assert find_files(catalog, '**/file.nii') == ['A/b/file.nii']